@@ -2,8 +2,9 @@
 from flask import Flask
 from app.commands import register_commands
 from config import config
-from .extensions import db, migrate, jwt
+from .extensions import db, migrate, jwt, principal_cache, token_versions, valorizacion_cache, capas_cache, revocation_store, password_hasher
 from app.routes import register_blueprints, register_api_namespaces
+from app.services.auth_service import init_auth
 from flask_restx import Api
 from flask_cors import CORS
 
@@ -15,6 +16,13 @@ def create_app(config_name="default"):
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    principal_cache.init_app(app)
+    token_versions.init_app(app)
+    valorizacion_cache.init_app(app)
+    capas_cache.init_app(app)
+    revocation_store.init_app(app)
+    password_hasher.init_app(app)
+    init_auth(app)
 
     CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -5,4 +5,6 @@ from app.extensions import db
 def register_commands(app):
     """Registrar todos los comandos CLI"""
     from .data_commands import register_data_commands
-    register_data_commands(app)
\ No newline at end of file
+    register_data_commands(app)
+    from .stock_commands import register_stock_commands
+    register_stock_commands(app)
\ No newline at end of file
@@ -1,6 +1,20 @@
 # app/commands/data_commands.py
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import Manager
+import click
+from flask import current_app
+from sqlalchemy import func, select
 from app.scripts.init_data import init_data
 from app.utils.data_checker import ensure_essential_data
+from app.services.articulo_import_service import ImportacionError, ImportacionInterrumpida, importar_articulos
+from app.services.articulo_search_service import init_search_index
+from app.services.stock_service import corregir_stock_articulo, rebuild_almacen
+from app.extensions import db, revocation_store
+from app.models.vale_almacen import ValeAlmacen
+from app.models.vale_almacen_det import ValeAlmacenDet
 
 def register_data_commands(app):
     """Registrar comandos relacionados con datos"""
@@ -11,10 +25,101 @@ def register_data_commands(app):
         init_data()
         print("Datos inicializados correctamente")
     
+    @app.cli.command("rebuild-stock")
+    @click.option('--almacen', 'almacenes', multiple=True, type=int, help='Almacén a recalcular (repetible; por defecto todos)')
+    @click.option('--workers', default=None, type=int, help='Procesos en paralelo (por defecto, CPUs disponibles)')
+    def rebuild_stock_command(almacenes, workers):
+        """Recalcular stock y kardex desde los vales, en paralelo por almacén.
+
+        Las líneas se reprocesan en orden de registro. El kardex nuevo omite los
+        vales inactivados junto con sus filas compensatorias.
+        """
+        if not almacenes:
+            almacenes = db.session.scalars(select(ValeAlmacen.id_almacen).distinct().order_by(ValeAlmacen.id_almacen)).all()
+        if not almacenes:
+            print("No hay vales registrados")
+            return
+        total = db.session.scalar(
+            select(func.count()).select_from(ValeAlmacenDet)
+            .join(ValeAlmacen, ValeAlmacen.id_vale_almacen == ValeAlmacenDet.id_vale_almacen)
+            .where(ValeAlmacen.id_almacen.in_(almacenes))
+        )
+        database_uri = current_app.config['SQLALCHEMY_DATABASE_URI']
+        workers = workers or os.cpu_count() or 1
+        if db.engine.dialect.name == 'sqlite':
+            workers = 1  # SQLite admite un solo escritor a la vez
+        db.session.close()
+        
+        print(f"Recalculando {len(almacenes)} almacenes (~{total:,} líneas) con {workers} procesos")
+        print("  el kardex se reescribe en orden de registro, sin las filas de los vales inactivados")
+        inicio = time.perf_counter()
+        procesadas = {}
+        with Manager() as manager, ProcessPoolExecutor(max_workers=min(workers, len(almacenes))) as pool:
+            progreso = manager.Queue()
+            pendientes = {pool.submit(rebuild_almacen, database_uri, id_almacen, progreso): id_almacen
+                          for id_almacen in almacenes}
+            while pendientes:
+                terminados, _ = wait(pendientes, timeout=2)
+                try:
+                    while True:
+                        id_almacen, lineas = progreso.get_nowait()
+                        procesadas[id_almacen] = lineas
+                except queue.Empty:
+                    pass
+                segundos = time.perf_counter() - inicio
+                avance = sum(procesadas.values())
+                print(f"  {avance:,}/{total:,} líneas ({avance / segundos:,.0f} líneas/s)")
+                for futuro in terminados:
+                    id_almacen = pendientes.pop(futuro)
+                    print(f"  almacén {id_almacen}: {futuro.result():,} líneas, stock reemplazado")
+        
+        # El total por artículo suma todos los almacenes: se recalcula al final, en un solo proceso
+        corregidos = corregir_stock_articulo()
+        db.session.commit()
+        print(f"  stock_articulo corregido en {corregidos:,} artículos")
+        print(f"Stock y kardex recalculados en {time.perf_counter() - inicio:.1f} s; "
+              "vuelva a ejecutar cerrar-periodo si hay cierres posteriores a los datos corregidos")
+    
+    @app.cli.command("importar-articulos")
+    @click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--actualizar', is_flag=True, help='Actualizar los artículos cuyo código ya existe')
+    @click.option('--lote', default=5000, help='Filas validadas y escritas por sentencia')
+    def importar_articulos_command(archivo, actualizar, lote):
+        """Importar artículos desde un CSV (UTF-8) en lotes"""
+        inicio = time.perf_counter()
+        with open(archivo, encoding='utf-8-sig', newline='') as contenido:
+            try:
+                resumen = importar_articulos(contenido, actualizar=actualizar, tamano_lote=lote)
+            except ImportacionInterrumpida as e:
+                print(f"Importación interrumpida en la fila {e.fila}: {e}")
+                resumen = e.resumen
+            except ImportacionError as e:
+                raise click.ClickException(str(e))
+        print(f"Filas procesadas: {resumen['procesadas']:,} en {time.perf_counter() - inicio:.1f} s")
+        print(f"  insertadas: {resumen['insertadas']:,}, actualizadas: {resumen['actualizadas']:,}, "
+              f"con errores: {resumen['total_errores']:,}")
+        for error in resumen['errores'][:20]:
+            print(f"  fila {error['fila']} ({error['cod_articulo']}): {error['message']}")
+    
     @app.cli.command("check-data")
     def check_data_command():
         """Verificar datos esenciales"""
         if ensure_essential_data():
             print("Datos esenciales verificados")
         else:
-            print("Faltan datos esenciales")
\ No newline at end of file
+            print("Faltan datos esenciales")
+    
+    @app.cli.command("init-search-index")
+    def init_search_index_command():
+        """Crear el índice de búsqueda de artículos (pg_trgm + unaccent o SQLite FTS5)"""
+        backend = init_search_index()
+        if backend:
+            print(f"Índice de búsqueda de artículos listo ({backend})")
+        else:
+            print("El motor de base de datos no soporta el índice de búsqueda")
+    
+    @app.cli.command("prune-revoked-tokens")
+    def prune_revoked_tokens_command():
+        """Eliminar las revocaciones de tokens que ya expiraron"""
+        eliminados = revocation_store.prune()
+        print(f"Revocaciones expiradas eliminadas: {eliminados}")
\ No newline at end of file
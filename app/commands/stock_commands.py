@@ -0,0 +1,209 @@
+# app/commands/stock_commands.py
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+import click
+from flask import current_app
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import OperationalError
+from app.extensions import db
+from app.models.almacen import Almacen
+from app.models.articulo import Articulo
+from app.models.alerta_stock import AlertaStock
+from app.models.kardex import Kardex
+from app.models.stock import Stock
+from app.models.tipo_mov_almacen import TipoMovAlmacen
+from app.models.usuario import Usuario
+from app.models.vale_almacen import ValeAlmacen
+from app.models.vale_almacen_det import ValeAlmacenDet
+from app.services.cierre_service import CierreError, cerrar_periodo, periodo_anterior
+from app.services.stock_service import (
+    StockError, StockInsuficiente, consolidar_stock_articulo, contadores, corregir_stock_articulo,
+    diferencias_stock_articulo
+)
+from app.services.vale_almacen_service import crear_vale_con_detalles
+
+def register_stock_commands(app):
+    """Registrar comandos relacionados con el stock"""
+    
+    @app.cli.command("benchmark-stock")
+    @click.option('--lineas', default=10000, help='Líneas por vale')
+    @click.option('--vales', default=3, help='Cantidad de vales a registrar')
+    @click.option('--articulos', default=1000, help='Artículos distintos a usar como máximo')
+    def benchmark_stock_command(lineas, vales, articulos):
+        """Medir el registro de vales grandes (detalles + stock); al final se revierte todo"""
+        ids = db.session.scalars(select(Articulo.id_articulo).limit(articulos)).all()
+        almacen = Almacen.query.first()
+        usuario = Usuario.query.first()
+        ingreso = TipoMovAlmacen.query.filter(TipoMovAlmacen.factor_mov > 0).first()
+        if not (ids and almacen and usuario and ingreso):
+            print("Se necesitan artículos, almacenes, usuarios y tipos de movimiento (flask init-data)")
+            return
+        
+        print(f"{vales} vales x {lineas} líneas sobre {len(ids)} artículos ({db.engine.dialect.name})")
+        try:
+            for numero in range(1, vales + 1):
+                data = {
+                    'cod_vale_almacen': 'BM' + uuid.uuid4().hex[:10].upper(),
+                    'id_almacen': almacen.id_almacen,
+                    'id_tipo_mov_almacen': ingreso.id_tipo_mov_almacen,
+                    'detalles': [
+                        {
+                            'id_articulo': random.choice(ids),
+                            'cantidad': random.randint(1, 100),
+                            'precio_soles': round(random.uniform(1, 50), 2)
+                        }
+                        for _ in range(lineas)
+                    ]
+                }
+                inicio = time.perf_counter()
+                crear_vale_con_detalles(data, usuario.id_user)
+                db.session.flush()
+                segundos = time.perf_counter() - inicio
+                print(f"  vale {numero}: {segundos * 1000:.0f} ms ({lineas / segundos:,.0f} líneas/s)")
+        finally:
+            db.session.rollback()
+    
+    @app.cli.command("cerrar-periodo")
+    @click.option('--periodo', default=None, help='Periodo YYYY-MM (por defecto, el mes anterior)')
+    def cerrar_periodo_command(periodo):
+        """Guardar el stock de cierre del periodo por almacén y artículo"""
+        periodo = periodo or periodo_anterior(datetime.utcnow())
+        try:
+            filas = cerrar_periodo(periodo)
+        except CierreError as e:
+            db.session.rollback()
+            print(f"No se pudo cerrar el periodo: {e}")
+            return
+        db.session.commit()
+        print(f"Periodo {periodo} cerrado: {filas} saldos guardados")
+    
+    @app.cli.command("consolidar-stock-articulo")
+    def consolidar_stock_articulo_command():
+        """Sumar a Articulo.stock_articulo los deltas anotados por los vales (ejecutar periódicamente)"""
+        actualizados = consolidar_stock_articulo()
+        db.session.commit()
+        print(f"stock_articulo consolidado en {actualizados:,} artículos")
+    
+    @app.cli.command("verificar-stock-articulo")
+    @click.option('--corregir', is_flag=True, help='Recalcular stock_articulo de los artículos con diferencias')
+    @click.option('--mostrar', default=20, help='Diferencias a listar como máximo')
+    def verificar_stock_articulo_command(corregir, mostrar):
+        """Comparar Articulo.stock_articulo (más sus deltas pendientes) con la suma del stock por almacén"""
+        diferencias = diferencias_stock_articulo()
+        if not diferencias:
+            print("stock_articulo coincide con la tabla stock en todos los artículos")
+            return
+        print(f"{len(diferencias):,} artículos con diferencias:")
+        for fila in diferencias[:mostrar]:
+            print(f"  {fila.cod_articulo}: stock_articulo={float(fila.stock_articulo):,.4f}, "
+                  f"pendiente={float(fila.pendiente):,.4f}, suma stock={float(fila.suma_stock):,.4f}")
+        if corregir:
+            corregidos = corregir_stock_articulo()
+            db.session.commit()
+            print(f"{corregidos:,} artículos corregidos")
+        else:
+            print("Use --corregir para recalcularlos")
+    
+    @app.cli.command("benchmark-salidas")
+    @click.option('--hilos', default=8, help='Hilos registrando salidas a la vez')
+    @click.option('--vales', default=50, help='Vales de salida por hilo')
+    @click.option('--articulos', default=3, help='Artículos compartidos por todos los hilos')
+    @click.option('--modo', type=click.Choice(['pesimista', 'optimista']), default=None,
+                  help='Control de concurrencia (por defecto STOCK_CONCURRENCIA)')
+    def benchmark_salidas_command(hilos, vales, articulos, modo):
+        """Medir salidas concurrentes sobre pocos artículos; al final se eliminan los vales de prueba"""
+        aplicacion = current_app._get_current_object()
+        if modo:
+            aplicacion.config['STOCK_CONCURRENCIA'] = modo
+        ids = db.session.scalars(select(Articulo.id_articulo).order_by(Articulo.id_articulo).limit(articulos)).all()
+        almacen = Almacen.query.first()
+        usuario = Usuario.query.first()
+        ingreso = TipoMovAlmacen.query.filter(TipoMovAlmacen.factor_mov > 0).first()
+        salida = TipoMovAlmacen.query.filter_by(cod_tipo_mov_alm='S02').first()
+        if not (ids and almacen and usuario and ingreso and salida):
+            print("Se necesitan artículos, almacenes, usuarios y tipos de movimiento (flask init-data)")
+            return
+        id_almacen, id_user = almacen.id_almacen, usuario.id_user
+        
+        # Saldos previos, para restaurarlos al terminar
+        previos = [
+            {c.key: getattr(fila, c.key) for c in Stock.__table__.columns}
+            for fila in Stock.query.filter(Stock.id_almacen == id_almacen, Stock.id_articulo.in_(ids))
+        ]
+        prefijo = 'BS' + uuid.uuid4().hex[:4].upper()
+        
+        # Stock inicial justo para ~la mitad de las salidas: también se mide el rechazo por sobreventa
+        inicial = max(1, hilos * vales // 2)
+        crear_vale_con_detalles({
+            'cod_vale_almacen': f'{prefijo}INICIO',
+            'id_almacen': id_almacen,
+            'id_tipo_mov_almacen': ingreso.id_tipo_mov_almacen,
+            'detalles': [{'id_articulo': i, 'cantidad': inicial, 'precio_soles': 10} for i in ids]
+        }, id_user)
+        db.session.commit()
+        
+        resultados = {'registrados': 0, 'sin_stock': 0, 'ocupados': 0, 'errores': 0}
+        lock = threading.Lock()
+        
+        def registrar(numero_hilo):
+            with aplicacion.app_context():
+                for numero in range(vales):
+                    lineas = random.sample(ids, random.randint(1, len(ids)))
+                    data = {
+                        'cod_vale_almacen': f'{prefijo}{numero_hilo:02d}{numero:04d}',
+                        'id_almacen': id_almacen,
+                        'id_tipo_mov_almacen': salida.id_tipo_mov_almacen,
+                        'detalles': [{'id_articulo': i, 'cantidad': random.randint(1, 2), 'precio_soles': 0} for i in lineas]
+                    }
+                    try:
+                        crear_vale_con_detalles(data, id_user)
+                        db.session.commit()
+                        clave = 'registrados'
+                    except StockInsuficiente:
+                        clave = 'sin_stock'
+                    except StockError:
+                        clave = 'ocupados'
+                    except OperationalError:
+                        clave = 'errores'  # deadlock o base bloqueada
+                    if clave != 'registrados':
+                        db.session.rollback()
+                    with lock:
+                        resultados[clave] += 1
+        
+        contadores.clear()
+        print(f"{hilos} hilos x {vales} salidas sobre {len(ids)} artículos "
+              f"({aplicacion.config.get('STOCK_CONCURRENCIA')}, {db.engine.dialect.name})")
+        inicio = time.perf_counter()
+        trabajadores = [threading.Thread(target=registrar, args=(n,)) for n in range(hilos)]
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        segundos = time.perf_counter() - inicio
+        
+        metricas = contadores.stats()
+        total = hilos * vales
+        print(f"  {resultados['registrados']} registrados en {segundos:.2f} s "
+              f"({resultados['registrados'] / segundos:,.1f} vales/s)")
+        print(f"  rechazados por stock: {resultados['sin_stock']}, reintentos agotados: {resultados['ocupados']}, "
+              f"errores de bloqueo: {resultados['errores']}")
+        print(f"  conflictos optimistas: {metricas.get('conflictos', 0)} "
+              f"({metricas.get('conflictos', 0) / total:.3f} reintentos por vale)")
+        negativos = Stock.query.filter(Stock.id_almacen == id_almacen, Stock.id_articulo.in_(ids), Stock.cantidad < 0).count()
+        print(f"  saldos negativos: {negativos}")
+        
+        # Eliminar los vales de prueba y restaurar los saldos previos
+        vales_prueba = select(ValeAlmacen.id_vale_almacen).where(ValeAlmacen.cod_vale_almacen.like(f'{prefijo}%'))
+        lineas_prueba = select(ValeAlmacenDet.id_vale_almacen_det).where(ValeAlmacenDet.id_vale_almacen.in_(vales_prueba))
+        db.session.execute(delete(Kardex).where(Kardex.id_vale_almacen_det.in_(lineas_prueba)))
+        db.session.execute(delete(AlertaStock).where(AlertaStock.id_vale_almacen.in_(vales_prueba)))
+        db.session.execute(delete(ValeAlmacenDet).where(ValeAlmacenDet.id_vale_almacen.in_(vales_prueba)))
+        db.session.execute(delete(ValeAlmacen).where(ValeAlmacen.cod_vale_almacen.like(f'{prefijo}%')))
+        db.session.execute(delete(Stock).where(Stock.id_almacen == id_almacen, Stock.id_articulo.in_(ids)))
+        if previos:
+            db.session.execute(insert(Stock), previos)
+        corregir_stock_articulo(ids)
+        db.session.commit()
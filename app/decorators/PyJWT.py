@@ -1,29 +1,66 @@
 # app/decorators/PyJWT.py
-import jwt
 from functools import wraps
-from flask import request, jsonify, current_app
-from app.extensions import blacklist
-from app.models.usuario import Usuario
+from flask import jsonify
+from app.services.auth_service import AuthError, authenticate, has_role
+
+# Mensajes de los recursos de flask-restx cuando falta el rol
+MENSAJES_ROL = {
+    'administrador': "Acceso denegado - Se requiere rol administrador",
+    'inventarios': "Acceso denegado - Se requieren permisos de inventario"
+}
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(" ")[1]
-
-        if not token:
-            return jsonify({'message': 'Token faltante'}), 401
+        try:
+            current_user = authenticate()
+        except AuthError as e:
+            return jsonify({'message': e.message}), e.status
 
-        if token in blacklist:
-            return jsonify({'message': 'Token revocado'}), 401
+        return f(current_user, *args, **kwargs)
+    return decorated
 
+# Variante para recursos de flask-restx: el usuario queda en g.current_user
+def auth_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
         try:
-            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
-            current_user = Usuario.query.get(data['id_user'])
-        except Exception as e:
-            return jsonify({'message': 'Token inválido', 'error': str(e)}), 401
+            authenticate()
+        except AuthError as e:
+            return {'message': e.message}, e.status
 
-        return f(current_user, *args, **kwargs)
+        return f(*args, **kwargs)
     return decorated
+
+# Exigir alguno de los roles; se decide con los claims del token, antes de
+# cargar el usuario. Va sobre @token_required.
+def role_required(*roles):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                permitido = has_role(*roles)
+            except AuthError as e:
+                return jsonify({'message': e.message}), e.status
+            if not permitido:
+                return jsonify({'message': "Acceso denegado"}), 403
+
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+# Variante de role_required para recursos de flask-restx (reemplaza a @auth_required)
+def auth_role_required(*roles):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            try:
+                if not has_role(*roles):
+                    return {'message': MENSAJES_ROL[roles[0]]}, 403
+                authenticate()
+            except AuthError as e:
+                return {'message': e.message}, e.status
+
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
@@ -1,30 +1,5 @@
 # app/decorators/jwt_required.py
-from functools import wraps
-from flask import request, jsonify
-from app.services.auth_service import decode_token
-from app.models.usuario import Usuario
-from app.extensions import blacklist
+from app.decorators.PyJWT import token_required
 
-def jwt_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth_header = request.headers.get("Authorization", None)
-        if not auth_header or not auth_header.startswith("Bearer "):
-            return jsonify({"message": "Token faltante"}), 401
-
-        token = auth_header.split(" ")[1]
-
-        if token in blacklist:
-            return jsonify({"message": "Token revocado"}), 401
-
-        data = decode_token(token)
-
-        if "error" in data:
-            return jsonify({"message": data["error"]}), 401
-
-        current_user = Usuario.query.get(data["id_user"])
-        if not current_user:
-            return jsonify({"message": "Usuario no encontrado"}), 404
-
-        return f(current_user, *args, **kwargs)
-    return decorated
+# Se mantiene el nombre por compatibilidad; comparte la misma capa de autenticación
+jwt_required = token_required
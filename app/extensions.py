@@ -2,10 +2,17 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
+from app.utils.ttl_cache import TTLCache
+from app.utils.revocation import RevocationStore
+from app.utils.password_hasher import PasswordHasher
 
 
-blacklist = set()
-
 db = SQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
+principal_cache = TTLCache('PRINCIPAL_CACHE', maxsize=1024, ttl=60)
+token_versions = TTLCache('TOKEN_VERSION_CACHE', maxsize=4096, ttl=30)
+valorizacion_cache = TTLCache('VALORIZACION_CACHE', maxsize=256, ttl=300)
+capas_cache = TTLCache('CAPAS_CACHE', maxsize=4096, ttl=600)
+revocation_store = RevocationStore()
+password_hasher = PasswordHasher()
@@ -12,6 +12,11 @@ from .vale_almacen import ValeAlmacen
 from .vale_almacen_det import ValeAlmacenDet
 from .stock import Stock
 from .kardex import Kardex
+from .stock_cierre import StockCierre
+from .alerta_stock import AlertaStock
+from .capa_costo import CapaCosto
+from .token_revocado import TokenRevocado
+from .stock_articulo_delta import StockArticuloDelta
 
 __all__ = [
     'TipoDocIdent',
@@ -26,5 +31,10 @@ __all__ = [
     'ValeAlmacen',
     'ValeAlmacenDet',
     'Stock',
-    'Kardex'
+    'Kardex',
+    'StockCierre',
+    'AlertaStock',
+    'CapaCosto',
+    'TokenRevocado',
+    'StockArticuloDelta'
 ]
\ No newline at end of file
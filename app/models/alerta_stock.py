@@ -0,0 +1,35 @@
+# app/models/alerta_stock.py
+from app.extensions import db
+from datetime import datetime
+
+# Cola de alertas de stock bajo: una fila cada vez que un (almacén, artículo) cruza su stock mínimo.
+# Solo se agregan filas; los tableros leen las nuevas con ?after=<cursor> en orden de confirmación
+class AlertaStock(db.Model):
+    __tablename__ = 'alerta_stock'
+    __table_args__ = (
+        # Llave de lectura del feed de alertas
+        db.Index('ix_alerta_stock_transaccion', 'id_transaccion', 'id_alerta_stock'),
+    )
+    
+    id_alerta_stock = db.Column(db.Integer, primary_key=True)
+    id_almacen = db.Column(db.Integer, db.ForeignKey('almacen.id_almacen'), nullable=False)
+    id_articulo = db.Column(db.Integer, db.ForeignKey('articulo.id_articulo'), nullable=False)
+    id_vale_almacen = db.Column(db.Integer, db.ForeignKey('vale_almacen.id_vale_almacen')) # Vale que provocó la alerta (nulo si fue un cambio de mínimo)
+    cantidad = db.Column(db.Numeric(12, 4), nullable=False) # Saldo al momento de la alerta
+    stock_minimo = db.Column(db.Numeric(12, 4), nullable=False)
+    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    id_transaccion = db.Column(db.BigInteger, nullable=False, default=0) # Transacción que la insertó (PostgreSQL; 0 en SQLite)
+    
+    def __repr__(self):
+        return f'<AlertaStock {self.id_alerta_stock}>'
+    
+    def to_dict(self):
+        return {
+            'id_alerta_stock': self.id_alerta_stock,
+            'id_almacen': self.id_almacen,
+            'id_articulo': self.id_articulo,
+            'id_vale_almacen': self.id_vale_almacen,
+            'cantidad': float(self.cantidad),
+            'stock_minimo': float(self.stock_minimo),
+            'fecha_registro': self.fecha_registro.isoformat() if self.fecha_registro else None
+        }
@@ -9,6 +9,7 @@ class Almacen(db.Model):
     cod_almacen = db.Column(db.String(6), unique=True, nullable=False)
     nombre_almacen = db.Column(db.String(50), nullable=False)
     flag_tipo_almacen = db.Column(db.String(1), nullable=False)  # G,M,P,T,O
+    metodo_costeo = db.Column(db.String(4), nullable=False, default='PROM', server_default='PROM')  # PROM (promedio ponderado), FIFO o FEFO
     flag_estado = db.Column(db.String(1), nullable=False, default='1')
     
     def __repr__(self):
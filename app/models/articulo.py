@@ -10,7 +10,7 @@ class Articulo(db.Model):
     nombre_articulo = db.Column(db.String(200), nullable=False)
     descripcion_articulo = db.Column(db.String(500))
     precio_articulo = db.Column(db.Float, nullable=False)
-    stock_articulo = db.Column(db.Integer, default=0)
+    stock_articulo = db.Column(db.Numeric(14, 4), nullable=False, default=0, server_default='0') # Suma del stock de todos los almacenes; los vales la actualizan vía stock_articulo_delta al consolidar
     cod_unidad = db.Column(db.String(4), db.ForeignKey('unidad.cod_unidad'), nullable=False)
     id_categoria = db.Column(db.Integer, db.ForeignKey('categoria.id_categoria'), nullable=False)
     flag_estado = db.Column(db.String(1), nullable=False, default='1')
@@ -22,6 +22,9 @@ class Articulo(db.Model):
     def __repr__(self):
         return f'<Articulo {self.cod_articulo}>'
     
+    # Relaciones precargadas en los listados (ver app/utils/serializers.py)
+    TO_DICT_RELACIONES = ('unidad', 'categoria')
+    
     def to_dict(self):
         return {
             'id_articulo': self.id_articulo,
@@ -29,7 +32,7 @@ class Articulo(db.Model):
             'nombre_articulo': self.nombre_articulo,
             'descripcion_articulo': self.descripcion_articulo,
             'precio_articulo': float(self.precio_articulo),  # Convertir Decimal a float para JSON
-            'stock_articulo': self.stock_articulo,
+            'stock_articulo': float(self.stock_articulo or 0),
             'cod_unidad': self.cod_unidad,
             'id_categoria': self.id_categoria,
             'flag_estado': self.flag_estado,
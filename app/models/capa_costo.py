@@ -0,0 +1,36 @@
+# app/models/capa_costo.py
+from app.extensions import db
+
+# Capas de costo abiertas (lotes ingresados con saldo) de los almacenes FIFO/FEFO.
+# Las capas agotadas se eliminan: la tabla solo guarda lo que aún valoriza el stock
+class CapaCosto(db.Model):
+    __tablename__ = 'capa_costo'
+    __table_args__ = (
+        # Orden de consumo de las capas de un artículo en un almacén
+        db.Index('ix_capa_costo_almacen_articulo', 'id_almacen', 'id_articulo', 'fecha_vencimiento', 'id_capa_costo'),
+    )
+    
+    id_capa_costo = db.Column(db.Integer, primary_key=True)
+    id_almacen = db.Column(db.Integer, db.ForeignKey('almacen.id_almacen'), nullable=False)
+    id_articulo = db.Column(db.Integer, db.ForeignKey('articulo.id_articulo'), nullable=False)
+    id_vale_almacen_det = db.Column(db.Integer, db.ForeignKey('vale_almacen_det.id_vale_almacen_det')) # Nulo en la capa de apertura
+    fecha_ingreso = db.Column(db.DateTime, nullable=False)
+    fecha_vencimiento = db.Column(db.Date)
+    cantidad = db.Column(db.Numeric(12, 4), nullable=False) # Saldo de la capa
+    costo_unitario = db.Column(db.Numeric(16, 4), nullable=False)
+    
+    def __repr__(self):
+        return f'<CapaCosto {self.id_capa_costo}>'
+    
+    def to_dict(self):
+        return {
+            'id_capa_costo': self.id_capa_costo,
+            'id_almacen': self.id_almacen,
+            'id_articulo': self.id_articulo,
+            'id_vale_almacen_det': self.id_vale_almacen_det,
+            'fecha_ingreso': self.fecha_ingreso.isoformat() if self.fecha_ingreso else None,
+            'fecha_vencimiento': self.fecha_vencimiento.isoformat() if self.fecha_vencimiento else None,
+            'cantidad': float(self.cantidad),
+            'costo_unitario': float(self.costo_unitario),
+            'valorizado': round(float(self.cantidad * self.costo_unitario), 2)
+        }
@@ -4,6 +4,10 @@ from app.extensions import db
 # Tabla donde se registra los clientes y proveedores (entidad de relación del sistema)
 class EntidadRelacion(db.Model):
     __tablename__ = 'entidad_relacion'
+    __table_args__ = (
+        # Búsqueda por documento de identidad (alta individual y por lotes)
+        db.Index('ix_entidad_relacion_doc_ident', 'nro_doc_ident', 'id_tipo_doc_ident'),
+    )
     
     id_entidad = db.Column(db.Integer, primary_key=True)
     nombre_entidad = db.Column(db.String(120), nullable=False, unique=True)
@@ -21,6 +25,9 @@ class EntidadRelacion(db.Model):
     def __repr__(self):
         return f'<EntidadRelacion {self.nombre_entidad}>'
     
+    # to_dict() incluye el nombre del tipo de documento
+    TO_DICT_RELACIONES = ('tipo_documento',)
+    
     def to_dict(self):
         return {
             'id_entidad': self.id_entidad,
@@ -3,16 +3,25 @@ from app.extensions import db
 from datetime import datetime
 
 # Tabla para apoyo de reportes de movimientos de almacén (Kardex)
+# Se escribe al registrar los detalles de un vale (app/services/stock_service.py), con el saldo acumulado
 class Kardex(db.Model):
     __tablename__ = 'kardex'
+    __table_args__ = (
+        # Soporta la paginación por llave del kardex de un artículo en un almacén
+        db.Index('ix_kardex_articulo_almacen_id', 'id_articulo', 'id_almacen', 'id_kardex'),
+        # Movimientos posteriores a un cierre de stock
+        db.Index('ix_kardex_almacen_fecha', 'id_almacen', 'fecha'),
+    )
     
     id_kardex = db.Column(db.Integer, primary_key=True)
     id_almacen = db.Column(db.Integer, db.ForeignKey('almacen.id_almacen'), nullable=False)
     id_articulo = db.Column(db.Integer, db.ForeignKey('articulo.id_articulo'), nullable=False)
     id_vale_almacen_det = db.Column(db.Integer, db.ForeignKey('vale_almacen_det.id_vale_almacen_det'), nullable=False)
     fecha = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
-    cantidad = db.Column(db.Numeric(12, 4), nullable=False, default=0)
-    precio_soles = db.Column(db.Numeric(16, 4), nullable=False, default=0)
+    cantidad = db.Column(db.Numeric(12, 4), nullable=False, default=0) # Con signo: ingresos positivos, salidas negativas
+    precio_soles = db.Column(db.Numeric(16, 4), nullable=False, default=0) # Precio de ingreso o costo promedio de salida
+    saldo_cantidad = db.Column(db.Numeric(14, 4), nullable=False, default=0) # Saldo del artículo en el almacén tras el movimiento
+    saldo_valorizado = db.Column(db.Numeric(18, 4), nullable=False, default=0)
     
     # Relaciones
     almacen = db.relationship('Almacen', backref='kardex')
@@ -20,4 +29,17 @@ class Kardex(db.Model):
     vale_detalle = db.relationship('ValeAlmacenDet', backref='kardex')
     
     def __repr__(self):
-        return f'<Kardex {self.id_kardex}>'
\ No newline at end of file
+        return f'<Kardex {self.id_kardex}>'
+    
+    def to_dict(self):
+        return {
+            'id_kardex': self.id_kardex,
+            'id_almacen': self.id_almacen,
+            'id_articulo': self.id_articulo,
+            'id_vale_almacen_det': self.id_vale_almacen_det,
+            'fecha': self.fecha.isoformat() if self.fecha else None,
+            'cantidad': float(self.cantidad) if self.cantidad else 0,
+            'precio_soles': float(self.precio_soles) if self.precio_soles else 0,
+            'saldo_cantidad': float(self.saldo_cantidad) if self.saldo_cantidad else 0,
+            'saldo_valorizado': float(self.saldo_valorizado) if self.saldo_valorizado else 0
+        }
\ No newline at end of file
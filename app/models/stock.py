@@ -1,18 +1,35 @@
 # app/models/stock.py
 from app.extensions import db
 
-#Tabla que se actualiza por trigger de los movimientos de almacén.
+#Saldo por almacén y artículo; lo mantiene app/services/stock_service.py al registrar los detalles de los vales.
 class Stock(db.Model):
     __tablename__ = 'stock'
+    __table_args__ = (
+        # Artículos bajo su stock mínimo: /stock/bajo_stock lee solo estas filas
+        db.Index('ix_stock_bajo_stock_almacen', 'flag_bajo_stock', 'id_almacen'),
+    )
     
     id_almacen = db.Column(db.Integer, db.ForeignKey('almacen.id_almacen'), primary_key=True)
     id_articulo = db.Column(db.Integer, db.ForeignKey('articulo.id_articulo'), primary_key=True)
     cantidad = db.Column(db.Numeric(12, 4), nullable=False, default=0)
     precio_promedio = db.Column(db.Numeric(16, 4), nullable=False, default=0)
+    stock_minimo = db.Column(db.Numeric(12, 4)) # Punto de reposición; nulo = sin alerta
+    flag_bajo_stock = db.Column(db.String(1), nullable=False, default='0', server_default='0') # '1' si cantidad <= stock_minimo
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Se incrementa en cada movimiento (control optimista)
     
     # Relaciones
     almacen = db.relationship('Almacen', backref='stocks')
     articulo = db.relationship('Articulo', backref='stocks')
     
     def __repr__(self):
-        return f'<Stock {self.id_almacen}-{self.id_articulo}>'
\ No newline at end of file
+        return f'<Stock {self.id_almacen}-{self.id_articulo}>'
+    
+    def to_dict(self):
+        return {
+            'id_almacen': self.id_almacen,
+            'id_articulo': self.id_articulo,
+            'cantidad': float(self.cantidad),
+            'precio_promedio': float(self.precio_promedio),
+            'stock_minimo': float(self.stock_minimo) if self.stock_minimo is not None else None,
+            'flag_bajo_stock': self.flag_bajo_stock
+        }
@@ -0,0 +1,14 @@
+# app/models/stock_articulo_delta.py
+from app.extensions import db
+
+# Cambios de stock por artículo aún no sumados a Articulo.stock_articulo. Cada vale solo agrega
+# filas (sin bloquear la fila del artículo); consolidar_stock_articulo() las suma y las elimina
+class StockArticuloDelta(db.Model):
+    __tablename__ = 'stock_articulo_delta'
+    
+    id_stock_articulo_delta = db.Column(db.Integer, primary_key=True)
+    id_articulo = db.Column(db.Integer, db.ForeignKey('articulo.id_articulo'), nullable=False, index=True)
+    cantidad = db.Column(db.Numeric(14, 4), nullable=False) # Con signo, igual que el delta aplicado al stock
+    
+    def __repr__(self):
+        return f'<StockArticuloDelta {self.id_articulo} {self.cantidad}>'
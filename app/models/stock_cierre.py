@@ -0,0 +1,17 @@
+# app/models/stock_cierre.py
+from app.extensions import db
+from datetime import datetime
+
+# Foto del stock al cierre de cada mes; las consultas a una fecha parten del cierre más cercano
+class StockCierre(db.Model):
+    __tablename__ = 'stock_cierre'
+    
+    periodo = db.Column(db.String(6), primary_key=True) # YYYYMM
+    id_almacen = db.Column(db.Integer, db.ForeignKey('almacen.id_almacen'), primary_key=True)
+    id_articulo = db.Column(db.Integer, db.ForeignKey('articulo.id_articulo'), primary_key=True)
+    cantidad = db.Column(db.Numeric(14, 4), nullable=False, default=0)
+    precio_promedio = db.Column(db.Numeric(16, 4), nullable=False, default=0)
+    fecha_registro = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<StockCierre {self.periodo} {self.id_almacen}-{self.id_articulo}>'
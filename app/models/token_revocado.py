@@ -0,0 +1,12 @@
+# app/models/token_revocado.py
+from app.extensions import db
+
+# Tabla de tokens revocados (logout) compartida por todos los procesos
+class TokenRevocado(db.Model):
+    __tablename__ = 'token_revocado'
+
+    jti = db.Column(db.String(64), primary_key=True)
+    exp = db.Column(db.Integer, nullable=False, index=True)  # expiración del token (epoch en segundos)
+
+    def __repr__(self):
+        return f'<TokenRevocado {self.jti}>'
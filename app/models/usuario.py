@@ -1,6 +1,8 @@
 # app/models/usuario.py
-from app.extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.extensions import db, password_hasher
+
+# Clave de session.info con las versiones de token a revocar cuando confirme la transacción
+VERSIONES_REVOCADAS = 'versiones_revocadas'
 
 # Tabla donde se registran los usuarios del sistema
 class Usuario(db.Model):
@@ -17,19 +19,40 @@ class Usuario(db.Model):
     flag_administrador = db.Column(db.String(1), nullable=False, default='0')
     flag_inventarios = db.Column(db.String(1), nullable=False, default='0')
     flag_estado = db.Column(db.String(1), nullable=False, default='1')
+    token_version = db.Column(db.Integer, nullable=False, default=0, server_default='0') # Se incrementa para invalidar tokens emitidos
     
     # Relaciones
     tipo_documento = db.relationship('TipoDocIdent', backref='usuarios')
     
+    # El hash se calcula con el límite de concurrencia de password_hasher (503 si está saturado)
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = password_hasher.hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return password_hasher.verify(self.password, password)
+    
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password)
+    
+    # Roles y estado: al cambiar cualquiera, los tokens emitidos dejan de valer
+    CAMPOS_TOKEN = ('flag_administrador', 'flag_inventarios', 'flag_estado')
+    
+    def sync_token_version(self):
+        """Si cambiaron roles o estado, invalidar los tokens emitidos antes del cambio"""
+        estado = db.inspect(self)
+        if any(estado.attrs[campo].history.has_changes() for campo in self.CAMPOS_TOKEN):
+            anterior = self.token_version or 0
+            self.token_version = anterior + 1
+            # La caché de versiones es por proceso: la versión anterior se revoca también
+            # en el almacén compartido para que los demás workers la rechacen de inmediato
+            db.session.info.setdefault(VERSIONES_REVOCADAS, []).append((self.id_user, anterior))
     
     def __repr__(self):
         return f'<Usuario {self.login_user}>'
     
+    # Nunca se devuelve en respuestas, ni siquiera pedido en ?fields=
+    CAMPOS_OCULTOS = ('password',)
+    
     def to_dict(self):
         return {
             'id_user': self.id_user,
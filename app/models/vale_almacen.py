@@ -5,6 +5,10 @@ from datetime import datetime
 #Tabla donde se registra la cabecera de un vale de almacén
 class ValeAlmacen(db.Model):
     __tablename__ = 'vale_almacen'
+    __table_args__ = (
+        # Soporta la paginación por llave (fecha_vale, id_vale_almacen) de los listados
+        db.Index('ix_vale_almacen_fecha_vale_id', 'fecha_vale', 'id_vale_almacen'),
+    )
     
     id_vale_almacen = db.Column(db.Integer, primary_key=True)
     cod_vale_almacen = db.Column(db.String(12), unique=True, nullable=False)
@@ -30,6 +34,9 @@ class ValeAlmacen(db.Model):
     def __repr__(self):
         return f'<ValeAlmacen {self.cod_vale_almacen}>'
     
+    # to_dict() muestra los nombres de almacén, movimiento, usuario y entidad
+    TO_DICT_RELACIONES = ('almacen', 'tipo_movimiento', 'usuario', 'entidad')
+    
     def to_dict(self):
         return {
             'id_vale_almacen': self.id_vale_almacen,
@@ -45,7 +52,7 @@ class ValeAlmacen(db.Model):
             'nro_documento': self.nro_documento,
             'flag_estado': self.flag_estado,
             'almacen_nombre': self.almacen.nombre_almacen if self.almacen else None,
-            'tipo_movimiento_nombre': self.tipo_movimiento.nombre_tipo_mov if self.tipo_movimiento else None,
+            'tipo_movimiento_nombre': self.tipo_movimiento.desc_tipo_mov_almacen if self.tipo_movimiento else None,
             'usuario_nombre': self.usuario.nombre_user if self.usuario else None,
             'entidad_nombre': self.entidad.nombre_entidad if self.entidad else None
         }
\ No newline at end of file
@@ -11,6 +11,7 @@ class ValeAlmacenDet(db.Model):
     id_articulo = db.Column(db.Integer, db.ForeignKey('articulo.id_articulo'), nullable=False)
     cantidad = db.Column(db.Numeric(12, 4), nullable=False, default=0)
     precio_soles = db.Column(db.Numeric(12, 4), nullable=False, default=0)
+    fecha_vencimiento = db.Column(db.Date) # Vencimiento del lote ingresado (almacenes FEFO)
     flag_estado = db.Column(db.String(1), nullable=False, default='1')
     
     # Relaciones
@@ -19,6 +20,9 @@ class ValeAlmacenDet(db.Model):
     def __repr__(self):
         return f'<ValeAlmacenDet {self.id_vale_almacen_det}>'
     
+    # to_dict() incluye el nombre del artículo
+    TO_DICT_RELACIONES = ('articulo',)
+    
     def to_dict(self):
         return {
             'id_vale_almacen_det': self.id_vale_almacen_det,
@@ -27,6 +31,7 @@ class ValeAlmacenDet(db.Model):
             'id_articulo': self.id_articulo,
             'cantidad': float(self.cantidad) if self.cantidad else 0,
             'precio_soles': float(self.precio_soles) if self.precio_soles else 0,
+            'fecha_vencimiento': self.fecha_vencimiento.isoformat() if self.fecha_vencimiento else None,
             'flag_estado': self.flag_estado,
             'articulo_nombre': self.articulo.nombre_articulo if self.articulo else None
         }
\ No newline at end of file
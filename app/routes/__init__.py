@@ -6,6 +6,8 @@ from .entidad_relacion import entidad_relacion_bp
 from .reportes import reportes_bp
 from .usuario import usuario_bp
 from .vale_almacen import vale_almacen_bp
+from .kardex import kardex_bp
+from .stock import stock_bp
 
 def register_blueprints(app):
     app.register_blueprint(main_bp)
@@ -15,6 +17,8 @@ def register_blueprints(app):
     app.register_blueprint(reportes_bp, url_prefix='/reportes')
     app.register_blueprint(usuario_bp, url_prefix='/usuarios')
     app.register_blueprint(vale_almacen_bp, url_prefix='/vales_almacen')
+    app.register_blueprint(kardex_bp, url_prefix='/kardex')
+    app.register_blueprint(stock_bp, url_prefix='/stock')
 
 # Registrar namespaces de la API
 from app.routes.auth_docs import auth_ns
@@ -1,18 +1,25 @@
 # app/routes/articulo.py
+import io
 from flask import Blueprint, request, jsonify
 from app.models.articulo import Articulo
 from app.extensions import db
 from app.services.auth_service import generate_token
-from app.decorators.PyJWT import token_required
+from app.decorators.PyJWT import role_required, token_required
+from app.services.articulo_import_service import ImportacionError, ImportacionInterrumpida, importar_articulos
+from app.services.articulo_search_service import get_search_limit, search_articulos
+from app.utils.serializers import serialize_list
+from app.utils.streaming import stream_ndjson, wants_ndjson
 
 articulo_bp = Blueprint('articulo', __name__)
 
-# Obtener todos los artículos
+# Obtener todos los artículos (Accept: application/x-ndjson para recibirlos en streaming)
 @articulo_bp.route('/', methods=['GET'])
 @token_required
 def ConsultarArticulos(current_user):
-    articulos = Articulo.query.all()
-    output = [articulo.to_dict() for articulo in articulos]
+    if wants_ndjson():
+        return stream_ndjson(Articulo.query.order_by(Articulo.id_articulo), Articulo)
+
+    output = serialize_list(Articulo.query, Articulo)
 
     return jsonify({'articulos': output}), 200
 
@@ -40,6 +47,10 @@ def CrearArticulo(current_user):
         if not data.get(campo):
             return jsonify({"message": f"Falta el campo: {campo}"}), 400
 
+    # El stock total se calcula desde los vales de almacén
+    if data.get('stock_articulo'):
+        return jsonify({"message": "stock_articulo se calcula desde los vales de almacén; registre un vale de ingreso"}), 400
+
     # ✅ Validar relaciones existan
     from app.models.unidad import Unidad
     from app.models.categoria import Categoria
@@ -59,7 +70,6 @@ def CrearArticulo(current_user):
         nombre_articulo=data['nombre_articulo'],
         descripcion_articulo=data.get('descripcion_articulo', ''),
         precio_articulo=data.get('precio_articulo', 0.0),
-        stock_articulo=data.get('stock_articulo', 0),
         cod_unidad=data['cod_unidad'],
         id_categoria=data['id_categoria']
     )
@@ -72,22 +82,39 @@ def CrearArticulo(current_user):
         "id_articulo": articulo.id_articulo
     }), 201
 
+# Importar artículos desde un CSV (archivo 'archivo' en multipart o el CSV como cuerpo).
+# Con ?actualizar=1 los códigos existentes se actualizan en lugar de informarse como error
+@articulo_bp.route('/importar', methods=['POST'])
+@role_required('administrador')
+@token_required
+def ImportarArticulos(current_user):
+    origen = request.files['archivo'].stream if 'archivo' in request.files else request.stream
+    archivo = io.TextIOWrapper(origen, encoding='utf-8-sig', newline='')
+    try:
+        resumen = importar_articulos(archivo, actualizar=request.args.get('actualizar') == '1')
+    except ImportacionInterrumpida as e:
+        # Los lotes anteriores a la fila interrumpida ya quedaron guardados
+        return jsonify(e.to_dict()), 207
+    except ImportacionError as e:
+        return jsonify({"message": str(e)}), 400
+    return jsonify({"message": "Importación terminada", **resumen}), 200
+
 # Actualizar un artículo (solo para administradores)
 @articulo_bp.route('/<int:id_articulo>', methods=['PUT'])
+@role_required('administrador')
 @token_required
 def ActualizarArticulo(current_user, id_articulo):
-    if current_user.flag_administrador != '1':
-        return jsonify({"message": "Acceso denegado"}), 403
-
     articulo = Articulo.query.get(id_articulo)
     if not articulo:
         return jsonify({"message": "Artículo no encontrado"}), 404
 
     data = request.get_json()
+    if 'stock_articulo' in data:
+        return jsonify({"message": "stock_articulo se calcula desde los vales de almacén y no puede modificarse"}), 400
+
     articulo.nombre_articulo = data.get("nombre_articulo", articulo.nombre_articulo)
     articulo.descripcion_articulo = data.get("descripcion_articulo", articulo.descripcion_articulo)
     articulo.precio_articulo = data.get("precio_articulo", articulo.precio_articulo)
-    articulo.stock_articulo = data.get("stock_articulo", articulo.stock_articulo)
 
     db.session.commit()
 
@@ -95,11 +122,9 @@ def ActualizarArticulo(current_user, id_articulo):
 
 # Inactivar un artículo (solo para administradores)
 @articulo_bp.route('/<int:id_articulo>', methods=['DELETE'])
+@role_required('administrador')
 @token_required
 def InactivarArticulo(current_user, id_articulo):
-    if current_user.flag_administrador != '1':
-        return jsonify({"message": "Acceso denegado"}), 403
-
     articulo = Articulo.query.get(id_articulo)
     if not articulo:
         return jsonify({"message": "Artículo no encontrado"}), 404
@@ -109,13 +134,13 @@ def InactivarArticulo(current_user, id_articulo):
 
     return jsonify({"message": "Artículo inactivado exitosamente"}), 200
 
-# Buscar artículos por nombre
+# Buscar artículos por nombre (sin distinguir acentos, ordenados por relevancia)
 @articulo_bp.route('/buscar', methods=['GET'])
 @token_required
 def BuscarArticulos(current_user):
     nombre = request.args.get('nombre', '')
-    articulos = Articulo.query.filter(Articulo.nombre_articulo.ilike(f'%{nombre}%')).all()
-    output = [articulo.to_dict() for articulo in articulos]
+    limit = get_search_limit(request.args.get('limit'))
+    output = serialize_list(search_articulos(nombre, limit), Articulo)
 
     return jsonify({'articulos': output}), 200
 
@@ -123,8 +148,7 @@ def BuscarArticulos(current_user):
 @articulo_bp.route('/categoria/<int:id_categoria>', methods=['GET'])
 @token_required
 def ConsultarArticulosPorCategoria(current_user, id_categoria):
-    articulos = Articulo.query.filter_by(id_categoria=id_categoria).all()
-    output = [articulo.to_dict() for articulo in articulos]
+    output = serialize_list(Articulo.query.filter_by(id_categoria=id_categoria), Articulo)
 
     return jsonify({'articulos': output}), 200
 
@@ -132,7 +156,6 @@ def ConsultarArticulosPorCategoria(current_user, id_categoria):
 @articulo_bp.route('/unidad/<string:cod_unidad>', methods=['GET'])
 @token_required
 def ConsultarArticulosPorUnidad(current_user, cod_unidad):
-    articulos = Articulo.query.filter_by(cod_unidad=cod_unidad).all()
-    output = [articulo.to_dict() for articulo in articulos]
+    output = serialize_list(Articulo.query.filter_by(cod_unidad=cod_unidad), Articulo)
 
     return jsonify({'articulos': output}), 200
\ No newline at end of file
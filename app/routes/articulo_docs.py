@@ -1,13 +1,19 @@
 # app/routes/articulo_docs.py
-from flask import request
+import io
+from flask import g, request
 from flask_restx import Resource, fields, Namespace, reqparse
+from werkzeug.datastructures import FileStorage
+from sqlalchemy import select
 from app.models.articulo import Articulo
 from app.models.unidad import Unidad
 from app.models.categoria import Categoria
 from app.models.usuario import Usuario
+from app.models.stock import Stock
 from app.extensions import db
-from app.decorators.PyJWT import token_required
-from app.services.auth_service import decode_token
+from app.decorators.PyJWT import auth_required, auth_role_required, token_required
+from app.services.articulo_import_service import ImportacionError, ImportacionInterrumpida, importar_articulos
+from app.services.articulo_search_service import get_search_limit, search_articulos
+from app.utils.serializers import marshal_unless_fields, serialize_list
 
 # Crear namespace para Swagger
 articulo_ns = Namespace('articulos', description='Operaciones de gestión de artículos')
@@ -19,7 +25,7 @@ articulo_model = articulo_ns.model('Articulo', {
     'nombre_articulo': fields.String(required=True, description='Nombre del artículo'),
     'descripcion_articulo': fields.String(description='Descripción del artículo'),
     'precio_articulo': fields.Float(required=True, description='Precio del artículo'),
-    'stock_articulo': fields.Integer(required=True, description='Stock disponible'),
+    'stock_articulo': fields.Float(readOnly=True, description='Stock total de todos los almacenes (calculado desde los vales)'),
     'cod_unidad': fields.String(required=True, description='Código de unidad de medida'),
     'id_categoria': fields.Integer(required=True, description='ID de la categoría'),
     'flag_estado': fields.String(description='Estado del artículo (1:Activo, 0:Inactivo)')
@@ -31,7 +37,6 @@ articulo_create_model = articulo_ns.model('CrearArticulo', {
     'nombre_articulo': fields.String(required=True, description='Nombre del artículo'),
     'descripcion_articulo': fields.String(description='Descripción del artículo'),
     'precio_articulo': fields.Float(required=True, description='Precio del artículo'),
-    'stock_articulo': fields.Integer(required=True, description='Stock disponible'),
     'cod_unidad': fields.String(required=True, description='Código de unidad de medida'),
     'id_categoria': fields.Integer(required=True, description='ID de la categoría')
 })
@@ -41,7 +46,6 @@ articulo_update_model = articulo_ns.model('ActualizarArticulo', {
     'nombre_articulo': fields.String(description='Nombre del artículo'),
     'descripcion_articulo': fields.String(description='Descripción del artículo'),
     'precio_articulo': fields.Float(description='Precio del artículo'),
-    'stock_articulo': fields.Integer(description='Stock disponible'),
     'cod_unidad': fields.String(description='Código de unidad de medida'),
     'id_categoria': fields.Integer(description='ID de la categoría')
 })
@@ -52,7 +56,7 @@ articulo_response_model = articulo_ns.model('ArticuloResponse', {
     'nombre_articulo': fields.String(description='Nombre del artículo'),
     'descripcion_articulo': fields.String(description='Descripción del artículo'),
     'precio_articulo': fields.Float(description='Precio del artículo'),
-    'stock_articulo': fields.Integer(description='Stock disponible'),
+    'stock_articulo': fields.Float(description='Stock total de todos los almacenes'),
     'cod_unidad': fields.String(description='Código de unidad de medida'),
     'id_categoria': fields.Integer(description='ID de la categoría'),
     'flag_estado': fields.String(description='Estado del artículo')
@@ -61,6 +65,7 @@ articulo_response_model = articulo_ns.model('ArticuloResponse', {
 # Parsers para parámetros de consulta
 buscar_parser = reqparse.RequestParser()
 buscar_parser.add_argument('nombre', location='args', required=True, help='Nombre a buscar')
+buscar_parser.add_argument('limit', type=int, location='args', help='Cantidad máxima de resultados (por defecto 20, máximo 100)')
 
 categoria_parser = reqparse.RequestParser()
 categoria_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
@@ -72,26 +77,44 @@ unidad_parser.add_argument('Authorization', location='headers', required=True, h
 auth_parser = reqparse.RequestParser()
 auth_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
 
+importar_parser = auth_parser.copy()
+importar_parser.add_argument('archivo', type=FileStorage, location='files', required=True,
+                             help='CSV con cod_articulo, nombre_articulo, cod_unidad, id_categoria '
+                                  '(opcionales: descripcion_articulo, precio_articulo)')
+importar_parser.add_argument('actualizar', location='args', help='1 para actualizar los códigos existentes')
+
+error_importacion_model = articulo_ns.model('ErrorImportacionArticulo', {
+    'fila': fields.Integer(description='Número de fila del CSV (la 1 es el encabezado)'),
+    'cod_articulo': fields.String(description='Código del artículo de la fila'),
+    'message': fields.String(description='Motivo por el que se omitió la fila')
+})
+
+importacion_response_model = articulo_ns.model('ImportacionArticulosResponse', {
+    'message': fields.String(description='Mensaje de resultado'),
+    'procesadas': fields.Integer(description='Filas leídas'),
+    'insertadas': fields.Integer(description='Artículos nuevos'),
+    'actualizadas': fields.Integer(description='Artículos existentes actualizados'),
+    'total_errores': fields.Integer(description='Filas omitidas por errores'),
+    'errores': fields.List(fields.Nested(error_importacion_model), description='Errores por fila (hasta 1000)')
+})
+
+bajo_stock_parser = auth_parser.copy()
+bajo_stock_parser.add_argument('id_almacen', type=int, location='args', help='Solo el stock bajo de este almacén')
+
 # Endpoints con Swagger Documentation - CORREGIDOS
 @articulo_ns.route('/')
 class ArticuloList(Resource):
+    @auth_required
     @articulo_ns.expect(auth_parser)
     @articulo_ns.response(200, 'Lista de artículos obtenida exitosamente')
     @articulo_ns.response(401, 'Token inválido o faltante')
-    @articulo_ns.marshal_list_with(articulo_response_model)
+    @marshal_unless_fields(articulo_ns, articulo_response_model, as_list=True)
     def get(self):
         """Obtener todos los artículos activos"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token usando el decorator
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        articulos = Articulo.query.filter_by(flag_estado='1').all()
-        return [articulo.to_dict() for articulo in articulos], 200
+        articulos = Articulo.query.filter_by(flag_estado='1')
+        return serialize_list(articulos, Articulo), 200
 
+    @auth_required
     @articulo_ns.expect(auth_parser, articulo_create_model)
     @articulo_ns.response(201, 'Artículo creado exitosamente')
     @articulo_ns.response(400, 'Datos inválidos o faltantes')
@@ -99,17 +122,10 @@ class ArticuloList(Resource):
     @articulo_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
     def post(self):
         """Crear un nuevo artículo (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token y permisos
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        # if not current_user or current_user.flag_administrador != '1':
+        current_user = g.current_user
+        # if current_user.flag_administrador != '1':
         #     return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
 
         # ✅ VALIDACIONES COMPLETAS Y CORRECTAS
@@ -140,13 +156,13 @@ class ArticuloList(Resource):
 
         # 6. Validar valores numéricos
         precio_articulo = data.get('precio_articulo', 0.0)
-        stock_articulo = data.get('stock_articulo', 0)
 
         if precio_articulo < 0:
             return {"message": "El precio no puede ser negativo"}, 400
 
-        if stock_articulo < 0:
-            return {"message": "El stock no puede ser negativo"}, 400
+        # El stock total se calcula desde los vales de almacén
+        if data.get('stock_articulo'):
+            return {"message": "stock_articulo se calcula desde los vales de almacén; registre un vale de ingreso"}, 400
 
         # ✅ CREAR EL ARTÍCULO CON TODOS LOS CAMPOS REQUERIDOS
         try:
@@ -155,7 +171,6 @@ class ArticuloList(Resource):
                 nombre_articulo=data.get('nombre_articulo'),
                 descripcion_articulo=data.get('descripcion_articulo', ''),
                 precio_articulo=precio_articulo,
-                stock_articulo=stock_articulo,
                 cod_unidad=cod_unidad,
                 id_categoria=id_categoria
             )
@@ -173,29 +188,44 @@ class ArticuloList(Resource):
             db.session.rollback()
             return {"message": f"Error al crear el artículo: {str(e)}"}, 500
 
+@articulo_ns.route('/importar')
+class ImportarArticulos(Resource):
+    @auth_role_required('administrador')
+    @articulo_ns.expect(importar_parser)
+    @articulo_ns.response(200, 'Importación terminada (con el detalle de filas omitidas)', importacion_response_model)
+    @articulo_ns.response(207, 'Lectura interrumpida tras guardar algunos lotes (resumen de lo guardado y fila_interrumpida)')
+    @articulo_ns.response(400, 'Encabezado incompleto o archivo no UTF-8 (nada guardado)')
+    @articulo_ns.response(401, 'Token inválido o faltante')
+    @articulo_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
+    def post(self):
+        """Importar artículos desde un CSV en streaming, validando y escribiendo por lotes"""
+        args = importar_parser.parse_args()
+        archivo = io.TextIOWrapper(args['archivo'].stream, encoding='utf-8-sig', newline='')
+        try:
+            resumen = importar_articulos(archivo, actualizar=args.get('actualizar') == '1')
+        except ImportacionInterrumpida as e:
+            # Los lotes anteriores a la fila interrumpida ya quedaron guardados
+            return e.to_dict(), 207
+        except ImportacionError as e:
+            return {"message": str(e)}, 400
+        return {"message": "Importación terminada", **resumen}, 200
+
 @articulo_ns.route('/<int:id_articulo>')
 class ArticuloDetail(Resource):
+    @auth_required
     @articulo_ns.expect(auth_parser)
     @articulo_ns.response(200, 'Artículo obtenido exitosamente', articulo_response_model)
     @articulo_ns.response(401, 'Token inválido o faltante')
     @articulo_ns.response(404, 'Artículo no encontrado')
     def get(self, id_articulo):
         """Obtener un artículo por ID"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         articulo = Articulo.query.get(id_articulo)
         if not articulo or articulo.flag_estado != '1':
             return {"message": "Artículo no encontrado"}, 404
 
         return articulo.to_dict(), 200
 
+    @auth_role_required('administrador')
     @articulo_ns.expect(auth_parser, articulo_update_model)
     @articulo_ns.response(200, 'Artículo actualizado exitosamente')
     @articulo_ns.response(400, 'Datos inválidos')
@@ -204,21 +234,8 @@ class ArticuloDetail(Resource):
     @articulo_ns.response(404, 'Artículo no encontrado')
     def put(self, id_articulo):
         """Actualizar un artículo (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        from app.models.usuario import Usuario
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         articulo = Articulo.query.get(id_articulo)
         if not articulo:
             return {"message": "Artículo no encontrado"}, 404
@@ -227,8 +244,8 @@ class ArticuloDetail(Resource):
         if 'precio_articulo' in data and data['precio_articulo'] < 0:
             return {"message": "El precio no puede ser negativo"}, 400
 
-        if 'stock_articulo' in data and data['stock_articulo'] < 0:
-            return {"message": "El stock no puede ser negativo"}, 400
+        if 'stock_articulo' in data:
+            return {"message": "stock_articulo se calcula desde los vales de almacén y no puede modificarse"}, 400
 
         # Actualizar campos
         if 'nombre_articulo' in data:
@@ -237,8 +254,6 @@ class ArticuloDetail(Resource):
             articulo.descripcion_articulo = data['descripcion_articulo']
         if 'precio_articulo' in data:
             articulo.precio_articulo = data['precio_articulo']
-        if 'stock_articulo' in data:
-            articulo.stock_articulo = data['stock_articulo']
         if 'cod_unidad' in data:
             articulo.cod_unidad = data['cod_unidad']
         if 'id_categoria' in data:
@@ -248,6 +263,7 @@ class ArticuloDetail(Resource):
 
         return {"message": "Artículo actualizado exitosamente"}, 200
 
+    @auth_role_required('administrador')
     @articulo_ns.expect(auth_parser)
     @articulo_ns.response(200, 'Artículo inactivado exitosamente')
     @articulo_ns.response(401, 'Token inválido o faltante')
@@ -255,20 +271,6 @@ class ArticuloDetail(Resource):
     @articulo_ns.response(404, 'Artículo no encontrado')
     def delete(self, id_articulo):
         """Inactivar un artículo (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        from app.models.usuario import Usuario
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         articulo = Articulo.query.get(id_articulo)
         if not articulo:
             return {"message": "Artículo no encontrado"}, 404
@@ -283,99 +285,74 @@ class BuscarArticulos(Resource):
     @articulo_ns.expect(buscar_parser)
     @articulo_ns.response(200, 'Búsqueda completada exitosamente')
     @articulo_ns.response(400, 'Parámetro de búsqueda faltante')
-    @articulo_ns.marshal_list_with(articulo_response_model)
+    @marshal_unless_fields(articulo_ns, articulo_response_model, as_list=True)
     def get(self):
-        """Buscar artículos por nombre"""
-        args = buscar_parser.parse_args()
-        nombre = args['nombre']
+        """Buscar artículos por nombre, sin distinguir acentos y ordenados por relevancia"""
+        nombre = request.args.get('nombre')
         
         if not nombre:
             return {"message": "El parámetro 'nombre' es requerido"}, 400
 
-        articulos = Articulo.query.filter(
-            Articulo.nombre_articulo.ilike(f'%{nombre}%'),
-            Articulo.flag_estado == '1'
-        ).all()
+        articulos = search_articulos(
+            nombre,
+            get_search_limit(request.args.get('limit')),
+            Articulo.query.filter(Articulo.flag_estado == '1')
+        )
         
-        return [articulo.to_dict() for articulo in articulos], 200
+        return serialize_list(articulos, Articulo), 200
 
 @articulo_ns.route('/categoria/<int:id_categoria>')
 class ArticulosPorCategoria(Resource):
+    @auth_required
     @articulo_ns.expect(categoria_parser)
     @articulo_ns.response(200, 'Artículos obtenidos exitosamente')
     @articulo_ns.response(401, 'Token inválido o faltante')
-    @articulo_ns.marshal_list_with(articulo_response_model)
+    @marshal_unless_fields(articulo_ns, articulo_response_model, as_list=True)
     def get(self, id_categoria):
         """Obtener artículos por categoría"""
-        args = categoria_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         articulos = Articulo.query.filter_by(
             id_categoria=id_categoria, 
             flag_estado='1'
-        ).all()
+        )
         
-        return [articulo.to_dict() for articulo in articulos], 200
+        return serialize_list(articulos, Articulo), 200
 
 @articulo_ns.route('/unidad/<string:cod_unidad>')
 class ArticulosPorUnidad(Resource):
+    @auth_required
     @articulo_ns.expect(unidad_parser)
     @articulo_ns.response(200, 'Artículos obtenidos exitosamente')
     @articulo_ns.response(401, 'Token inválido o faltante')
-    @articulo_ns.marshal_list_with(articulo_response_model)
+    @marshal_unless_fields(articulo_ns, articulo_response_model, as_list=True)
     def get(self, cod_unidad):
         """Obtener artículos por unidad de medida"""
-        args = unidad_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         articulos = Articulo.query.filter_by(
             cod_unidad=cod_unidad, 
             flag_estado='1'
-        ).all()
+        )
         
-        return [articulo.to_dict() for articulo in articulos], 200
+        return serialize_list(articulos, Articulo), 200
 
 @articulo_ns.route('/inventario/bajo-stock')
 class ArticulosBajoStock(Resource):
-    @articulo_ns.expect(auth_parser)
+    @auth_role_required('inventarios')
+    @articulo_ns.expect(bajo_stock_parser)
     @articulo_ns.response(200, 'Artículos con bajo stock obtenidos')
     @articulo_ns.response(401, 'Token inválido o faltante')
     @articulo_ns.response(403, 'Acceso denegado')
-    @articulo_ns.marshal_list_with(articulo_response_model)
+    @marshal_unless_fields(articulo_ns, articulo_response_model, as_list=True)
     def get(self):
         """Obtener artículos con stock bajo (Requiere permisos de inventario)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos de inventario
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        from app.models.usuario import Usuario
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_inventarios != '1':
-            return {"message": "Acceso denegado - Se requieren permisos de inventario"}, 403
-
-        # Definir umbral de stock bajo (puede ser configurable)
-        UMBRAL_STOCK_BAJO = 10
+        # Artículos en o bajo el stock mínimo de algún almacén (o del almacén ?id_almacen=),
+        # según la marca flag_bajo_stock que mantiene el registro de vales
+        bajo_stock = select(Stock.id_articulo).where(Stock.flag_bajo_stock == '1')
+        id_almacen = request.args.get('id_almacen', type=int)
+        if id_almacen:
+            bajo_stock = bajo_stock.where(Stock.id_almacen == id_almacen)
         
         articulos = Articulo.query.filter(
-            Articulo.stock_articulo <= UMBRAL_STOCK_BAJO,
+            Articulo.id_articulo.in_(bajo_stock),
             Articulo.flag_estado == '1'
-        ).all()
+        )
         
-        return [articulo.to_dict() for articulo in articulos], 200
\ No newline at end of file
+        return serialize_list(articulos, Articulo), 200
\ No newline at end of file
@@ -1,8 +1,8 @@
 # app/routes/auth.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
 from app.models.usuario import Usuario  # Cambiado de User a Usuario
-from app.extensions import db, blacklist
-from app.services.auth_service import generate_token
+from app.extensions import db
+from app.services.auth_service import generate_token, invalidate_principal, revoke_token
 from app.decorators.PyJWT import token_required
 
 auth_bp = Blueprint('auth', __name__)
@@ -56,7 +56,12 @@ def login():
 
     user = Usuario.query.filter_by(login_user=login_user).first()
     if user and user.check_password(password):
-        token = generate_token(user.id_user)  # Cambiado de user.id a user.id_user
+        # Actualizar hashes generados con un método o costo anterior
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+            invalidate_principal(user.id_user)
+        token = generate_token(user)
         return jsonify({
             "access_token": token,
             "user": {
@@ -74,16 +79,17 @@ def login():
 @auth_bp.route('/logout', methods=['POST'])
 @token_required
 def logout(current_user):
-    token = request.headers['Authorization'].split(" ")[1]
-    blacklist.add(token)
+    revoke_token(g.token, g.token_payload)
     return jsonify({"message": "Logout exitoso, token revocado"}), 200
 
 #eliminacion de usuario
 @auth_bp.route('/delete_account', methods=['DELETE'])
 @token_required
 def delete_account(current_user):
+    id_user = current_user.id_user
     db.session.delete(current_user)
     db.session.commit()
+    invalidate_principal(id_user)
     return jsonify({"message": "Cuenta eliminada exitosamente"}), 200
 
 #actualizacion de usuario
@@ -108,6 +114,7 @@ def update_account(current_user):
         current_user.set_password(data.get("password"))
 
     db.session.commit()
+    invalidate_principal(current_user.id_user)
     return jsonify({"message": "Cuenta actualizada exitosamente"}), 200
 
 #cambio de contraseña
@@ -123,6 +130,7 @@ def change_password(current_user):
 
     current_user.set_password(new_password)
     db.session.commit()
+    invalidate_principal(current_user.id_user)
     return jsonify({"message": "Contraseña cambiada exitosamente"}), 200
 
 #recuperacion de contraseña
@@ -140,6 +148,7 @@ def reset_password():
 
     user.set_password(new_password)
     db.session.commit()
+    invalidate_principal(user.id_user)
     return jsonify({"message": "Contraseña restablecida exitosamente"}), 200
 
 # Obtener información del usuario actual
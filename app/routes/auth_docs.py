@@ -1,9 +1,9 @@
 # app/routes/auth_docs.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, g, request, jsonify
 from app.models.usuario import Usuario  # Cambiado de User a Usuario
-from app.extensions import db, blacklist
-from app.services.auth_service import generate_token
-from app.decorators.PyJWT import token_required
+from app.extensions import db
+from app.services.auth_service import generate_token, invalidate_principal, revoke_token
+from app.decorators.PyJWT import auth_required, token_required
 from flask_restx import Resource, fields, Namespace, reqparse
 
 # Crear namespace para Swagger
@@ -124,7 +124,11 @@ class Login(Resource):
 
         user = Usuario.query.filter_by(login_user=login_user).first()
         if user and user.check_password(password):
-            token = generate_token(user.id_user)
+            if user.password_needs_rehash():
+                user.set_password(password)
+                db.session.commit()
+                invalidate_principal(user.id_user)
+            token = generate_token(user)
             return {
                 "access_token": token,
                 "user": {
@@ -140,61 +144,42 @@ class Login(Resource):
 
 @auth_ns.route('/logout')
 class Logout(Resource):
+    @auth_required
     @auth_ns.expect(auth_parser)
     @auth_ns.response(200, 'Logout exitoso')
     @auth_ns.response(401, 'Token inválido o faltante')
     def post(self):
         """Cerrar sesión y revocar token"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        blacklist.add(token)
+        revoke_token(g.token, g.token_payload)
         return {"message": "Logout exitoso, token revocado"}, 200
 
 @auth_ns.route('/delete_account')
 class DeleteAccount(Resource):
+    @auth_required
     @auth_ns.expect(auth_parser)
     @auth_ns.response(200, 'Cuenta eliminada exitosamente')
     @auth_ns.response(401, 'Token inválido o faltante')
     def delete(self):
         """Eliminar cuenta de usuario actual"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        data = decode_token(token)
-        if "error" in data:
-            return {"message": data["error"]}, 401
-            
-        current_user = Usuario.query.get(data["user_id"])
-        if not current_user:
-            return {"message": "Usuario no encontrado"}, 404
+        current_user = g.current_user
 
+        id_user = current_user.id_user
         db.session.delete(current_user)
         db.session.commit()
+        invalidate_principal(id_user)
         return {"message": "Cuenta eliminada exitosamente"}, 200
 
 @auth_ns.route('/update_account')
 class UpdateAccount(Resource):
+    @auth_required
     @auth_ns.expect(auth_parser, update_model)
     @auth_ns.response(200, 'Cuenta actualizada exitosamente')
     @auth_ns.response(401, 'Token inválido o faltante')
     def put(self):
         """Actualizar información del usuario actual"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user:
-            return {"message": "Usuario no encontrado"}, 404
+        current_user = g.current_user
         
         if 'login_user' in data:
             current_user.login_user = data.get("login_user")
@@ -212,29 +197,21 @@ class UpdateAccount(Resource):
             current_user.set_password(data.get("password"))
 
         db.session.commit()
+        invalidate_principal(current_user.id_user)
         return {"message": "Cuenta actualizada exitosamente"}, 200
 
 @auth_ns.route('/change_password')
 class ChangePassword(Resource):
+    @auth_required
     @auth_ns.expect(auth_parser, change_password_model)
     @auth_ns.response(200, 'Contraseña cambiada exitosamente')
     @auth_ns.response(400, 'Contraseña actual incorrecta')
     @auth_ns.response(401, 'Token inválido o faltante')
     def put(self):
         """Cambiar contraseña del usuario actual"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user:
-            return {"message": "Usuario no encontrado"}, 404
+        current_user = g.current_user
 
         old_password = data.get("old_password")
         new_password = data.get("new_password")
@@ -244,6 +221,7 @@ class ChangePassword(Resource):
 
         current_user.set_password(new_password)
         db.session.commit()
+        invalidate_principal(current_user.id_user)
         return {"message": "Contraseña cambiada exitosamente"}, 200
 
 @auth_ns.route('/reset_password')
@@ -270,27 +248,18 @@ class ResetPassword(Resource):
 
         user.set_password(new_password)
         db.session.commit()
+        invalidate_principal(user.id_user)
         return {"message": "Contraseña restablecida exitosamente"}, 200
 
 @auth_ns.route('/me')
 class GetCurrentUser(Resource):
+    @auth_required
     @auth_ns.expect(auth_parser)
     @auth_ns.response(200, 'Datos del usuario', user_response_model)
     @auth_ns.response(401, 'Token inválido o faltante')
     def get(self):
         """Obtener información del usuario actual"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user:
-            return {"message": "Usuario no encontrado"}, 404
+        current_user = g.current_user
 
         return {
             "id_user": current_user.id_user,
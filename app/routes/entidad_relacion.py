@@ -3,16 +3,22 @@ from flask import Blueprint, request, jsonify
 from app.models.entidad_relacion import EntidadRelacion
 from app.extensions import db
 from app.services.auth_service import generate_token
-from app.decorators.PyJWT import token_required
+from sqlalchemy.exc import IntegrityError
+from app.decorators.PyJWT import role_required, token_required
+from app.services.entidad_relacion_service import EntidadRelacionError, crear_entidades
+from app.utils.serializers import serialize_list
+from app.utils.streaming import stream_ndjson, wants_ndjson
 
 entidad_relacion_bp = Blueprint('entidad_relacion', __name__)
 
-# Obtener todas las entidades_relaciones
+# Obtener todas las entidades_relaciones (Accept: application/x-ndjson para streaming)
 @entidad_relacion_bp.route('/', methods=['GET'])
 @token_required
 def ConsultarEntidadesRelaciones(current_user):
-    entidades = EntidadRelacion.query.all()
-    output = [entidad.to_dict() for entidad in entidades]
+    if wants_ndjson():
+        return stream_ndjson(EntidadRelacion.query.order_by(EntidadRelacion.id_entidad), EntidadRelacion)
+
+    output = serialize_list(EntidadRelacion.query, EntidadRelacion)
 
     return jsonify({'entidades_relaciones': output}), 200
 
@@ -30,8 +36,7 @@ def ConsultarEntidadRelacionID(current_user, id_entidad):
 @entidad_relacion_bp.route('/tipo_doc/<int:id_tipo_doc>', methods=['GET'])
 @token_required
 def ConsultarEntidadesRelacionesTipoDoc(current_user, id_tipo_doc):
-    entidades = EntidadRelacion.query.filter_by(id_tipo_doc_ident=id_tipo_doc).all()
-    output = [entidad.to_dict() for entidad in entidades]
+    output = serialize_list(EntidadRelacion.query.filter_by(id_tipo_doc_ident=id_tipo_doc), EntidadRelacion)
 
     return jsonify({'entidades_relaciones': output}), 200
 
@@ -39,8 +44,7 @@ def ConsultarEntidadesRelacionesTipoDoc(current_user, id_tipo_doc):
 @entidad_relacion_bp.route('/doc/<string:nro_doc_ident>/tipo_doc/<int:id_tipo_doc>', methods=['GET'])
 @token_required
 def ConsultarEntidadesRelacionesNroDocTipoDoc(current_user, nro_doc_ident, id_tipo_doc):
-    entidades = EntidadRelacion.query.filter_by(nro_doc_ident=nro_doc_ident, id_tipo_doc_ident=id_tipo_doc).all()
-    output = [entidad.to_dict() for entidad in entidades]
+    output = serialize_list(EntidadRelacion.query.filter_by(nro_doc_ident=nro_doc_ident, id_tipo_doc_ident=id_tipo_doc), EntidadRelacion)
 
     return jsonify({'entidades_relaciones': output}), 200
 
@@ -48,8 +52,7 @@ def ConsultarEntidadesRelacionesNroDocTipoDoc(current_user, nro_doc_ident, id_ti
 @entidad_relacion_bp.route('/buscar/<string:nombre>', methods=['GET'])
 @token_required
 def BuscarEntidadesRelacionesNombre(current_user, nombre):
-    entidades = EntidadRelacion.query.filter(EntidadRelacion.nombre_entidad.ilike(f'%{nombre}%')).all()
-    output = [entidad.to_dict() for entidad in entidades]
+    output = serialize_list(EntidadRelacion.query.filter(EntidadRelacion.nombre_entidad.ilike(f'%{nombre}%')), EntidadRelacion)
 
     return jsonify({'entidades_relaciones': output}), 200
 
@@ -57,8 +60,7 @@ def BuscarEntidadesRelacionesNombre(current_user, nombre):
 @entidad_relacion_bp.route('/proveedores', methods=['GET'])
 @token_required
 def FiltrarEntidadesRelacionesProveedores(current_user):
-    entidades = EntidadRelacion.query.filter_by(flag_proveedor='1').all()
-    output = [entidad.to_dict() for entidad in entidades]
+    output = serialize_list(EntidadRelacion.query.filter_by(flag_proveedor='1'), EntidadRelacion)
 
     return jsonify({'entidades_relaciones': output}), 200
 
@@ -66,18 +68,15 @@ def FiltrarEntidadesRelacionesProveedores(current_user):
 @entidad_relacion_bp.route('/clientes', methods=['GET'])
 @token_required
 def FiltrarEntidadesRelacionesClientes(current_user):
-    entidades = EntidadRelacion.query.filter_by(flag_cliente='1').all()
-    output = [entidad.to_dict() for entidad in entidades]
+    output = serialize_list(EntidadRelacion.query.filter_by(flag_cliente='1'), EntidadRelacion)
 
     return jsonify({'entidades_relaciones': output}), 200
 
 # Crear una nueva entidad_relacion (solo para administradores)
 @entidad_relacion_bp.route('/', methods=['POST'])
+@role_required('administrador')
 @token_required
 def CrearEntidadRelacion(current_user):
-    if current_user.flag_administrador != '1':
-        return jsonify({"message": "Acceso denegado"}), 403
-
     data = request.get_json()
     nombre_entidad = data.get("nombre_entidad")
     id_tipo_doc_ident = data.get("id_tipo_doc_ident")
@@ -105,9 +104,6 @@ def CrearEntidadRelacion(current_user):
     ).first():
         return jsonify({"message": "Ya existe una entidad con este documento de identidad"}), 400
 
-    if EntidadRelacion.query.filter_by(nombre_entidad=nombre_entidad).first():
-        return jsonify({"message": "El nombre de la entidad ya existe"}), 400
-
     entidad = EntidadRelacion(
         nombre_entidad=nombre_entidad,
         id_tipo_doc_ident=id_tipo_doc_ident,
@@ -123,13 +119,34 @@ def CrearEntidadRelacion(current_user):
 
     return jsonify({"message": "Entidad de relación creada exitosamente"}), 201
 
+# Crear entidades_relaciones por lotes ({"entidades": [...]}); cada fila informa si se creó o por qué no
+@entidad_relacion_bp.route('/lote', methods=['POST'])
+@role_required('administrador')
+@token_required
+def CrearEntidadesRelacionesLote(current_user):
+    data = request.get_json(silent=True) or {}
+    try:
+        resultados = crear_entidades(data.get('entidades'))
+        db.session.commit()
+    except EntidadRelacionError as e:
+        return jsonify({"message": str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({"message": "Otra operación registró entidades del lote al mismo tiempo, reintente"}), 409
+
+    creadas = sum(1 for resultado in resultados if resultado['estado'] == 'creada')
+    return jsonify({
+        "message": "Lote de entidades procesado",
+        "creadas": creadas,
+        "con_errores": len(resultados) - creadas,
+        "resultados": resultados
+    }), 200
+
 # Actualizar una entidad_relacion (solo para administradores)
 @entidad_relacion_bp.route('/<int:id_entidad>', methods=['PUT'])
+@role_required('administrador')
 @token_required
 def ActualizarEntidadRelacion(current_user, id_entidad):
-    if current_user.flag_administrador != '1':
-        return jsonify({"message": "Acceso denegado"}), 403
-
     entidad = EntidadRelacion.query.get(id_entidad)
     if not entidad:
         return jsonify({"message": "Entidad de relación no encontrada"}), 404
@@ -171,11 +188,9 @@ def ActualizarEntidadRelacion(current_user, id_entidad):
 
 # Inactivar una entidad_relacion (solo para administradores)
 @entidad_relacion_bp.route('/<int:id_entidad>', methods=['DELETE'])
+@role_required('administrador')
 @token_required
 def InactivarEntidadRelacion(current_user, id_entidad):
-    if current_user.flag_administrador != '1':
-        return jsonify({"message": "Acceso denegado"}), 403
-
     entidad = EntidadRelacion.query.get(id_entidad)
     if not entidad:
         return jsonify({"message": "Entidad de relación no encontrada"}), 404
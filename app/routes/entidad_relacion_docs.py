@@ -1,9 +1,12 @@
 # app/routes/entidad_relacion_docs.py
 from flask import request
 from flask_restx import Resource, fields, Namespace, reqparse
+from sqlalchemy.exc import IntegrityError
 from app.models.entidad_relacion import EntidadRelacion
 from app.extensions import db
-from app.decorators.PyJWT import token_required
+from app.decorators.PyJWT import auth_required, auth_role_required, token_required
+from app.services.entidad_relacion_service import MAX_ENTIDADES_POR_LOTE, EntidadRelacionError, crear_entidades
+from app.utils.serializers import marshal_unless_fields, serialize_list
 
 # Crear namespace para Swagger
 entidad_relacion_ns = Namespace('entidades-relaciones', description='Operaciones de gestión de entidades de relación (clientes/proveedores)')
@@ -32,6 +35,25 @@ entidad_create_model = entidad_relacion_ns.model('CrearEntidadRelacion', {
     'flag_estado': fields.String(default='1', description='Estado de la entidad (1:Activo, 0:Inactivo)')
 })
 
+entidades_lote_model = entidad_relacion_ns.model('CrearEntidadesRelacionesLote', {
+    'entidades': fields.List(fields.Nested(entidad_create_model), required=True,
+                             description=f'Entidades a registrar (máximo {MAX_ENTIDADES_POR_LOTE})')
+})
+
+resultado_lote_model = entidad_relacion_ns.model('ResultadoEntidadLote', {
+    'indice': fields.Integer(description='Posición de la entidad en el lote'),
+    'estado': fields.String(description="'creada' o 'error'"),
+    'id_entidad': fields.Integer(description='ID asignado (si se creó)'),
+    'message': fields.String(description='Motivo por el que no se creó')
+})
+
+entidades_lote_response_model = entidad_relacion_ns.model('CrearEntidadesRelacionesLoteResponse', {
+    'message': fields.String(description='Mensaje de resultado'),
+    'creadas': fields.Integer(description='Entidades registradas'),
+    'con_errores': fields.Integer(description='Entidades omitidas'),
+    'resultados': fields.List(fields.Nested(resultado_lote_model, skip_none=True), description='Resultado por fila')
+})
+
 entidad_update_model = entidad_relacion_ns.model('ActualizarEntidadRelacion', {
     'nombre_entidad': fields.String(description='Nombre de la entidad'),
     'id_tipo_doc_ident': fields.Integer(description='ID del tipo de documento de identidad'),
@@ -72,24 +94,17 @@ auth_parser.add_argument('Authorization', location='headers', required=True, hel
 # Endpoints con Swagger Documentation
 @entidad_relacion_ns.route('/')
 class EntidadRelacionList(Resource):
+    @auth_required
     @entidad_relacion_ns.expect(auth_parser)
     @entidad_relacion_ns.response(200, 'Lista de entidades obtenida exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
-    @entidad_relacion_ns.marshal_list_with(entidad_response_model)
+    @marshal_unless_fields(entidad_relacion_ns, entidad_response_model, as_list=True)
     def get(self):
         """Obtener todas las entidades de relación activas"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        entidades = EntidadRelacion.query.filter_by(flag_estado='1').all()
-        return [entidad.to_dict() for entidad in entidades], 200
+        entidades = EntidadRelacion.query.filter_by(flag_estado='1')
+        return serialize_list(entidades, EntidadRelacion), 200
 
+    @auth_role_required('administrador')
     @entidad_relacion_ns.expect(auth_parser, entidad_create_model)
     @entidad_relacion_ns.response(201, 'Entidad creada exitosamente')
     @entidad_relacion_ns.response(400, 'Datos inválidos o entidad ya existe')
@@ -97,21 +112,8 @@ class EntidadRelacionList(Resource):
     @entidad_relacion_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
     def post(self):
         """Crear una nueva entidad de relación (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        from app.models.usuario import Usuario
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         nombre_entidad = data.get("nombre_entidad")
         id_tipo_doc_ident = data.get("id_tipo_doc_ident")
         nro_doc_ident = data.get("nro_doc_ident")
@@ -151,29 +153,51 @@ class EntidadRelacionList(Resource):
 
         return {"message": "Entidad de relación creada exitosamente", "id_entidad": entidad.id_entidad}, 201
 
+@entidad_relacion_ns.route('/lote')
+class EntidadRelacionLote(Resource):
+    @auth_role_required('administrador')
+    @entidad_relacion_ns.expect(auth_parser, entidades_lote_model)
+    @entidad_relacion_ns.response(200, 'Lote procesado (resultado por fila)', entidades_lote_response_model)
+    @entidad_relacion_ns.response(400, 'Lote vacío o demasiado grande')
+    @entidad_relacion_ns.response(401, 'Token inválido o faltante')
+    @entidad_relacion_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
+    @entidad_relacion_ns.response(409, 'Entidades del lote registradas al mismo tiempo por otra operación')
+    def post(self):
+        """Crear entidades de relación por lotes, con resultado por fila (Requiere rol administrador)"""
+        data = request.get_json(silent=True) or {}
+        try:
+            resultados = crear_entidades(data.get('entidades'))
+            db.session.commit()
+        except EntidadRelacionError as e:
+            return {"message": str(e)}, 400
+        except IntegrityError:
+            db.session.rollback()
+            return {"message": "Otra operación registró entidades del lote al mismo tiempo, reintente"}, 409
+
+        creadas = sum(1 for resultado in resultados if resultado['estado'] == 'creada')
+        return {
+            "message": "Lote de entidades procesado",
+            "creadas": creadas,
+            "con_errores": len(resultados) - creadas,
+            "resultados": resultados
+        }, 200
+
 @entidad_relacion_ns.route('/<int:id_entidad>')
 class EntidadRelacionDetail(Resource):
+    @auth_required
     @entidad_relacion_ns.expect(auth_parser)
     @entidad_relacion_ns.response(200, 'Entidad obtenida exitosamente', entidad_response_model)
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
     @entidad_relacion_ns.response(404, 'Entidad no encontrada')
     def get(self, id_entidad):
         """Obtener una entidad de relación por ID"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         entidad = EntidadRelacion.query.get(id_entidad)
         if not entidad or entidad.flag_estado != '1':
             return {"message": "Entidad de relación no encontrada"}, 404
 
         return entidad.to_dict(), 200
 
+    @auth_role_required('administrador')
     @entidad_relacion_ns.expect(auth_parser, entidad_update_model)
     @entidad_relacion_ns.response(200, 'Entidad actualizada exitosamente')
     @entidad_relacion_ns.response(400, 'Datos inválidos o conflictos')
@@ -182,21 +206,8 @@ class EntidadRelacionDetail(Resource):
     @entidad_relacion_ns.response(404, 'Entidad no encontrada')
     def put(self, id_entidad):
         """Actualizar una entidad de relación (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        from app.models.usuario import Usuario
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         entidad = EntidadRelacion.query.get(id_entidad)
         if not entidad:
             return {"message": "Entidad de relación no encontrada"}, 404
@@ -234,6 +245,7 @@ class EntidadRelacionDetail(Resource):
 
         return {"message": "Entidad de relación actualizada exitosamente"}, 200
 
+    @auth_role_required('administrador')
     @entidad_relacion_ns.expect(auth_parser)
     @entidad_relacion_ns.response(200, 'Entidad inactivada exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
@@ -241,20 +253,6 @@ class EntidadRelacionDetail(Resource):
     @entidad_relacion_ns.response(404, 'Entidad no encontrada')
     def delete(self, id_entidad):
         """Inactivar una entidad de relación (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        from app.models.usuario import Usuario
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         entidad = EntidadRelacion.query.get(id_entidad)
         if not entidad:
             return {"message": "Entidad de relación no encontrada"}, 404
@@ -266,127 +264,88 @@ class EntidadRelacionDetail(Resource):
 
 @entidad_relacion_ns.route('/tipo-doc/<int:id_tipo_doc>')
 class EntidadesPorTipoDoc(Resource):
+    @auth_required
     @entidad_relacion_ns.expect(tipo_doc_parser)
     @entidad_relacion_ns.response(200, 'Entidades obtenidas exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
-    @entidad_relacion_ns.marshal_list_with(entidad_response_model)
+    @marshal_unless_fields(entidad_relacion_ns, entidad_response_model, as_list=True)
     def get(self, id_tipo_doc):
         """Obtener entidades por tipo de documento de identidad"""
-        args = tipo_doc_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         entidades = EntidadRelacion.query.filter_by(
             id_tipo_doc_ident=id_tipo_doc, 
             flag_estado='1'
-        ).all()
+        )
         
-        return [entidad.to_dict() for entidad in entidades], 200
+        return serialize_list(entidades, EntidadRelacion), 200
 
 @entidad_relacion_ns.route('/doc/<string:nro_doc_ident>/tipo-doc/<int:id_tipo_doc>')
 class EntidadesPorDocYTipo(Resource):
+    @auth_required
     @entidad_relacion_ns.expect(doc_tipo_parser)
     @entidad_relacion_ns.response(200, 'Entidades obtenidas exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
-    @entidad_relacion_ns.marshal_list_with(entidad_response_model)
+    @marshal_unless_fields(entidad_relacion_ns, entidad_response_model, as_list=True)
     def get(self, nro_doc_ident, id_tipo_doc):
         """Obtener entidades por número y tipo de documento de identidad"""
-        args = doc_tipo_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         entidades = EntidadRelacion.query.filter_by(
             nro_doc_ident=nro_doc_ident,
             id_tipo_doc_ident=id_tipo_doc,
             flag_estado='1'
-        ).all()
+        )
         
-        return [entidad.to_dict() for entidad in entidades], 200
+        return serialize_list(entidades, EntidadRelacion), 200
 
 @entidad_relacion_ns.route('/buscar/<string:nombre>')
 class BuscarEntidadesPorNombre(Resource):
+    @auth_required
     @entidad_relacion_ns.expect(buscar_parser)
     @entidad_relacion_ns.response(200, 'Búsqueda completada exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
-    @entidad_relacion_ns.marshal_list_with(entidad_response_model)
+    @marshal_unless_fields(entidad_relacion_ns, entidad_response_model, as_list=True)
     def get(self, nombre):
         """Buscar entidades por nombre (búsqueda parcial)"""
-        args = buscar_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         entidades = EntidadRelacion.query.filter(
             EntidadRelacion.nombre_entidad.ilike(f'%{nombre}%'),
             EntidadRelacion.flag_estado == '1'
-        ).all()
+        )
         
-        return [entidad.to_dict() for entidad in entidades], 200
+        return serialize_list(entidades, EntidadRelacion), 200
 
 @entidad_relacion_ns.route('/proveedores')
 class EntidadesProveedores(Resource):
+    @auth_required
     @entidad_relacion_ns.expect(auth_parser)
     @entidad_relacion_ns.response(200, 'Proveedores obtenidos exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
-    @entidad_relacion_ns.marshal_list_with(entidad_response_model)
+    @marshal_unless_fields(entidad_relacion_ns, entidad_response_model, as_list=True)
     def get(self):
         """Obtener todas las entidades que son proveedores"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         entidades = EntidadRelacion.query.filter_by(
             flag_proveedor='1', 
             flag_estado='1'
-        ).all()
+        )
         
-        return [entidad.to_dict() for entidad in entidades], 200
+        return serialize_list(entidades, EntidadRelacion), 200
 
 @entidad_relacion_ns.route('/clientes')
 class EntidadesClientes(Resource):
+    @auth_required
     @entidad_relacion_ns.expect(auth_parser)
     @entidad_relacion_ns.response(200, 'Clientes obtenidos exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
-    @entidad_relacion_ns.marshal_list_with(entidad_response_model)
+    @marshal_unless_fields(entidad_relacion_ns, entidad_response_model, as_list=True)
     def get(self):
         """Obtener todas las entidades que son clientes"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         entidades = EntidadRelacion.query.filter_by(
             flag_cliente='1', 
             flag_estado='1'
-        ).all()
+        )
         
-        return [entidad.to_dict() for entidad in entidades], 200
+        return serialize_list(entidades, EntidadRelacion), 200
 
 @entidad_relacion_ns.route('/<int:id_entidad>/reactivar')
 class ReactivarEntidad(Resource):
+    @auth_role_required('administrador')
     @entidad_relacion_ns.expect(auth_parser)
     @entidad_relacion_ns.response(200, 'Entidad reactivada exitosamente')
     @entidad_relacion_ns.response(401, 'Token inválido o faltante')
@@ -394,20 +353,6 @@ class ReactivarEntidad(Resource):
     @entidad_relacion_ns.response(404, 'Entidad no encontrada')
     def put(self, id_entidad):
         """Reactivar una entidad inactiva (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        from app.models.usuario import Usuario
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         entidad = EntidadRelacion.query.get(id_entidad)
         if not entidad:
             return {"message": "Entidad de relación no encontrada"}, 404
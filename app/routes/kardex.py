@@ -0,0 +1,79 @@
+# app/routes/kardex.py
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from app.models.articulo import Articulo
+from app.models.kardex import Kardex
+from app.extensions import db
+from app.decorators.PyJWT import token_required
+from app.services.cierre_service import saldos_a_fecha
+from app.utils.pagination import CursorInvalido, get_page_args, paginate_keyset
+
+kardex_bp = Blueprint('kardex', __name__)
+
+# Llave de paginación del kardex: orden de registro de los movimientos
+ORDEN_KARDEX = [Kardex.id_kardex]
+
+# Movimientos de un artículo con su saldo acumulado (opcional ?id_almacen=; paginado con limit/after)
+@kardex_bp.route('/<int:id_articulo>', methods=['GET'])
+@token_required
+def ConsultarKardexArticulo(current_user, id_articulo):
+    if not db.session.get(Articulo, id_articulo):
+        return jsonify({"message": "Artículo no encontrado"}), 404
+
+    query = Kardex.query.filter_by(id_articulo=id_articulo)
+    id_almacen = request.args.get('id_almacen', type=int)
+    if id_almacen:
+        query = query.filter_by(id_almacen=id_almacen)
+
+    # Los saldos se guardan al registrar cada movimiento: no se recalculan aquí
+    try:
+        limit, after = get_page_args()
+        movimientos, next_cursor = paginate_keyset(query, ORDEN_KARDEX, limit, after)
+    except CursorInvalido as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({
+        'id_articulo': id_articulo,
+        'kardex': [movimiento.to_dict() for movimiento in movimientos],
+        'next_cursor': next_cursor
+    }), 200
+
+# Kardex de un artículo en un almacén entre dos fechas (incluidas), con saldo inicial
+@kardex_bp.route('/<int:id_articulo>/almacen/<int:id_almacen>/fecha_inicio/<string:fecha_inicio>/fecha_fin/<string:fecha_fin>', methods=['GET'])
+@token_required
+def ConsultarKardexPeriodo(current_user, id_articulo, id_almacen, fecha_inicio, fecha_fin):
+    try:
+        desde = datetime.strptime(fecha_inicio, '%Y-%m-%d')
+        hasta = datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
+
+    # Saldo inicial: cierre más cercano + movimientos hasta fecha_inicio
+    _, saldos = saldos_a_fecha(desde, id_almacen=id_almacen, id_articulo=id_articulo)
+    saldo_cantidad, precio_promedio = saldos.get((id_almacen, id_articulo), (0, 0))
+    saldo_valorizado = saldo_cantidad * precio_promedio
+    saldo_inicial = {'cantidad': float(saldo_cantidad), 'valorizado': round(float(saldo_valorizado), 2)}
+
+    movimientos = Kardex.query.filter(
+        Kardex.id_articulo == id_articulo,
+        Kardex.id_almacen == id_almacen,
+        Kardex.fecha >= desde,
+        Kardex.fecha < hasta
+    ).order_by(Kardex.fecha, Kardex.id_kardex).all()
+
+    # Los saldos guardados siguen el orden de registro; aquí se acumulan por fecha del vale
+    output = []
+    for movimiento in movimientos:
+        saldo_cantidad += movimiento.cantidad
+        saldo_valorizado += movimiento.cantidad * movimiento.precio_soles
+        fila = movimiento.to_dict()
+        fila['saldo_cantidad'] = float(saldo_cantidad)
+        fila['saldo_valorizado'] = round(float(saldo_valorizado), 2)
+        output.append(fila)
+
+    return jsonify({
+        'id_articulo': id_articulo,
+        'id_almacen': id_almacen,
+        'saldo_inicial': saldo_inicial,
+        'kardex': output
+    }), 200
@@ -1,12 +1,19 @@
 # app/routes/reportes.py
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from app.models.usuario import Usuario
+from app.models.almacen import Almacen
 from app.models.categoria import Categoria
 from app.models.vale_almacen import ValeAlmacen
-from app.extensions import db
-from app.decorators.PyJWT import token_required
+from app.extensions import capas_cache, db, password_hasher, principal_cache, valorizacion_cache
+from app.decorators.PyJWT import role_required, token_required
+from app.services.stock_service import contadores as stock_contadores
+from app.services.exportacion_service import (
+    COLUMNAS_DETALLES, COLUMNAS_KARDEX, consulta_detalles, consulta_kardex
+)
+from app.services.valorizacion_service import valorizacion
+from app.utils.streaming import FORMATOS_EXPORTACION, stream_export
 from sqlalchemy import func
-from datetime import datetime
+from datetime import datetime, timedelta
 
 reportes_bp = Blueprint('reportes', __name__)
 
@@ -66,3 +73,73 @@ def ReporteResumenExcel(current_user):
     except Exception as e:
         return jsonify({"message": "Error al generar el reporte", "error": str(e)}), 500
     
+
+# Valorización del inventario (cantidad x precio promedio) por almacén y categoría (opcional ?id_almacen=)
+# Cada almacén se calcula una vez y se sirve de memoria hasta que se registre un vale en él
+@reportes_bp.route('/reportes/valorizacion', methods=['GET'])
+@token_required
+def ReporteValorizacion(current_user):
+    id_almacen = request.args.get('id_almacen', type=int)
+    if id_almacen:
+        if not db.session.get(Almacen, id_almacen):
+            return jsonify({"message": "Almacén no encontrado"}), 404
+        ids_almacen = [id_almacen]
+    else:
+        ids_almacen = db.session.scalars(db.select(Almacen.id_almacen).order_by(Almacen.id_almacen)).all()
+
+    tramos = valorizacion(ids_almacen)
+    almacenes = [tramos[i] for i in ids_almacen if i in tramos]
+    return jsonify({
+        'almacenes': almacenes,
+        'valorizado_total': round(sum(tramo['valorizado'] for tramo in almacenes), 2),
+        'fecha_reporte': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }), 200
+
+# Métricas de cachés internas (solo administradores)
+@reportes_bp.route('/reportes/metricas', methods=['GET'])
+@role_required('administrador')
+@token_required
+def ReporteMetricas(current_user):
+    return jsonify({
+        'principal_cache': principal_cache.stats(),
+        'valorizacion_cache': valorizacion_cache.stats(),
+        'capas_cache': capas_cache.stats(),
+        'password_hasher': password_hasher.stats(),
+        'stock_posting': stock_contadores.stats()
+    }), 200
+
+def _exportar(nombre, columnas, construir_consulta, fecha_inicio, fecha_fin):
+    """Validar rango, formato (?formato=csv|xlsx) y almacén (?id_almacen=) y responder el archivo en streaming"""
+    try:
+        desde = datetime.strptime(fecha_inicio, '%Y-%m-%d')
+        hasta = datetime.strptime(fecha_fin, '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
+    if hasta <= desde:
+        return jsonify({"message": "La fecha de inicio no puede ser posterior a la fecha de fin"}), 400
+
+    formato = request.args.get('formato', 'csv').lower()
+    if formato not in FORMATOS_EXPORTACION:
+        return jsonify({"message": f"Formato no soportado. Use {' o '.join(FORMATOS_EXPORTACION)}."}), 400
+
+    id_almacen = request.args.get('id_almacen', type=int)
+    if id_almacen and not db.session.get(Almacen, id_almacen):
+        return jsonify({"message": "Almacén no encontrado"}), 404
+
+    return stream_export(construir_consulta(desde, hasta, id_almacen), columnas, formato,
+                         f'{nombre}_{fecha_inicio}_{fecha_fin}')
+
+# Exportar (CSV o XLSX) las líneas de los vales entre dos fechas (incluidas), con vale, almacén y artículo.
+# El archivo se genera en streaming desde un cursor del servidor: la memoria no crece con el rango
+@reportes_bp.route('/reportes/exportar/detalles/fecha_inicio/<string:fecha_inicio>/fecha_fin/<string:fecha_fin>', methods=['GET'])
+@role_required('inventarios')
+@token_required
+def ExportarDetallesVales(current_user, fecha_inicio, fecha_fin):
+    return _exportar('detalles_vales', COLUMNAS_DETALLES, consulta_detalles, fecha_inicio, fecha_fin)
+
+# Exportar (CSV o XLSX) los movimientos de kardex entre dos fechas (incluidas), con sus saldos
+@reportes_bp.route('/reportes/exportar/kardex/fecha_inicio/<string:fecha_inicio>/fecha_fin/<string:fecha_fin>', methods=['GET'])
+@role_required('inventarios')
+@token_required
+def ExportarKardex(current_user, fecha_inicio, fecha_fin):
+    return _exportar('kardex', COLUMNAS_KARDEX, consulta_kardex, fecha_inicio, fecha_fin)
@@ -0,0 +1,193 @@
+# app/routes/stock.py
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.orm import joinedload
+from app.extensions import db
+from app.models.alerta_stock import AlertaStock
+from app.models.almacen import Almacen
+from app.models.articulo import Articulo
+from app.models.capa_costo import CapaCosto
+from app.models.stock import Stock
+from app.decorators.PyJWT import role_required, token_required
+from app.services.cierre_service import saldos_a_fecha
+from app.services.stock_service import fijar_stock_minimo
+from app.utils.pagination import CursorInvalido, decode_cursor, encode_cursor, get_page_args, paginate_keyset
+from app.utils.sql import transacciones_terminadas
+
+stock_bp = Blueprint('stock', __name__)
+
+# Llaves de paginación: filas de stock bajo y cola de alertas (solo crece, en orden de confirmación)
+ORDEN_BAJO_STOCK = [Stock.id_almacen, Stock.id_articulo]
+ORDEN_ALERTAS = [AlertaStock.id_transaccion, AlertaStock.id_alerta_stock]
+ORDEN_CAPAS = [CapaCosto.id_articulo, CapaCosto.id_capa_costo]
+
+# Stock a una fecha (incluida), opcionalmente de un almacén y/o artículo
+@stock_bp.route('/a_fecha/<string:fecha>', methods=['GET'])
+@token_required
+def ConsultarStockAFecha(current_user, fecha):
+    try:
+        hasta = datetime.strptime(fecha, '%Y-%m-%d') + timedelta(days=1)
+    except ValueError:
+        return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
+
+    periodo_base, saldos = saldos_a_fecha(
+        hasta,
+        id_almacen=request.args.get('id_almacen', type=int),
+        id_articulo=request.args.get('id_articulo', type=int)
+    )
+
+    output = [
+        {
+            'id_almacen': id_almacen,
+            'id_articulo': id_articulo,
+            'cantidad': float(cantidad),
+            'precio_promedio': round(float(precio), 4),
+            'valorizado': round(float(cantidad * precio), 2)
+        }
+        for (id_almacen, id_articulo), (cantidad, precio) in sorted(saldos.items())
+    ]
+    return jsonify({'fecha': fecha, 'cierre_base': periodo_base, 'stock': output}), 200
+
+# Fijar el stock mínimo de artículos de un almacén: {"minimos": [{"id_articulo": 1, "stock_minimo": 5}, ...]}
+# stock_minimo nulo quita el mínimo del artículo
+@stock_bp.route('/minimo/<int:id_almacen>', methods=['PUT'])
+@role_required('inventarios')
+@token_required
+def FijarStockMinimo(current_user, id_almacen):
+    if not db.session.get(Almacen, id_almacen):
+        return jsonify({"message": "Almacén no encontrado"}), 404
+
+    data = request.get_json() or {}
+    items = data.get("minimos")
+    if not isinstance(items, list) or not items:
+        return jsonify({"message": "Debe enviar la lista 'minimos'"}), 400
+
+    minimos = {}
+    errores = []
+    for indice, item in enumerate(items):
+        id_articulo = item.get("id_articulo") if isinstance(item, dict) else None
+        minimo = item.get("stock_minimo") if isinstance(item, dict) else None
+        if not isinstance(id_articulo, int):
+            errores.append({"indice": indice, "message": "id_articulo inválido"})
+            continue
+        if minimo is not None:
+            try:
+                minimo = Decimal(str(minimo))
+            except InvalidOperation:
+                minimo = Decimal(-1)
+            if not minimo.is_finite() or minimo < 0:
+                errores.append({"indice": indice, "message": "stock_minimo debe ser un número mayor o igual a 0"})
+                continue
+        minimos[id_articulo] = minimo
+
+    existentes = set(db.session.scalars(
+        select(Articulo.id_articulo).where(Articulo.id_articulo.in_(minimos))
+    ))
+    errores.extend(
+        {"id_articulo": id_articulo, "message": "Artículo no encontrado"}
+        for id_articulo in sorted(set(minimos) - existentes)
+    )
+    if errores:
+        return jsonify({"message": "Datos inválidos", "errores": errores}), 400
+
+    alertas = fijar_stock_minimo(id_almacen, minimos)
+    db.session.commit()
+    return jsonify({"message": "Stock mínimo actualizado", "articulos": len(minimos), "alertas": alertas}), 200
+
+# Artículos en o bajo su stock mínimo (opcional ?id_almacen=; paginado con limit/after).
+# Lee el índice de flag_bajo_stock, que se mantiene al registrar cada vale
+@stock_bp.route('/bajo_stock', methods=['GET'])
+@role_required('inventarios')
+@token_required
+def ListarBajoStock(current_user):
+    query = Stock.query.options(joinedload(Stock.articulo)).filter(Stock.flag_bajo_stock == '1')
+    id_almacen = request.args.get('id_almacen', type=int)
+    if id_almacen:
+        query = query.filter(Stock.id_almacen == id_almacen)
+
+    try:
+        limit, after = get_page_args()
+        filas, next_cursor = paginate_keyset(query, ORDEN_BAJO_STOCK, limit, after)
+    except CursorInvalido as e:
+        return jsonify({"message": str(e)}), 400
+
+    output = []
+    for fila in filas:
+        item = fila.to_dict()
+        item['cod_articulo'] = fila.articulo.cod_articulo
+        item['nombre_articulo'] = fila.articulo.nombre_articulo
+        output.append(item)
+    return jsonify({'bajo_stock': output, 'next_cursor': next_cursor}), 200
+
+# Alertas de stock bajo posteriores al cursor `after` (opcional ?id_almacen=).
+# Siempre devuelve un cursor: sin alertas nuevas es el mismo recibido, para volver a consultar con él.
+# El id serial se asigna al insertar y no al confirmar, así que el cursor va por (transacción, id) y en
+# PostgreSQL solo se entregan alertas de transacciones anteriores a la más antigua aún abierta: ninguna
+# puede aparecer luego detrás del cursor. Una transacción larga retrasa el feed, pero no le hace perder alertas.
+@stock_bp.route('/alertas', methods=['GET'])
+@role_required('inventarios')
+@token_required
+def ListarAlertasStock(current_user):
+    try:
+        limit, after = get_page_args()
+        query = AlertaStock.query
+        if after:
+            ultimo = decode_cursor(after, ORDEN_ALERTAS)
+            if not all(isinstance(valor, int) for valor in ultimo):
+                raise CursorInvalido("Cursor inválido")
+            query = query.filter(tuple_(*ORDEN_ALERTAS) > tuple_(*ultimo))
+    except CursorInvalido as e:
+        return jsonify({"message": str(e)}), 400
+
+    terminadas = transacciones_terminadas(db.session)
+    if terminadas is not None:
+        query = query.filter(AlertaStock.id_transaccion < terminadas)
+
+    id_almacen = request.args.get('id_almacen', type=int)
+    if id_almacen:
+        query = query.filter(AlertaStock.id_almacen == id_almacen)
+
+    alertas = query.order_by(*ORDEN_ALERTAS).limit(limit).all()
+    cursor = encode_cursor([alertas[-1].id_transaccion, alertas[-1].id_alerta_stock]) if alertas else after
+    return jsonify({
+        'alertas': [alerta.to_dict() for alerta in alertas],
+        'cursor': cursor,
+        'hay_mas': len(alertas) == limit
+    }), 200
+
+# Capas de costo abiertas (FIFO/FEFO) de un almacén, opcionalmente de un artículo (?id_articulo=).
+# Lee las capas guardadas, sin recorrer el kardex; el total valorizado es el del filtro completo
+@stock_bp.route('/capas/<int:id_almacen>', methods=['GET'])
+@role_required('inventarios')
+@token_required
+def ListarCapasCosto(current_user, id_almacen):
+    almacen = db.session.get(Almacen, id_almacen)
+    if not almacen:
+        return jsonify({"message": "Almacén no encontrado"}), 404
+
+    filtros = [CapaCosto.id_almacen == id_almacen]
+    id_articulo = request.args.get('id_articulo', type=int)
+    if id_articulo:
+        filtros.append(CapaCosto.id_articulo == id_articulo)
+
+    try:
+        limit, after = get_page_args()
+        capas, next_cursor = paginate_keyset(CapaCosto.query.filter(*filtros), ORDEN_CAPAS, limit, after)
+    except CursorInvalido as e:
+        return jsonify({"message": str(e)}), 400
+
+    cantidad, valorizado = db.session.execute(
+        select(func.coalesce(func.sum(CapaCosto.cantidad), 0),
+               func.coalesce(func.sum(CapaCosto.cantidad * CapaCosto.costo_unitario), 0))
+        .where(*filtros)
+    ).one()
+    return jsonify({
+        'id_almacen': id_almacen,
+        'metodo_costeo': almacen.metodo_costeo,
+        'capas': [capa.to_dict() for capa in capas],
+        'cantidad': float(cantidad),
+        'valorizado': round(float(valorizado), 4),
+        'next_cursor': next_cursor
+    }), 200
@@ -2,20 +2,25 @@
 from flask import Blueprint, request, jsonify
 from app.models.usuario import Usuario
 from app.extensions import db
-from app.services.auth_service import generate_token
-from app.decorators.PyJWT import token_required
+from app.services.auth_service import generate_token, invalidate_principal
+from app.decorators.PyJWT import role_required, token_required
+from app.utils.serializers import serialize_list
+from app.utils.streaming import stream_ndjson, wants_ndjson
 
 usuario_bp = Blueprint('usuario', __name__)
 
 # Obtener todos los usuarios (solo para administradores)
+# Con Accept: application/x-ndjson la respuesta se envía en streaming
 @usuario_bp.route('/', methods=['GET'])
 @token_required
 def ConsultarUsuarios(current_user):
     # if current_user.flag_administrador != '1':
     #     return jsonify({"message": "Acceso denegado"}), 403
 
-    usuarios = Usuario.query.all()
-    output = [user.to_dict() for user in usuarios]
+    if wants_ndjson():
+        return stream_ndjson(Usuario.query.order_by(Usuario.id_user), Usuario)
+
+    output = serialize_list(Usuario.query, Usuario)
 
     return jsonify({'usuarios': output}), 200
 
@@ -34,11 +39,9 @@ def ConsultarUsuarioID(current_user, id_user):
 
 # Crear un nuevo usuario (solo para administradores)
 @usuario_bp.route('/', methods=['POST'])
+@role_required('administrador')
 @token_required
 def CrearUsuario(current_user):
-    if current_user.flag_administrador != '1':
-        return jsonify({"message": "Acceso denegado"}), 403
-
     data = request.get_json()
     login_user = data.get("login_user")
     nro_doc_ident = data.get("nro_doc_ident")
@@ -104,22 +107,24 @@ def ModificarUsuario(current_user, id_user):
         user.flag_administrador = data.get('flag_administrador', user.flag_administrador)
         user.flag_inventarios = data.get('flag_inventarios', user.flag_inventarios)
         user.flag_estado = data.get('flag_estado', user.flag_estado)
+        user.sync_token_version()
 
     db.session.commit()
+    invalidate_principal(id_user)
     return jsonify({"message": "Usuario actualizado exitosamente"}), 200
 
 # Inactivar un usuario
 @usuario_bp.route('/<int:id_user>', methods=['DELETE'])
+@role_required('administrador')
 @token_required
 def InactivarUsuario(current_user, id_user):
-    if current_user.flag_administrador != '1':
-        return jsonify({"message": "Acceso denegado"}), 403
-
     user = Usuario.query.get(id_user)
     if not user:
         return jsonify({"message": "Usuario no encontrado"}), 404
 
     user.flag_estado = '0'  # Inactivar el usuario
+    user.sync_token_version()
     db.session.commit()
+    invalidate_principal(id_user)
     return jsonify({"message": "Usuario inactivado exitosamente"}), 200
 
@@ -1,7 +1,10 @@
-from flask import request
+from flask import g, request
 from flask_restx import Resource, fields, Namespace, reqparse
 from app.models.usuario import Usuario
 from app.extensions import db
+from app.services.auth_service import invalidate_principal
+from app.decorators.PyJWT import auth_required, auth_role_required
+from app.utils.serializers import marshal_unless_fields, serialize_list
 
 # Crear namespace para Swagger
 usuario_ns = Namespace('usuarios', description='Operaciones de gestión de usuarios')
@@ -65,29 +68,18 @@ auth_parser.add_argument('Authorization', location='headers', required=True, hel
 # Endpoints con Swagger Documentation
 @usuario_ns.route('/')
 class UsuarioList(Resource):
+    @auth_role_required('administrador')
     @usuario_ns.expect(auth_parser)
     @usuario_ns.response(200, 'Lista de usuarios obtenida exitosamente')
     @usuario_ns.response(401, 'Token inválido o faltante')
     @usuario_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
-    @usuario_ns.marshal_list_with(usuario_response_model)
+    @marshal_unless_fields(usuario_ns, usuario_response_model, as_list=True)
     def get(self):
         """Obtener todos los usuarios (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
-        usuarios = Usuario.query.filter_by(flag_estado='1').all()
-        return [usuario.to_dict() for usuario in usuarios], 200
+        usuarios = Usuario.query.filter_by(flag_estado='1')
+        return serialize_list(usuarios, Usuario), 200
 
+    @auth_role_required('administrador')
     @usuario_ns.expect(auth_parser, usuario_create_model)
     @usuario_ns.response(201, 'Usuario creado exitosamente')
     @usuario_ns.response(400, 'Datos inválidos o usuario ya existe')
@@ -95,20 +87,8 @@ class UsuarioList(Resource):
     @usuario_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
     def post(self):
         """Crear un nuevo usuario (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         login_user = data.get("login_user")
         nro_doc_ident = data.get("nro_doc_ident")
         nombre_user = data.get("nombre_user")
@@ -155,6 +135,7 @@ class UsuarioList(Resource):
 
 @usuario_ns.route('/<int:id_user>')
 class UsuarioDetail(Resource):
+    @auth_required
     @usuario_ns.expect(auth_parser)
     @usuario_ns.response(200, 'Usuario obtenido exitosamente', usuario_response_model)
     @usuario_ns.response(401, 'Token inválido o faltante')
@@ -162,18 +143,7 @@ class UsuarioDetail(Resource):
     @usuario_ns.response(404, 'Usuario no encontrado')
     def get(self, id_user):
         """Obtener un usuario por ID"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user:
-            return {"message": "Usuario no encontrado"}, 404
+        current_user = g.current_user
 
         # Solo administradores o el propio usuario pueden ver los datos
         if current_user.flag_administrador != '1' and current_user.id_user != id_user:
@@ -185,6 +155,7 @@ class UsuarioDetail(Resource):
 
         return usuario.to_dict(), 200
 
+    @auth_required
     @usuario_ns.expect(auth_parser, usuario_update_model)
     @usuario_ns.response(200, 'Usuario actualizado exitosamente')
     @usuario_ns.response(400, 'Datos inválidos o conflictos')
@@ -193,19 +164,9 @@ class UsuarioDetail(Resource):
     @usuario_ns.response(404, 'Usuario no encontrado')
     def put(self, id_user):
         """Actualizar un usuario"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user:
-            return {"message": "Usuario no encontrado"}, 404
+        current_user = g.current_user
 
         # Solo administradores o el propio usuario pueden actualizar
         if current_user.flag_administrador != '1' and current_user.id_user != id_user:
@@ -258,11 +219,14 @@ class UsuarioDetail(Resource):
                 usuario.flag_inventarios = data['flag_inventarios']
             if 'flag_estado' in data:
                 usuario.flag_estado = data['flag_estado']
+            usuario.sync_token_version()
 
         db.session.commit()
+        invalidate_principal(id_user)
 
         return {"message": "Usuario actualizado exitosamente"}, 200
 
+    @auth_role_required('administrador')
     @usuario_ns.expect(auth_parser)
     @usuario_ns.response(200, 'Usuario inactivado exitosamente')
     @usuario_ns.response(401, 'Token inválido o faltante')
@@ -270,19 +234,7 @@ class UsuarioDetail(Resource):
     @usuario_ns.response(404, 'Usuario no encontrado')
     def delete(self, id_user):
         """Inactivar un usuario (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
+        current_user = g.current_user
         usuario = Usuario.query.get(id_user)
         if not usuario:
             return {"message": "Usuario no encontrado"}, 404
@@ -292,12 +244,15 @@ class UsuarioDetail(Resource):
             return {"message": "No puede inactivar su propio usuario"}, 400
 
         usuario.flag_estado = '0'
+        usuario.sync_token_version()
         db.session.commit()
+        invalidate_principal(id_user)
 
         return {"message": "Usuario inactivado exitosamente"}, 200
 
 @usuario_ns.route('/<int:id_user>/reactivar')
 class ReactivarUsuario(Resource):
+    @auth_role_required('administrador')
     @usuario_ns.expect(auth_parser)
     @usuario_ns.response(200, 'Usuario reactivado exitosamente')
     @usuario_ns.response(401, 'Token inválido o faltante')
@@ -305,111 +260,64 @@ class ReactivarUsuario(Resource):
     @usuario_ns.response(404, 'Usuario no encontrado')
     def put(self, id_user):
         """Reactivar un usuario inactivo (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         usuario = Usuario.query.get(id_user)
         if not usuario:
             return {"message": "Usuario no encontrado"}, 404
 
         usuario.flag_estado = '1'
+        usuario.sync_token_version()
         db.session.commit()
+        invalidate_principal(id_user)
 
         return {"message": "Usuario reactivado exitosamente"}, 200
 
 @usuario_ns.route('/buscar/<string:nombre>')
 class BuscarUsuarios(Resource):
+    @auth_role_required('administrador')
     @usuario_ns.expect(auth_parser)
     @usuario_ns.response(200, 'Búsqueda completada exitosamente')
     @usuario_ns.response(401, 'Token inválido o faltante')
     @usuario_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
-    @usuario_ns.marshal_list_with(usuario_response_model)
+    @marshal_unless_fields(usuario_ns, usuario_response_model, as_list=True)
     def get(self, nombre):
         """Buscar usuarios por nombre (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         usuarios = Usuario.query.filter(
             Usuario.nombre_user.ilike(f'%{nombre}%'),
             Usuario.flag_estado == '1'
-        ).all()
+        )
         
-        return [usuario.to_dict() for usuario in usuarios], 200
+        return serialize_list(usuarios, Usuario), 200
 
 @usuario_ns.route('/administradores')
 class UsuariosAdministradores(Resource):
+    @auth_role_required('administrador')
     @usuario_ns.expect(auth_parser)
     @usuario_ns.response(200, 'Administradores obtenidos exitosamente')
     @usuario_ns.response(401, 'Token inválido o faltante')
     @usuario_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
-    @usuario_ns.marshal_list_with(usuario_response_model)
+    @marshal_unless_fields(usuario_ns, usuario_response_model, as_list=True)
     def get(self):
         """Obtener todos los usuarios administradores (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         usuarios = Usuario.query.filter_by(
             flag_administrador='1', 
             flag_estado='1'
-        ).all()
+        )
         
-        return [usuario.to_dict() for usuario in usuarios], 200
+        return serialize_list(usuarios, Usuario), 200
 
 @usuario_ns.route('/inventarios')
 class UsuariosConInventarios(Resource):
+    @auth_role_required('administrador')
     @usuario_ns.expect(auth_parser)
     @usuario_ns.response(200, 'Usuarios con permisos de inventario obtenidos exitosamente')
     @usuario_ns.response(401, 'Token inválido o faltante')
     @usuario_ns.response(403, 'Acceso denegado - Se requiere rol administrador')
-    @usuario_ns.marshal_list_with(usuario_response_model)
+    @marshal_unless_fields(usuario_ns, usuario_response_model, as_list=True)
     def get(self):
         """Obtener usuarios con permisos de inventario (Requiere rol administrador)"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token y permisos
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        current_user = Usuario.query.get(token_data["user_id"])
-        if not current_user or current_user.flag_administrador != '1':
-            return {"message": "Acceso denegado - Se requiere rol administrador"}, 403
-
         usuarios = Usuario.query.filter_by(
             flag_inventarios='1', 
             flag_estado='1'
-        ).all()
+        )
         
-        return [usuario.to_dict() for usuario in usuarios], 200
\ No newline at end of file
+        return serialize_list(usuarios, Usuario), 200
\ No newline at end of file
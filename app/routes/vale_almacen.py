@@ -1,23 +1,39 @@
 # app/routes/vale_almacen.py
 from flask import Blueprint, request, jsonify
 from app.models.usuario import Usuario
+from app.models.almacen import Almacen
+from app.models.entidad_relacion import EntidadRelacion
 from app.models.vale_almacen import ValeAlmacen
 from app.extensions import db
 from app.models.vale_almacen_det import ValeAlmacenDet
 from app.services.auth_service import generate_token
+from app.services.vale_almacen_service import (
+    ValeAlmacenError, crear_vale_con_detalles, inactivar_vale, insert_detalles, registrar_transferencia,
+    validar_modificacion, validate_detalles
+)
+from app.services.cierre_service import periodo_cerrado
+from app.services.stock_service import StockError, post_detalles
 from app.decorators.PyJWT import token_required
+from app.utils.pagination import CursorInvalido, paginar_vales
+from app.utils.serializers import serialize_all
 from datetime import datetime
 
 vale_almacen_bp = Blueprint('vale_almacen', __name__)
 
-# Obtener todos los vales de almacén
+def _paginar_vales(query):
+    """Devolver una página de vales según los parámetros limit/after/fields"""
+    try:
+        output, next_cursor = paginar_vales(query)
+    except CursorInvalido as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({'vales_almacen': output, 'next_cursor': next_cursor}), 200
+
+# Obtener todos los vales de almacén (paginado con limit/after)
 @vale_almacen_bp.route('/', methods=['GET'])
 @token_required
 def ConsultarValesAlmacen(current_user):
-    vales = ValeAlmacen.query.all()
-    output = [vale.to_dict() for vale in vales]
-
-    return jsonify({'vales_almacen': output}), 200
+    return _paginar_vales(ValeAlmacen.query)
 
 # Obtener un vale de almacén por ID
 @vale_almacen_bp.route('//<int:id_vale>', methods=['GET'])
@@ -39,13 +55,12 @@ def ConsultarValesTipoMovFecha(current_user, id_tipo_mov, fecha_inicio, fecha_fi
     except ValueError:
         return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
 
-    vales = ValeAlmacen.query.filter(
+    query = ValeAlmacen.query.filter(
         ValeAlmacen.id_tipo_mov_almacen == id_tipo_mov,
         ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt)
-    ).all()
-    output = [vale.to_dict() for vale in vales]
+    )
 
-    return jsonify({'vales_almacen': output}), 200
+    return _paginar_vales(query)
 
 # Consultar vales por tipo movimiento de documento, numero de documento y fecha inicio y fin
 @vale_almacen_bp.route('/tipo_doc/<int:id_tipo_doc>/nro_doc/<string:nro_doc>/fecha_inicio/<string:fecha_inicio>/fecha_fin/<string:fecha_fin>', methods=['GET'])
@@ -57,14 +72,13 @@ def ConsultarValesTipoDocNroDocFecha(current_user, id_tipo_doc, nro_doc, fecha_i
     except ValueError:
         return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
 
-    vales = ValeAlmacen.query.filter(
+    query = ValeAlmacen.query.filter(
         ValeAlmacen.id_tipo_doc == id_tipo_doc,      # ✅ Campo correcto
         ValeAlmacen.nro_documento == nro_doc,        # ✅ Campo correcto
         ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt)
-    ).all()
-    output = [vale.to_dict() for vale in vales]
+    )
 
-    return jsonify({'vales_almacen': output}), 200
+    return _paginar_vales(query)
 
 # Buscar vales por usuario y fecha inicio y fin
 @vale_almacen_bp.route('/usuario/<string:usuario>/fecha_inicio/<string:fecha_inicio>/fecha_fin/<string:fecha_fin>', methods=['GET'])
@@ -77,13 +91,12 @@ def BuscarValesUsuarioFecha(current_user, usuario, fecha_inicio, fecha_fin):
         return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
 
     # Usar join para buscar por nombre de usuario
-    vales = ValeAlmacen.query.join(Usuario).filter(
+    query = ValeAlmacen.query.join(Usuario).filter(
         Usuario.nombre_user.ilike(f'%{usuario}%'),  # ✅ Campo correcto
         ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt)
-    ).all()
-    output = [vale.to_dict() for vale in vales]
+    )
 
-    return jsonify({'vales_almacen': output}), 200
+    return _paginar_vales(query)
 
 # Buscar vales por entidad y fecha inicio y fin
 @vale_almacen_bp.route('/entidad/<string:entidad>/fecha_inicio/<string:fecha_inicio>/fecha_fin/<string:fecha_fin>', methods=['GET'])
@@ -95,13 +108,12 @@ def BuscarValesEntidadFecha(current_user, entidad, fecha_inicio, fecha_fin):
     except ValueError:
         return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
 
-    vales = ValeAlmacen.query.filter(
-        ValeAlmacen.entidad.nombre_entidad.ilike(f'%{entidad}%'),
+    query = ValeAlmacen.query.join(EntidadRelacion).filter(
+        EntidadRelacion.nombre_entidad.ilike(f'%{entidad}%'),
         ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt)
-    ).all()
-    output = [vale.to_dict() for vale in vales]
+    )
 
-    return jsonify({'vales_almacen': output}), 200
+    return _paginar_vales(query)
 
 # Buscar vales por almacen y fecha inicio y fin
 @vale_almacen_bp.route('/almacen/<string:almacen>/fecha_inicio/<string:fecha_inicio>/fecha_fin/<string:fecha_fin>', methods=['GET'])
@@ -113,13 +125,12 @@ def BuscarValesAlmacenFecha(current_user, almacen, fecha_inicio, fecha_fin):
     except ValueError:
         return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
 
-    vales = ValeAlmacen.query.filter(
-        ValeAlmacen.almacen.nombre_almacen.ilike(f'%{almacen}%'),
+    query = ValeAlmacen.query.join(Almacen).filter(
+        Almacen.nombre_almacen.ilike(f'%{almacen}%'),
         ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt)
-    ).all()
-    output = [vale.to_dict() for vale in vales]
+    )
 
-    return jsonify({'vales_almacen': output}), 200
+    return _paginar_vales(query)
 
 # Mostrar detalles de un vale de almacén por ID del vale
 @vale_almacen_bp.route('/<int:id_vale>/detalles', methods=['GET'])
@@ -129,7 +140,7 @@ def MostrarDetallesValeAlmacen(current_user, id_vale):
     if not vale:
         return jsonify({"message": "Vale de almacén no encontrado"}), 404
 
-    detalles = [detalle.to_dict() for detalle in vale.detalles]
+    detalles = serialize_all(ValeAlmacenDet.query.filter_by(id_vale_almacen=id_vale), ValeAlmacenDet)
 
     return jsonify({'detalles': detalles}), 200
 
@@ -143,12 +154,11 @@ def ConsultarValesRangoFechas(current_user, fecha_inicio, fecha_fin):
     except ValueError:
         return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
 
-    vales = ValeAlmacen.query.filter(
+    query = ValeAlmacen.query.filter(
         ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt)
-    ).all()
-    output = [vale.to_dict() for vale in vales]
+    )
 
-    return jsonify({'vales_almacen': output}), 200
+    return _paginar_vales(query)
 
 # Ingresar vale de almacén
 @vale_almacen_bp.route('/', methods=['POST'])
@@ -182,6 +192,47 @@ def IngresarValeAlmacen(current_user):
 
     return jsonify({"message": "Vale de almacén creado exitosamente", "id_vale_almacen": nuevo_vale.id_vale_almacen}), 201
 
+# Ingresar vale de almacén con todos sus detalles en una sola transacción
+@vale_almacen_bp.route('/completo', methods=['POST'])
+@token_required
+def IngresarValeAlmacenCompleto(current_user):
+    data = request.get_json()
+
+    try:
+        vale, detalles = crear_vale_con_detalles(data, current_user.id_user)
+        output = vale.to_dict()
+        output['detalles'] = [detalle.to_dict() for detalle in detalles]
+    except ValeAlmacenError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 400
+    except StockError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
+
+    db.session.commit()
+
+    return jsonify({"message": "Vale de almacén creado exitosamente", "vale_almacen": output}), 201
+
+# Transferir artículos entre almacenes: vale de salida (S03) e ingreso (I03) en una sola transacción
+@vale_almacen_bp.route('/transferencia', methods=['POST'])
+@token_required
+def IngresarTransferencia(current_user):
+    data = request.get_json()
+
+    try:
+        salida, ingreso, lineas = registrar_transferencia(data, current_user.id_user)
+        output = {'vale_salida': salida.to_dict(), 'vale_ingreso': ingreso.to_dict(), 'lineas': lineas}
+    except ValeAlmacenError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 400
+    except StockError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
+
+    db.session.commit()
+
+    return jsonify({"message": "Transferencia registrada exitosamente", **output}), 201
+
 # Ingresar detalles del vale de almacén
 @vale_almacen_bp.route('/<int:id_vale>/detalles', methods=['POST'])
 @token_required
@@ -194,19 +245,22 @@ def IngresarDetallesValeAlmacen(current_user, id_vale):
     if not data or 'detalles' not in data or not isinstance(data['detalles'], list):
         return jsonify({"message": "Datos incompletos para agregar detalles"}), 400
 
-    for detalle_data in data['detalles']:
-        if 'id_articulo' not in detalle_data or 'cantidad' not in detalle_data or 'precio_soles' not in detalle_data:
-            return jsonify({"message": "Datos incompletos en uno de los detalles"}), 400
+    # Una lista vacía no tiene nada que registrar
+    if not data['detalles']:
+        return jsonify({"message": "Detalles agregados exitosamente al vale de almacén"}), 201
 
-        nuevo_detalle = ValeAlmacenDet(
-            id_vale_almacen=id_vale,
-            id_articulo=detalle_data['id_articulo'],        # ✅ Campo correcto
-            cantidad=detalle_data['cantidad'],
-            precio_soles=detalle_data['precio_soles'],      # ✅ Campo correcto
-            item=detalle_data.get('item')  # Opcional, si se envía
-        )
-        db.session.add(nuevo_detalle)
+    try:
+        filas = validate_detalles(data['detalles'])
+    except ValeAlmacenError as e:
+        return jsonify(e.to_dict()), 400
 
+    # Inserción en lote en lugar de un db.session.add() por línea
+    try:
+        lineas = insert_detalles(id_vale, filas)
+        post_detalles(vale, lineas)
+    except StockError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
     db.session.commit()
 
     return jsonify({"message": "Detalles agregados exitosamente al vale de almacén"}), 201
@@ -220,20 +274,39 @@ def ModificarValeAlmacen(current_user, id_vale):
         return jsonify({"message": "Vale de almacén no encontrado"}), 404
 
     data = request.get_json()
-    vale.cod_vale_almacen = data.get('cod_vale_almacen', vale.cod_vale_almacen)
-    vale.id_almacen = data.get('id_almacen', vale.id_almacen)
+    cambios = {campo: data[campo] for campo in ('id_almacen', 'id_tipo_mov_almacen', 'flag_estado') if campo in data}
     if 'fecha_vale' in data:
         try:
-            vale.fecha_vale = datetime.strptime(data['fecha_vale'], '%Y-%m-%d')
+            cambios['fecha_vale'] = datetime.strptime(data['fecha_vale'], '%Y-%m-%d')
         except ValueError:
             return jsonify({"message": "Formato de fecha inválido. Use YYYY-MM-DD."}), 400
-    vale.id_tipo_mov_almacen = data.get('id_tipo_mov_almacen', vale.id_tipo_mov_almacen)
+    try:
+        validar_modificacion(vale, cambios)
+    except ValeAlmacenError as e:
+        return jsonify(e.to_dict()), 400
+    if 'fecha_vale' in cambios:
+        # Mover la fecha desde o hacia un periodo cerrado alteraría sus saldos guardados
+        cerrado = periodo_cerrado(vale.fecha_vale) or periodo_cerrado(cambios['fecha_vale'])
+        if cambios['fecha_vale'] != vale.fecha_vale and cerrado:
+            return jsonify({"message": f"No se puede mover el vale desde o hacia un periodo cerrado ({cerrado})"}), 409
+
+    vale.cod_vale_almacen = data.get('cod_vale_almacen', vale.cod_vale_almacen)
+    vale.id_almacen = cambios.get('id_almacen', vale.id_almacen)
+    vale.fecha_vale = cambios.get('fecha_vale', vale.fecha_vale)
+    vale.id_tipo_mov_almacen = cambios.get('id_tipo_mov_almacen', vale.id_tipo_mov_almacen)
     vale.id_user = data.get('id_user', vale.id_user)
     vale.id_entidad = data.get('id_entidad', vale.id_entidad)
     vale.id_tipo_doc = data.get('id_tipo_doc', vale.id_tipo_doc)
     vale.serie_doc = data.get('serie_doc', vale.serie_doc)
     vale.nro_documento = data.get('nro_documento', vale.nro_documento)
-    vale.flag_estado = data.get('flag_estado', vale.flag_estado)
+
+    # Inactivar por PUT también revierte stock y kardex, igual que DELETE
+    if cambios.get('flag_estado') == '0' and vale.flag_estado == '1':
+        try:
+            inactivar_vale(vale)
+        except StockError as e:
+            db.session.rollback()
+            return jsonify(e.to_dict()), 409
 
     db.session.commit()
 
@@ -247,9 +320,12 @@ def InactivarValeAlmacen(current_user, id_vale):
     if not vale:
         return jsonify({"message": "Vale de almacén no encontrado"}), 404
 
-    vale.flag_estado = '0'
-    for detalle in vale.detalles:
-        detalle.flag_estado = '0'
+    # Revierte el stock y agrega el kardex compensatorio antes de inactivar
+    try:
+        inactivar_vale(vale)
+    except StockError as e:
+        db.session.rollback()
+        return jsonify(e.to_dict()), 409
 
     db.session.commit()
 
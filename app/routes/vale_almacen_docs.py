@@ -1,9 +1,18 @@
-from flask import request
+from flask import g, request
 from flask_restx import Resource, fields, Namespace, reqparse
 from app.models.usuario import Usuario
 from app.models.vale_almacen import ValeAlmacen
 from app.models.vale_almacen_det import ValeAlmacenDet
 from app.extensions import db
+from app.decorators.PyJWT import auth_required
+from app.services.vale_almacen_service import (
+    ValeAlmacenError, crear_vale_con_detalles, inactivar_vale, insert_detalles, registrar_transferencia,
+    validar_modificacion, validate_detalles
+)
+from app.services.cierre_service import periodo_cerrado
+from app.services.stock_service import StockError, post_detalles
+from app.utils.pagination import CursorInvalido, paginar_vales
+from app.utils.serializers import marshal_unless_fields, serialize_list
 from datetime import datetime
 
 # Crear namespace para Swagger
@@ -55,6 +64,7 @@ detalle_vale_model = vale_almacen_ns.model('DetalleValeAlmacen', {
     'id_articulo': fields.Integer(required=True, description='ID del artículo'),
     'cantidad': fields.Float(required=True, description='Cantidad del artículo'),
     'precio_soles': fields.Float(required=True, description='Precio unitario en soles'),
+    'fecha_vencimiento': fields.Date(description='Vencimiento del lote (YYYY-MM-DD) - Opcional, ordena el consumo FEFO'),
     'item': fields.Integer(description='Número de item (opcional)')
 })
 
@@ -62,6 +72,31 @@ detalles_vale_create_model = vale_almacen_ns.model('CrearDetallesVale', {
     'detalles': fields.List(fields.Nested(detalle_vale_model), required=True, description='Lista de detalles del vale')
 })
 
+vale_almacen_completo_model = vale_almacen_ns.inherit('CrearValeAlmacenCompleto', vale_almacen_create_model, {
+    'id_user': fields.Integer(description='Se ignora: el vale se registra siempre a nombre del usuario del token'),
+    'detalles': fields.List(fields.Nested(detalle_vale_model), required=True, description='Lista de detalles del vale')
+})
+
+detalle_transferencia_model = vale_almacen_ns.model('DetalleTransferencia', {
+    'id_articulo': fields.Integer(required=True, description='ID del artículo'),
+    'cantidad': fields.Float(required=True, description='Cantidad a transferir'),
+    'fecha_vencimiento': fields.Date(description='Vencimiento del lote en el destino (YYYY-MM-DD) - Opcional'),
+    'item': fields.Integer(description='Número de item (opcional)')
+})
+
+transferencia_model = vale_almacen_ns.model('CrearTransferencia', {
+    'cod_vale_salida': fields.String(required=True, description='Código del vale de salida (S03) en el almacén de origen'),
+    'cod_vale_ingreso': fields.String(required=True, description='Código del vale de ingreso (I03) en el almacén de destino'),
+    'id_almacen_origen': fields.Integer(required=True, description='ID del almacén de origen'),
+    'id_almacen_destino': fields.Integer(required=True, description='ID del almacén de destino'),
+    'fecha_vale': fields.Date(description='Fecha de ambos vales (YYYY-MM-DD) - Opcional, por defecto hoy'),
+    'id_tipo_doc': fields.Integer(description='ID del tipo de documento (p. ej. guía de remisión)'),
+    'serie_doc': fields.String(description='Serie del documento'),
+    'nro_documento': fields.String(description='Número del documento'),
+    'detalles': fields.List(fields.Nested(detalle_transferencia_model), required=True,
+                            description='Artículos a transferir; se valorizan al costo promedio del origen')
+})
+
 vale_almacen_response_model = vale_almacen_ns.model('ValeAlmacenResponse', {
     'id_vale_almacen': fields.Integer(description='ID único del vale'),
     'cod_vale_almacen': fields.String(description='Código único del vale'),
@@ -83,22 +118,29 @@ detalle_response_model = vale_almacen_ns.model('DetalleValeResponse', {
     'id_articulo': fields.Integer(description='ID del artículo'),
     'cantidad': fields.Float(description='Cantidad'),
     'precio_soles': fields.Float(description='Precio unitario'),
+    'fecha_vencimiento': fields.Date(description='Vencimiento del lote'),
     'item': fields.Integer(description='Número de item'),
     'flag_estado': fields.String(description='Estado del detalle')
 })
 
+vale_almacen_page_model = vale_almacen_ns.model('ValeAlmacenPage', {
+    'vales_almacen': fields.List(fields.Nested(vale_almacen_response_model), description='Página de vales'),
+    'next_cursor': fields.String(description='Cursor para la siguiente página (null en la última)')
+})
+
 # Parsers para parámetros de consulta
-fecha_parser = reqparse.RequestParser()
-fecha_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
+pagina_parser = reqparse.RequestParser()
+pagina_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
+pagina_parser.add_argument('limit', type=int, location='args', help='Cantidad máxima de vales por página')
+pagina_parser.add_argument('after', location='args', help='Cursor devuelto en next_cursor')
 
-tipo_mov_parser = reqparse.RequestParser()
-tipo_mov_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
+fecha_parser = pagina_parser.copy()
 
-tipo_doc_parser = reqparse.RequestParser()
-tipo_doc_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
+tipo_mov_parser = pagina_parser.copy()
 
-usuario_parser = reqparse.RequestParser()
-usuario_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
+tipo_doc_parser = pagina_parser.copy()
+
+usuario_parser = pagina_parser.copy()
 
 entidad_parser = reqparse.RequestParser()
 entidad_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
@@ -110,43 +152,40 @@ almacen_parser.add_argument('Authorization', location='headers', required=True,
 auth_parser = reqparse.RequestParser()
 auth_parser.add_argument('Authorization', location='headers', required=True, help='Token Bearer')
 
+def _paginar_vales(query):
+    """Devolver una página de vales según los parámetros limit/after/fields"""
+    try:
+        output, next_cursor = paginar_vales(query)
+    except CursorInvalido as e:
+        vale_almacen_ns.abort(400, str(e))
+
+    return {
+        'vales_almacen': output,
+        'next_cursor': next_cursor
+    }, 200
+
 # Endpoints con Swagger Documentation
 @vale_almacen_ns.route('/')
 class ValeAlmacenList(Resource):
-    @vale_almacen_ns.expect(auth_parser)
+    @auth_required
+    @vale_almacen_ns.expect(pagina_parser)
     @vale_almacen_ns.response(200, 'Lista de vales obtenida exitosamente')
+    @vale_almacen_ns.response(400, 'Parámetros de paginación inválidos')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
-    @vale_almacen_ns.marshal_list_with(vale_almacen_response_model)
+    @marshal_unless_fields(vale_almacen_ns, vale_almacen_page_model)
     def get(self):
-        """Obtener todos los vales de almacén activos"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
-        vales = ValeAlmacen.query.filter_by(flag_estado='1').all()
-        return [vale.to_dict() for vale in vales], 200
+        """Obtener los vales de almacén activos (paginado con limit/after)"""
+        return _paginar_vales(ValeAlmacen.query.filter_by(flag_estado='1'))
 
+    @auth_required
     @vale_almacen_ns.expect(auth_parser, vale_almacen_create_model)
     @vale_almacen_ns.response(201, 'Vale de almacén creado exitosamente')
     @vale_almacen_ns.response(400, 'Datos inválidos o código ya existe')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
     def post(self):
         """Crear un nuevo vale de almacén"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-
         # Validar campos obligatorios
         required_fields = ['cod_vale_almacen', 'id_almacen', 'id_tipo_mov_almacen', 'id_user']
         if not all(field in data for field in required_fields):
@@ -188,62 +227,114 @@ class ValeAlmacenList(Resource):
             "id_vale_almacen": nuevo_vale.id_vale_almacen
         }, 201
 
+@vale_almacen_ns.route('/completo')
+class ValeAlmacenCompleto(Resource):
+    @auth_required
+    @vale_almacen_ns.expect(auth_parser, vale_almacen_completo_model)
+    @vale_almacen_ns.response(201, 'Vale de almacén y detalles creados exitosamente')
+    @vale_almacen_ns.response(400, 'Datos inválidos, código duplicado o artículos inexistentes')
+    @vale_almacen_ns.response(409, 'Stock insuficiente para la salida o fecha en un periodo cerrado')
+    @vale_almacen_ns.response(401, 'Token inválido o faltante')
+    def post(self):
+        """Crear un vale de almacén con todos sus detalles en una sola transacción"""
+        data = request.get_json()
+
+        try:
+            vale, detalles = crear_vale_con_detalles(data, g.current_user.id_user)
+            output = vale.to_dict()
+            output['detalles'] = [detalle.to_dict() for detalle in detalles]
+        except ValeAlmacenError as e:
+            db.session.rollback()
+            return e.to_dict(), 400
+        except StockError as e:
+            db.session.rollback()
+            return e.to_dict(), 409
+
+        db.session.commit()
+
+        return {"message": "Vale de almacén creado exitosamente", "vale_almacen": output}, 201
+
+@vale_almacen_ns.route('/transferencia')
+class ValeAlmacenTransferencia(Resource):
+    @auth_required
+    @vale_almacen_ns.expect(auth_parser, transferencia_model)
+    @vale_almacen_ns.response(201, 'Transferencia registrada exitosamente')
+    @vale_almacen_ns.response(400, 'Datos inválidos, códigos duplicados o artículos inexistentes')
+    @vale_almacen_ns.response(409, 'Stock insuficiente en el almacén de origen o fecha en un periodo cerrado')
+    @vale_almacen_ns.response(401, 'Token inválido o faltante')
+    def post(self):
+        """Transferir artículos entre almacenes (vales S03 e I03 en una sola transacción)"""
+        data = request.get_json()
+
+        try:
+            salida, ingreso, lineas = registrar_transferencia(data, g.current_user.id_user)
+            output = {'vale_salida': salida.to_dict(), 'vale_ingreso': ingreso.to_dict(), 'lineas': lineas}
+        except ValeAlmacenError as e:
+            db.session.rollback()
+            return e.to_dict(), 400
+        except StockError as e:
+            db.session.rollback()
+            return e.to_dict(), 409
+
+        db.session.commit()
+
+        return {"message": "Transferencia registrada exitosamente", **output}, 201
+
 @vale_almacen_ns.route('/<int:id_vale>')
 class ValeAlmacenDetail(Resource):
+    @auth_required
     @vale_almacen_ns.expect(auth_parser)
     @vale_almacen_ns.response(200, 'Vale obtenido exitosamente', vale_almacen_response_model)
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
     @vale_almacen_ns.response(404, 'Vale no encontrado')
     def get(self, id_vale):
         """Obtener un vale de almacén por ID"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         vale = ValeAlmacen.query.get(id_vale)
         if not vale or vale.flag_estado != '1':
             return {"message": "Vale de almacén no encontrado"}, 404
 
         return vale.to_dict(), 200
 
+    @auth_required
     @vale_almacen_ns.expect(auth_parser, vale_almacen_update_model)
     @vale_almacen_ns.response(200, 'Vale actualizado exitosamente')
-    @vale_almacen_ns.response(400, 'Datos inválidos')
+    @vale_almacen_ns.response(400, 'Datos inválidos, vale inactivado o campos registrados en kardex (almacén, tipo de movimiento, fecha)')
+    @vale_almacen_ns.response(409, 'La fecha entra o sale de un periodo cerrado, o el vale no puede revertirse')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
     @vale_almacen_ns.response(404, 'Vale no encontrado')
     def put(self, id_vale):
         """Modificar un vale de almacén"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         vale = ValeAlmacen.query.get(id_vale)
         if not vale:
             return {"message": "Vale de almacén no encontrado"}, 404
 
-        # Actualizar campos
-        if 'cod_vale_almacen' in data:
-            vale.cod_vale_almacen = data['cod_vale_almacen']
-        if 'id_almacen' in data:
-            vale.id_almacen = data['id_almacen']
+        cambios = {campo: data[campo] for campo in ('id_almacen', 'id_tipo_mov_almacen', 'flag_estado') if campo in data}
         if 'fecha_vale' in data:
             try:
-                vale.fecha_vale = datetime.strptime(data['fecha_vale'], '%Y-%m-%d')
+                cambios['fecha_vale'] = datetime.strptime(data['fecha_vale'], '%Y-%m-%d')
             except ValueError:
                 return {"message": "Formato de fecha inválido. Use YYYY-MM-DD."}, 400
-        if 'id_tipo_mov_almacen' in data:
-            vale.id_tipo_mov_almacen = data['id_tipo_mov_almacen']
+        try:
+            validar_modificacion(vale, cambios)
+        except ValeAlmacenError as e:
+            return e.to_dict(), 400
+        if 'fecha_vale' in cambios:
+            # Mover la fecha desde o hacia un periodo cerrado alteraría sus saldos guardados
+            cerrado = periodo_cerrado(vale.fecha_vale) or periodo_cerrado(cambios['fecha_vale'])
+            if cambios['fecha_vale'] != vale.fecha_vale and cerrado:
+                return {"message": f"No se puede mover el vale desde o hacia un periodo cerrado ({cerrado})"}, 409
+
+        # Actualizar campos
+        if 'cod_vale_almacen' in data:
+            vale.cod_vale_almacen = data['cod_vale_almacen']
+        if 'id_almacen' in cambios:
+            vale.id_almacen = cambios['id_almacen']
+        if 'fecha_vale' in cambios:
+            vale.fecha_vale = cambios['fecha_vale']
+        if 'id_tipo_mov_almacen' in cambios:
+            vale.id_tipo_mov_almacen = cambios['id_tipo_mov_almacen']
         if 'id_user' in data:
             vale.id_user = data['id_user']
         if 'id_entidad' in data:
@@ -254,36 +345,37 @@ class ValeAlmacenDetail(Resource):
             vale.serie_doc = data['serie_doc']
         if 'nro_documento' in data:
             vale.nro_documento = data['nro_documento']
-        if 'flag_estado' in data:
-            vale.flag_estado = data['flag_estado']
+
+        # Inactivar por PUT también revierte stock y kardex, igual que DELETE
+        if cambios.get('flag_estado') == '0' and vale.flag_estado == '1':
+            try:
+                inactivar_vale(vale)
+            except StockError as e:
+                db.session.rollback()
+                return e.to_dict(), 409
 
         db.session.commit()
 
         return {"message": "Vale de almacén modificado exitosamente"}, 200
 
+    @auth_required
     @vale_almacen_ns.expect(auth_parser)
     @vale_almacen_ns.response(200, 'Vale inactivado exitosamente')
+    @vale_almacen_ns.response(409, 'El vale no puede revertirse (periodo cerrado o stock insuficiente)')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
     @vale_almacen_ns.response(404, 'Vale no encontrado')
     def delete(self, id_vale):
         """Inactivar un vale de almacén y sus detalles"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         vale = ValeAlmacen.query.get(id_vale)
         if not vale:
             return {"message": "Vale de almacén no encontrado"}, 404
 
-        vale.flag_estado = '0'
-        # Inactivar también los detalles
-        for detalle in vale.detalles:
-            detalle.flag_estado = '0'
+        # Revierte el stock y agrega el kardex compensatorio antes de inactivar
+        try:
+            inactivar_vale(vale)
+        except StockError as e:
+            db.session.rollback()
+            return e.to_dict(), 409
 
         db.session.commit()
 
@@ -291,46 +383,32 @@ class ValeAlmacenDetail(Resource):
 
 @vale_almacen_ns.route('/<int:id_vale>/detalles')
 class DetallesValeAlmacen(Resource):
+    @auth_required
     @vale_almacen_ns.expect(auth_parser)
     @vale_almacen_ns.response(200, 'Detalles obtenidos exitosamente')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
     @vale_almacen_ns.response(404, 'Vale no encontrado')
-    @vale_almacen_ns.marshal_list_with(detalle_response_model)
+    @marshal_unless_fields(vale_almacen_ns, detalle_response_model, as_list=True)
     def get(self, id_vale):
         """Obtener los detalles de un vale de almacén"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         vale = ValeAlmacen.query.get(id_vale)
         if not vale:
             return {"message": "Vale de almacén no encontrado"}, 404
 
-        detalles = [detalle.to_dict() for detalle in vale.detalles if detalle.flag_estado == '1']
-        return detalles, 200
+        detalles = ValeAlmacenDet.query.filter_by(id_vale_almacen=id_vale, flag_estado='1')
+        return serialize_list(detalles, ValeAlmacenDet), 200
 
+    @auth_required
     @vale_almacen_ns.expect(auth_parser, detalles_vale_create_model)
     @vale_almacen_ns.response(201, 'Detalles agregados exitosamente')
     @vale_almacen_ns.response(400, 'Datos inválidos o incompletos')
+    @vale_almacen_ns.response(409, 'Stock insuficiente para la salida o fecha en un periodo cerrado')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
     @vale_almacen_ns.response(404, 'Vale no encontrado')
     def post(self, id_vale):
         """Agregar detalles a un vale de almacén"""
-        args = auth_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
         data = request.get_json()
         
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-            
         vale = ValeAlmacen.query.get(id_vale)
         if not vale:
             return {"message": "Vale de almacén no encontrado"}, 404
@@ -338,19 +416,21 @@ class DetallesValeAlmacen(Resource):
         if not data or 'detalles' not in data or not isinstance(data['detalles'], list):
             return {"message": "Datos incompletos para agregar detalles"}, 400
 
-        for detalle_data in data['detalles']:
-            if 'id_articulo' not in detalle_data or 'cantidad' not in detalle_data or 'precio_soles' not in detalle_data:
-                return {"message": "Datos incompletos en uno de los detalles"}, 400
+        # Una lista vacía no tiene nada que registrar
+        if not data['detalles']:
+            return {"message": "Detalles agregados exitosamente al vale de almacén"}, 201
 
-            nuevo_detalle = ValeAlmacenDet(
-                id_vale_almacen=id_vale,
-                id_articulo=detalle_data['id_articulo'],
-                cantidad=detalle_data['cantidad'],
-                precio_soles=detalle_data['precio_soles'],
-                item=detalle_data.get('item')
-            )
-            db.session.add(nuevo_detalle)
+        try:
+            filas = validate_detalles(data['detalles'])
+        except ValeAlmacenError as e:
+            return e.to_dict(), 400
 
+        try:
+            lineas = insert_detalles(id_vale, filas)
+            post_detalles(vale, lineas)
+        except StockError as e:
+            db.session.rollback()
+            return e.to_dict(), 409
         db.session.commit()
 
         return {"message": "Detalles agregados exitosamente al vale de almacén"}, 201
@@ -358,128 +438,96 @@ class DetallesValeAlmacen(Resource):
 # Endpoints de consulta especializados
 @vale_almacen_ns.route('/tipo-mov/<int:id_tipo_mov>/fecha-inicio/<string:fecha_inicio>/fecha-fin/<string:fecha_fin>')
 class ValesPorTipoMovimiento(Resource):
+    @auth_required
     @vale_almacen_ns.expect(tipo_mov_parser)
     @vale_almacen_ns.response(200, 'Vales obtenidos exitosamente')
-    @vale_almacen_ns.response(400, 'Formato de fecha inválido')
+    @vale_almacen_ns.response(400, 'Formato de fecha o paginación inválidos')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
-    @vale_almacen_ns.marshal_list_with(vale_almacen_response_model)
+    @marshal_unless_fields(vale_almacen_ns, vale_almacen_page_model)
     def get(self, id_tipo_mov, fecha_inicio, fecha_fin):
         """Consultar vales por tipo de movimiento y rango de fechas"""
-        args = tipo_mov_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-
         try:
             fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
             fecha_fin_dt = datetime.strptime(fecha_fin, '%Y-%m-%d')
         except ValueError:
             return {"message": "Formato de fecha inválido. Use YYYY-MM-DD."}, 400
 
-        vales = ValeAlmacen.query.filter(
+        query = ValeAlmacen.query.filter(
             ValeAlmacen.id_tipo_mov_almacen == id_tipo_mov,
             ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt),
             ValeAlmacen.flag_estado == '1'
-        ).all()
-        
-        return [vale.to_dict() for vale in vales], 200
+        )
+
+        return _paginar_vales(query)
 
 @vale_almacen_ns.route('/tipo-doc/<int:id_tipo_doc>/nro-doc/<string:nro_doc>/fecha-inicio/<string:fecha_inicio>/fecha-fin/<string:fecha_fin>')
 class ValesPorTipoDocNroDoc(Resource):
+    @auth_required
     @vale_almacen_ns.expect(tipo_doc_parser)
     @vale_almacen_ns.response(200, 'Vales obtenidos exitosamente')
-    @vale_almacen_ns.response(400, 'Formato de fecha inválido')
+    @vale_almacen_ns.response(400, 'Formato de fecha o paginación inválidos')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
-    @vale_almacen_ns.marshal_list_with(vale_almacen_response_model)
+    @marshal_unless_fields(vale_almacen_ns, vale_almacen_page_model)
     def get(self, id_tipo_doc, nro_doc, fecha_inicio, fecha_fin):
         """Consultar vales por tipo de documento, número de documento y rango de fechas"""
-        args = tipo_doc_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-
         try:
             fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
             fecha_fin_dt = datetime.strptime(fecha_fin, '%Y-%m-%d')
         except ValueError:
             return {"message": "Formato de fecha inválido. Use YYYY-MM-DD."}, 400
 
-        vales = ValeAlmacen.query.filter(
+        query = ValeAlmacen.query.filter(
             ValeAlmacen.id_tipo_doc == id_tipo_doc,
             ValeAlmacen.nro_documento == nro_doc,
             ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt),
             ValeAlmacen.flag_estado == '1'
-        ).all()
-        
-        return [vale.to_dict() for vale in vales], 200
+        )
+
+        return _paginar_vales(query)
 
 @vale_almacen_ns.route('/fecha-inicio/<string:fecha_inicio>/fecha-fin/<string:fecha_fin>')
 class ValesPorRangoFechas(Resource):
+    @auth_required
     @vale_almacen_ns.expect(fecha_parser)
     @vale_almacen_ns.response(200, 'Vales obtenidos exitosamente')
-    @vale_almacen_ns.response(400, 'Formato de fecha inválido')
+    @vale_almacen_ns.response(400, 'Formato de fecha o paginación inválidos')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
-    @vale_almacen_ns.marshal_list_with(vale_almacen_response_model)
+    @marshal_unless_fields(vale_almacen_ns, vale_almacen_page_model)
     def get(self, fecha_inicio, fecha_fin):
         """Consultar vales por rango de fechas"""
-        args = fecha_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-
         try:
             fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
             fecha_fin_dt = datetime.strptime(fecha_fin, '%Y-%m-%d')
         except ValueError:
             return {"message": "Formato de fecha inválido. Use YYYY-MM-DD."}, 400
 
-        vales = ValeAlmacen.query.filter(
+        query = ValeAlmacen.query.filter(
             ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt),
             ValeAlmacen.flag_estado == '1'
-        ).all()
-        
-        return [vale.to_dict() for vale in vales], 200
+        )
+
+        return _paginar_vales(query)
 
 @vale_almacen_ns.route('/usuario/<string:usuario>/fecha-inicio/<string:fecha_inicio>/fecha-fin/<string:fecha_fin>')
 class ValesPorUsuario(Resource):
+    @auth_required
     @vale_almacen_ns.expect(usuario_parser)
     @vale_almacen_ns.response(200, 'Vales obtenidos exitosamente')
-    @vale_almacen_ns.response(400, 'Formato de fecha inválido')
+    @vale_almacen_ns.response(400, 'Formato de fecha o paginación inválidos')
     @vale_almacen_ns.response(401, 'Token inválido o faltante')
-    @vale_almacen_ns.marshal_list_with(vale_almacen_response_model)
+    @marshal_unless_fields(vale_almacen_ns, vale_almacen_page_model)
     def get(self, usuario, fecha_inicio, fecha_fin):
         """Buscar vales por nombre de usuario y rango de fechas"""
-        args = usuario_parser.parse_args()
-        token = args['Authorization'].split(" ")[1]
-        
-        # Verificar token
-        from app.services.auth_service import decode_token
-        token_data = decode_token(token)
-        if "error" in token_data:
-            return {"message": token_data["error"]}, 401
-
         try:
             fecha_inicio_dt = datetime.strptime(fecha_inicio, '%Y-%m-%d')
             fecha_fin_dt = datetime.strptime(fecha_fin, '%Y-%m-%d')
         except ValueError:
             return {"message": "Formato de fecha inválido. Use YYYY-MM-DD."}, 400
 
-        vales = ValeAlmacen.query.join(Usuario).filter(
+        query = ValeAlmacen.query.join(Usuario).filter(
             Usuario.nombre_user.ilike(f'%{usuario}%'),
             ValeAlmacen.fecha_vale.between(fecha_inicio_dt, fecha_fin_dt),
             ValeAlmacen.flag_estado == '1'
-        ).all()
-        
-        return [vale.to_dict() for vale in vales], 200
\ No newline at end of file
+        )
+
+        return _paginar_vales(query)
\ No newline at end of file
@@ -13,7 +13,7 @@ def init_almacenes():
         {'id': 4, 'codigo': 'ALM004', 'nombre': 'ALMACÉN ACTIVOS FIJOS', 'tipo': 'O'},
         {'id': 5, 'codigo': 'ALM005', 'nombre': 'ALMACÉN HERRAMIENTAS Y EQUIPOS', 'tipo': 'M'},
         {'id': 6, 'codigo': 'ALM006', 'nombre': 'ALMACÉN MATERIALES DE OFICINA', 'tipo': 'M'},
-        {'id': 7, 'codigo': 'ALM007', 'nombre': 'ALMACÉN PRODUCTOS PERECIBLES', 'tipo': 'T'},
+        {'id': 7, 'codigo': 'ALM007', 'nombre': 'ALMACÉN PRODUCTOS PERECIBLES', 'tipo': 'T', 'costeo': 'FEFO'},
         {'id': 8, 'codigo': 'ALM008', 'nombre': 'ALMACÉN DEVOLUCIONES Y MERMAS', 'tipo': 'O'},
         {'id': 9, 'codigo': 'ALM009', 'nombre': 'ALMACÉN MATERIALES EN CONSIGNACIÓN', 'tipo': 'O'},
         {'id': 10, 'codigo': 'ALM010', 'nombre': 'ALMACÉN PRODUCTOS EN CUARENTENA', 'tipo': 'O'}
@@ -31,6 +31,7 @@ def init_almacenes():
                 cod_almacen=alm['codigo'],
                 nombre_almacen=alm['nombre'],
                 flag_tipo_almacen=alm['tipo'],
+                metodo_costeo=alm.get('costeo', 'PROM'),
                 flag_estado='1'
             )
             db.session.add(nuevo_almacen)
@@ -39,10 +40,12 @@ def init_almacenes():
             # Actualizar si existe pero con datos diferentes
             if (existing_by_id.nombre_almacen != alm['nombre'] or 
                 existing_by_id.flag_tipo_almacen != alm['tipo'] or
+                existing_by_id.metodo_costeo != alm.get('costeo', 'PROM') or
                 existing_by_id.flag_estado != '1'):
                 
                 existing_by_id.nombre_almacen = alm['nombre']
                 existing_by_id.flag_tipo_almacen = alm['tipo']
+                existing_by_id.metodo_costeo = alm.get('costeo', 'PROM')
                 existing_by_id.flag_estado = '1'
                 created_count += 1
     
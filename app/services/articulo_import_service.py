@@ -0,0 +1,184 @@
+# app/services/articulo_import_service.py
+import csv
+import math
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models.articulo import Articulo
+from app.models.categoria import Categoria
+from app.models.unidad import Unidad
+from app.services.valorizacion_service import marcar_todos_modificados
+from app.utils.sql import chunked, insert_ignore, lotes, upsert
+
+COLUMNAS_OBLIGATORIAS = ('cod_articulo', 'nombre_articulo', 'cod_unidad', 'id_categoria')
+# Límite de errores por fila incluidos en el resumen (el total siempre se informa)
+MAX_ERRORES_REPORTADOS = 1000
+
+_LONGITUDES = {'cod_articulo': 12, 'nombre_articulo': 200, 'descripcion_articulo': 500}
+
+
+class ImportacionError(ValueError):
+    """El archivo no puede importarse (p. ej. faltan columnas en el encabezado)"""
+
+
+class ImportacionInterrumpida(ImportacionError):
+    """El archivo dejó de poder leerse después de confirmar algunos lotes"""
+
+    def __init__(self, message, fila, resumen):
+        super().__init__(message)
+        self.fila = fila
+        self.resumen = resumen
+
+    def to_dict(self):
+        return {"message": str(self), "fila_interrumpida": self.fila, **self.resumen}
+
+
+def _validar_fila(fila, unidades, categorias):
+    """Convertir una fila del CSV en valores para insertar; devuelve (valores, None) o (None, mensaje)"""
+    for campo in COLUMNAS_OBLIGATORIAS:
+        if not (fila.get(campo) or '').strip():
+            return None, f"Falta el campo: {campo}"
+    valores = {
+        'cod_articulo': fila['cod_articulo'].strip(),
+        'nombre_articulo': fila['nombre_articulo'].strip(),
+        'descripcion_articulo': (fila.get('descripcion_articulo') or '').strip(),
+        'cod_unidad': fila['cod_unidad'].strip(),
+    }
+    for campo, longitud in _LONGITUDES.items():
+        if len(valores[campo]) > longitud:
+            return None, f"{campo} supera {longitud} caracteres"
+    try:
+        valores['id_categoria'] = int(fila['id_categoria'])
+        valores['precio_articulo'] = float(fila.get('precio_articulo') or 0)
+        stock = float(fila.get('stock_articulo') or 0)
+    except ValueError:
+        return None, "id_categoria, precio_articulo o stock_articulo no numéricos"
+    # float() acepta 'nan' e 'inf'
+    if not (math.isfinite(valores['precio_articulo']) and math.isfinite(stock)):
+        return None, "id_categoria, precio_articulo o stock_articulo no numéricos"
+    if valores['precio_articulo'] < 0:
+        return None, "El precio no puede ser negativo"
+    if stock:
+        return None, "stock_articulo se calcula desde los vales de almacén; registre un vale de ingreso"
+    if valores['cod_unidad'] not in unidades:
+        return None, "Unidad de medida no existe"
+    if valores['id_categoria'] not in categorias:
+        return None, "Categoría no existe"
+    return valores, None
+
+
+def importar_articulos(archivo, actualizar=False, tamano_lote=5000):
+    """Importar artículos desde un CSV (archivo de texto) leído en streaming.
+
+    Unidades y categorías se validan contra diccionarios cargados una sola
+    vez, los códigos ya registrados se buscan con un IN por lote y cada lote
+    se inserta (o, con `actualizar`, se actualiza por cod_articulo) con una
+    sentencia multi-fila. Las filas con errores se informan y se omiten sin
+    detener la importación, también las de un lote que la base rechaza
+    (p. ej. un código insertado a la vez por otra importación). Confirma
+    cada lote; devuelve un resumen.
+
+    Si el archivo no se puede leer (no es UTF-8 o no es un CSV válido) lanza
+    ImportacionError cuando aún no se confirmó ningún lote, o
+    ImportacionInterrumpida con el resumen de lo ya confirmado y la fila
+    donde se detuvo.
+    """
+    lector = csv.DictReader(archivo)
+    try:
+        encabezado = lector.fieldnames or []
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportacionError(_mensaje_lectura(e))
+    faltantes = [c for c in COLUMNAS_OBLIGATORIAS if c not in encabezado]
+    if faltantes:
+        raise ImportacionError(f"Faltan columnas en el encabezado: {', '.join(faltantes)}")
+
+    unidades = set(db.session.scalars(select(Unidad.cod_unidad)))
+    categorias = set(db.session.scalars(select(Categoria.id_categoria)))
+    engine = db.session.get_bind()
+    tabla = Articulo.__table__
+
+    resumen = {'procesadas': 0, 'insertadas': 0, 'actualizadas': 0, 'total_errores': 0, 'errores': []}
+    vistos = set()
+    confirmados = 0
+
+    def error(numero, fila, mensaje):
+        resumen['total_errores'] += 1
+        if len(resumen['errores']) < MAX_ERRORES_REPORTADOS:
+            resumen['errores'].append({'fila': numero, 'cod_articulo': fila.get('cod_articulo'), 'message': mensaje})
+
+    try:
+        # La fila 1 es el encabezado
+        for lote in lotes(enumerate(lector, start=2), tamano_lote):
+            validas = {}
+            for numero, fila in lote:
+                resumen['procesadas'] += 1
+                valores, mensaje = _validar_fila(fila, unidades, categorias)
+                if mensaje:
+                    error(numero, fila, mensaje)
+                elif valores['cod_articulo'] in vistos:
+                    error(numero, fila, "Código repetido en el archivo")
+                else:
+                    vistos.add(valores['cod_articulo'])
+                    validas[valores['cod_articulo']] = (numero, valores)
+            if not validas:
+                continue
+
+            try:
+                insertadas, actualizadas, repetidos = _guardar_lote(tabla, engine, validas, actualizar)
+            except IntegrityError:
+                db.session.rollback()
+                for numero, valores in validas.values():
+                    error(numero, valores, "La base de datos rechazó el lote de esta fila; vuelva a importarla")
+                continue
+            for codigo in repetidos:
+                numero, valores = validas[codigo]
+                error(numero, valores, "Ya existe un artículo con este código")
+            if actualizadas:
+                # El upsert puede cambiar la categoría de artículos con stock
+                marcar_todos_modificados()
+            db.session.commit()
+            confirmados += 1
+            resumen['insertadas'] += insertadas
+            resumen['actualizadas'] += actualizadas
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        if not confirmados:
+            raise ImportacionError(_mensaje_lectura(e))
+        resumen['errores'].sort(key=lambda e: e['fila'])
+        raise ImportacionInterrumpida(_mensaje_lectura(e), lector.line_num + 1, resumen)
+
+    resumen['errores'].sort(key=lambda e: e['fila'])
+    return resumen
+
+
+def _guardar_lote(tabla, engine, validas, actualizar):
+    """Escribir un lote validado; devuelve (insertadas, actualizadas, códigos que ya existían)"""
+    existentes = set()
+    for codigos in chunked(list(validas)):
+        existentes.update(db.session.scalars(select(Articulo.cod_articulo).where(Articulo.cod_articulo.in_(codigos))))
+    filas = [valores for codigo, (_, valores) in validas.items() if actualizar or codigo not in existentes]
+    if actualizar:
+        for bloque in chunked(filas):
+            db.session.execute(upsert(
+                tabla, engine, bloque, ['cod_articulo'],
+                lambda articulo, excluded: {
+                    campo: getattr(excluded, campo)
+                    for campo in ('nombre_articulo', 'descripcion_articulo', 'precio_articulo',
+                                  'cod_unidad', 'id_categoria')
+                }
+            ))
+        return len(filas) - len(existentes), len(existentes), []
+
+    # DO NOTHING: un código insertado por otra importación desde la consulta anterior no aborta el lote
+    insertados = set()
+    for bloque in chunked(filas):
+        insertados.update(db.session.scalars(
+            insert_ignore(tabla, engine, bloque, ['cod_articulo']).returning(tabla.c.cod_articulo)
+        ))
+    return len(insertados), 0, sorted(set(validas) - insertados)
+
+
+def _mensaje_lectura(error):
+    if isinstance(error, UnicodeDecodeError):
+        return "El archivo debe estar codificado en UTF-8"
+    return f"El archivo no es un CSV válido: {error}"
@@ -0,0 +1,139 @@
+# app/services/articulo_search_service.py
+import re
+from sqlalchemy import column, func, literal_column, table, text
+from app.extensions import db
+from app.models.articulo import Articulo
+
+LIMITE_BUSQUEDA = 20
+LIMITE_BUSQUEDA_MAXIMO = 100
+
+# Backend de búsqueda detectado por motor de base de datos (se evalúa una sola vez)
+_backends = {}
+
+_articulo_fts = table('articulo_fts', column('rowid'), column('rank'))
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() no es IMMUTABLE; el envoltorio permite usarlo en un índice de expresión
+    """CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+       LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+       AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$""",
+    """CREATE INDEX IF NOT EXISTS ix_articulo_nombre_trgm
+       ON articulo USING gin (lower(f_unaccent(nombre_articulo)) gin_trgm_ops)""",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS articulo_fts USING fts5(
+           nombre_articulo, cod_articulo,
+           content='articulo', content_rowid='id_articulo',
+           tokenize="unicode61 remove_diacritics 2", prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS articulo_fts_ai AFTER INSERT ON articulo BEGIN
+           INSERT INTO articulo_fts(rowid, nombre_articulo, cod_articulo)
+           VALUES (new.id_articulo, new.nombre_articulo, new.cod_articulo);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS articulo_fts_ad AFTER DELETE ON articulo BEGIN
+           INSERT INTO articulo_fts(articulo_fts, rowid, nombre_articulo, cod_articulo)
+           VALUES ('delete', old.id_articulo, old.nombre_articulo, old.cod_articulo);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS articulo_fts_au AFTER UPDATE OF nombre_articulo, cod_articulo ON articulo BEGIN
+           INSERT INTO articulo_fts(articulo_fts, rowid, nombre_articulo, cod_articulo)
+           VALUES ('delete', old.id_articulo, old.nombre_articulo, old.cod_articulo);
+           INSERT INTO articulo_fts(rowid, nombre_articulo, cod_articulo)
+           VALUES (new.id_articulo, new.nombre_articulo, new.cod_articulo);
+       END""",
+    "INSERT INTO articulo_fts(articulo_fts) VALUES ('rebuild')",
+]
+
+
+def init_search_index():
+    """Crear el índice de búsqueda de artículos según el motor de base de datos.
+
+    PostgreSQL: índice GIN pg_trgm sobre lower(f_unaccent(nombre_articulo)).
+    SQLite: tabla FTS5 sin acentos sincronizada por triggers (para desarrollo local).
+    Devuelve el nombre del backend creado o None si el motor no está soportado.
+    """
+    dialecto = db.engine.dialect.name
+    if dialecto == 'postgresql':
+        ddl = POSTGRES_DDL
+    elif dialecto == 'sqlite':
+        ddl = SQLITE_DDL
+    else:
+        return None
+
+    with db.engine.begin() as conn:
+        for sentencia in ddl:
+            conn.execute(text(sentencia))
+    _backends.pop(db.engine.url, None)
+    return _search_backend()
+
+
+def _search_backend():
+    """Detectar qué índice de búsqueda está disponible: 'trgm', 'fts5' o 'like'"""
+    engine = db.engine
+    if engine.url in _backends:
+        return _backends[engine.url]
+
+    backend = 'like'
+    if engine.dialect.name == 'postgresql':
+        existe = db.session.execute(text("SELECT to_regprocedure('f_unaccent(text)') IS NOT NULL")).scalar()
+        if existe:
+            backend = 'trgm'
+    elif engine.dialect.name == 'sqlite':
+        existe = db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articulo_fts'")
+        ).scalar()
+        if existe:
+            backend = 'fts5'
+
+    _backends[engine.url] = backend
+    return backend
+
+
+def _escape_like(texto):
+    return texto.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts5_match(texto):
+    """Convertir el texto del buscador en una consulta FTS5 de prefijos: "lap"* "hp"*"""
+    tokens = re.findall(r'\w+', texto, re.UNICODE)
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def get_search_limit(valor):
+    """Normalizar el parámetro limit de la búsqueda al rango 1..LIMITE_BUSQUEDA_MAXIMO"""
+    try:
+        limit = int(valor) if valor is not None else LIMITE_BUSQUEDA
+    except (TypeError, ValueError):
+        limit = LIMITE_BUSQUEDA
+    return max(1, min(limit, LIMITE_BUSQUEDA_MAXIMO))
+
+
+def search_articulos(texto, limit=LIMITE_BUSQUEDA, query=None):
+    """Construir la consulta de artículos que coinciden con `texto`, ordenada por relevancia.
+
+    La comparación ignora mayúsculas y acentos ("ALMACEN" encuentra "ALMACÉN")
+    cuando el índice de búsqueda existe (ver `flask init-search-index`); si no,
+    se usa el ILIKE original. Devuelve un Query limitado a `limit` filas.
+    """
+    query = query if query is not None else Articulo.query
+    texto = (texto or '').strip()
+    backend = _search_backend()
+
+    if backend == 'trgm':
+        termino = func.lower(func.f_unaccent(texto))
+        campo = func.lower(func.f_unaccent(Articulo.nombre_articulo))
+        query = query.filter(
+            campo.like(func.lower(func.f_unaccent(f'%{_escape_like(texto)}%')), escape='\\') |
+            termino.op('<%')(campo)
+        ).order_by(func.word_similarity(termino, campo).desc(), Articulo.nombre_articulo)
+    elif backend == 'fts5' and _fts5_match(texto):
+        query = query.join(_articulo_fts, _articulo_fts.c.rowid == Articulo.id_articulo).filter(
+            literal_column('articulo_fts').op('MATCH')(_fts5_match(texto))
+        ).order_by(_articulo_fts.c.rank, Articulo.nombre_articulo)
+    else:
+        query = query.filter(
+            Articulo.nombre_articulo.ilike(f'%{_escape_like(texto)}%', escape='\\')
+        ).order_by(Articulo.nombre_articulo)
+
+    return query.limit(limit)
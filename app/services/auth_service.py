@@ -1,21 +1,195 @@
+import hashlib
+import time
+import uuid
 import jwt
 from datetime import datetime, timedelta
-from flask import current_app
+from flask import current_app, g, request
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, make_transient_to_detached
+from app.extensions import db, principal_cache, revocation_store, token_versions
+from app.models.usuario import VERSIONES_REVOCADAS, Usuario
 
-def generate_token(id_user):
+# Rol -> claim del token que lo concede
+ROLES = {
+    'administrador': 'flag_administrador',
+    'inventarios': 'flag_inventarios'
+}
+
+class AuthError(Exception):
+    """La petición no pudo autenticarse"""
+
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def init_auth(app):
+    """Resolver una sola vez la clave y el algoritmo con que se firman los tokens"""
+    app.extensions['auth'] = {
+        'key': app.config['SECRET_KEY'],
+        'algorithm': app.config['JWT_ALGORITHM'],
+        'algorithms': [app.config['JWT_ALGORITHM']],
+        'expires': timedelta(seconds=app.config['JWT_ACCESS_TOKEN_EXPIRES'])
+    }
+
+def generate_token(user):
+    settings = current_app.extensions['auth']
     payload = {
-        "id_user": id_user,
-        "exp": datetime.utcnow() + timedelta(seconds=current_app.config['JWT_ACCESS_TOKEN_EXPIRES']),
-        "iat": datetime.utcnow()
+        "id_user": user.id_user,
+        "flag_administrador": user.flag_administrador,
+        "flag_inventarios": user.flag_inventarios,
+        "ver": user.token_version or 0,
+        "exp": datetime.utcnow() + settings['expires'],
+        "iat": datetime.utcnow(),
+        "jti": uuid.uuid4().hex
     }
-    token = jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm=current_app.config['JWT_ALGORITHM'])
+    token = jwt.encode(payload, settings['key'], algorithm=settings['algorithm'])
     return token
 
 def decode_token(token):
+    settings = current_app.extensions['auth']
     try:
-        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=[current_app.config['JWT_ALGORITHM']])
+        payload = jwt.decode(token, settings['key'], algorithms=settings['algorithms'])
         return payload
     except jwt.ExpiredSignatureError:
         return {"error": "Token expirado"}
     except jwt.InvalidTokenError:
         return {"error": "Token inválido"}
+
+def get_principal(id_user):
+    """Obtener el usuario autenticado, usando la caché de principales.
+
+    En un acierto no se consulta la base de datos: el usuario se reconstruye a
+    partir de sus columnas y se adjunta a la sesión con merge(load=False), así
+    que las rutas pueden modificarlo y hacer commit como siempre.
+    """
+    columnas = principal_cache.get(id_user)
+    if columnas is None:
+        user = db.session.get(Usuario, id_user)
+        if user is not None:
+            principal_cache.set(id_user, {c.key: getattr(user, c.key) for c in Usuario.__table__.columns})
+        return user
+
+    user = Usuario(**columnas)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def invalidate_principal(id_user):
+    """Descartar de las cachés un usuario cuyos datos cambiaron"""
+    principal_cache.invalidate(id_user)
+    token_versions.invalidate(id_user)
+
+def current_token_version(id_user):
+    """Versión de token vigente del usuario (None si ya no existe), con caché"""
+    version = token_versions.get(id_user)
+    if version is None:
+        version = db.session.execute(
+            select(Usuario.token_version).where(Usuario.id_user == id_user)
+        ).scalar()
+        if version is not None:
+            token_versions.set(id_user, version)
+    return version
+
+def version_jti(id_user, version):
+    """Clave de revocación de todos los tokens de una versión del usuario"""
+    return f"ver:{id_user}:{version}"
+
+@event.listens_for(Session, 'after_commit')
+def _revocar_versiones_tras_commit(session):
+    pendientes = session.info.pop(VERSIONES_REVOCADAS, [])
+    if not pendientes:
+        return
+    # Los tokens de la versión anterior vencen, a lo más, una vigencia después de ahora
+    exp = time.time() + current_app.extensions['auth']['expires'].total_seconds()
+    for id_user, version in pendientes:
+        revocation_store.revoke(version_jti(id_user, version), exp)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_versiones_tras_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(VERSIONES_REVOCADAS, None)
+
+def token_jti(token, payload):
+    """Identificador de revocación del token (los emitidos sin jti usan el hash del token)"""
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+def revoke_token(token, payload):
+    """Revocar el token hasta su expiración"""
+    revocation_store.revoke(token_jti(token, payload), payload["exp"])
+
+def is_token_revoked(token, payload):
+    """Revocado por logout o porque su versión fue reemplazada (una sola consulta al almacén)"""
+    return revocation_store.is_revoked(
+        token_jti(token, payload), version_jti(payload["id_user"], payload.get("ver", 0))
+    )
+
+def authenticate_token():
+    """Validar el token de la petición en curso sin cargar el usuario.
+
+    Verifica firma, revocación y versión (contra la caché de versiones; un
+    cambio de versión en otro worker llega por el almacén de revocaciones), deja
+    el payload en g.token_payload y lo devuelve. Lanza AuthError si el token
+    falta, es inválido, fue revocado o quedó desactualizado.
+    """
+    if 'token_payload' in g:
+        return g.token_payload
+
+    esquema, _, token = request.headers.get('Authorization', '').partition(' ')
+    token = token.strip()
+    if esquema.lower() != 'bearer' or not token:
+        raise AuthError("Token faltante")
+
+    payload = decode_token(token)
+    if "error" in payload:
+        raise AuthError(payload["error"])
+    if "id_user" not in payload:
+        raise AuthError("Token inválido")
+    if is_token_revoked(token, payload):
+        raise AuthError("Token revocado")
+
+    version = current_token_version(payload["id_user"])
+    if version is not None and payload.get("ver", 0) != version:
+        # La caché puede estar atrasada respecto de un token recién emitido por otro worker
+        token_versions.invalidate(payload["id_user"])
+        version = current_token_version(payload["id_user"])
+    if version is None:
+        raise AuthError("Usuario no encontrado")
+    # Tokens emitidos antes de un cambio de roles o estado del usuario
+    if payload.get("ver", 0) != version:
+        raise AuthError("Token desactualizado, inicie sesión nuevamente")
+
+    g.token = token
+    g.token_payload = payload
+    return payload
+
+def authenticate():
+    """Autenticar la petición en curso y devolver el usuario.
+
+    El token se extrae, verifica y resuelve una sola vez por petición: el
+    resultado queda en g.current_user (y el payload en g.token_payload), así
+    que llamadas posteriores no vuelven a decodificarlo.
+    """
+    if 'current_user' in g:
+        return g.current_user
+
+    payload = authenticate_token()
+    current_user = get_principal(payload["id_user"])
+    if current_user is None:
+        raise AuthError("Usuario no encontrado")
+
+    g.current_user = current_user
+    return current_user
+
+def has_role(*roles):
+    """Indicar si la petición tiene alguno de los roles, según los claims del token.
+
+    Los tokens emitidos antes de incluir los roles como claims se resuelven
+    con el usuario cargado.
+    """
+    payload = authenticate_token()
+    for rol in roles:
+        claim = ROLES[rol]
+        valor = payload[claim] if claim in payload else getattr(authenticate(), claim)
+        if valor == '1':
+            return True
+    return False
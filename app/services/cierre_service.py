@@ -0,0 +1,128 @@
+# app/services/cierre_service.py
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import delete, func, insert, select
+from app.extensions import db
+from app.models.kardex import Kardex
+from app.models.stock_cierre import StockCierre
+
+
+class CierreError(ValueError):
+    """Periodo o fecha inválidos para un cierre o una consulta de stock"""
+
+
+def parse_periodo(valor):
+    """Normalizar 'YYYY-MM' o 'YYYYMM' a 'YYYYMM'"""
+    try:
+        return datetime.strptime(str(valor).replace('-', ''), '%Y%m').strftime('%Y%m')
+    except ValueError:
+        raise CierreError("Formato de periodo inválido. Use YYYY-MM.")
+
+
+def rango_periodo(periodo):
+    """(inicio, fin) del periodo; fin es el primer instante del mes siguiente"""
+    inicio = datetime.strptime(periodo, '%Y%m')
+    fin = (inicio + timedelta(days=32)).replace(day=1)
+    return inicio, fin
+
+
+def periodo_anterior(fecha):
+    """Periodo del mes anterior al de `fecha`"""
+    return (fecha.replace(day=1) - timedelta(days=1)).strftime('%Y%m')
+
+
+def ultimo_cierre(antes_de=None):
+    """Último periodo cerrado (opcionalmente anterior al periodo `antes_de`)"""
+    query = select(func.max(StockCierre.periodo))
+    if antes_de:
+        query = query.where(StockCierre.periodo < antes_de)
+    return db.session.execute(query).scalar()
+
+
+def periodo_cerrado(fecha):
+    """Último periodo cerrado si `fecha` cae en él o antes; None si su periodo sigue abierto"""
+    cerrado = ultimo_cierre()
+    if cerrado and fecha is not None and fecha < rango_periodo(cerrado)[1]:
+        return cerrado
+    return None
+
+
+def saldos_a_fecha(hasta, id_almacen=None, id_articulo=None):
+    """Saldo por (almacén, artículo) justo antes de `hasta`.
+
+    Parte del último cierre que termina en o antes de `hasta` y recorre solo
+    los movimientos de kardex posteriores, de modo que el costo de la consulta
+    depende de los movimientos desde ese cierre y no de toda la historia. Los
+    saldos acumulados del kardex siguen el orden de registro, así que no se
+    usan: los movimientos se reaplican en orden de fecha (id_kardex desempata)
+    y el precio promedio se recalcula con cada ingreso; las salidas no lo cambian.
+    Devuelve (periodo_base, {(id_almacen, id_articulo): (cantidad, precio_promedio)}).
+    """
+    periodo_base = ultimo_cierre(antes_de=hasta.strftime('%Y%m'))
+
+    saldos = {}
+    if periodo_base:
+        base = select(StockCierre.id_almacen, StockCierre.id_articulo,
+                      StockCierre.cantidad, StockCierre.precio_promedio).where(StockCierre.periodo == periodo_base)
+        if id_almacen:
+            base = base.where(StockCierre.id_almacen == id_almacen)
+        if id_articulo:
+            base = base.where(StockCierre.id_articulo == id_articulo)
+        for fila in db.session.execute(base):
+            saldos[(fila.id_almacen, fila.id_articulo)] = (Decimal(str(fila.cantidad)), Decimal(str(fila.precio_promedio)))
+
+    tramo = select(
+        Kardex.id_almacen, Kardex.id_articulo, Kardex.cantidad, Kardex.precio_soles
+    ).where(Kardex.fecha < hasta)
+    if periodo_base:
+        tramo = tramo.where(Kardex.fecha >= rango_periodo(periodo_base)[1])
+    if id_almacen:
+        tramo = tramo.where(Kardex.id_almacen == id_almacen)
+    if id_articulo:
+        tramo = tramo.where(Kardex.id_articulo == id_articulo)
+    tramo = tramo.order_by(Kardex.fecha, Kardex.id_kardex).execution_options(yield_per=1000)
+
+    for fila in db.session.execute(tramo):
+        llave = (fila.id_almacen, fila.id_articulo)
+        cantidad, precio = saldos.get(llave, (Decimal(0), Decimal(0)))
+        movimiento = Decimal(str(fila.cantidad))
+        if movimiento > 0:
+            # En orden de fecha el saldo previo puede quedar negativo; solo pondera el positivo
+            previo = max(cantidad, Decimal(0))
+            precio = (previo * precio + movimiento * Decimal(str(fila.precio_soles))) / (previo + movimiento)
+        saldos[llave] = (cantidad + movimiento, precio)
+
+    return periodo_base, saldos
+
+
+def cerrar_periodo(periodo):
+    """Guardar el saldo de cada (almacén, artículo) al fin del periodo.
+
+    Se puede volver a cerrar el último periodo cerrado (se reemplaza), pero no
+    uno anterior: los cierres siguientes quedarían desactualizados. No hace
+    commit; devuelve la cantidad de filas guardadas.
+    """
+    periodo = parse_periodo(periodo)
+    _, fin = rango_periodo(periodo)
+    if fin > datetime.utcnow():
+        raise CierreError("El periodo aún no termina")
+    ultimo = ultimo_cierre()
+    if ultimo and periodo < ultimo:
+        raise CierreError(f"Ya existe un cierre posterior ({ultimo})")
+
+    db.session.execute(delete(StockCierre).where(StockCierre.periodo == periodo))
+    _, saldos = saldos_a_fecha(fin)
+    filas = [
+        {
+            'periodo': periodo,
+            'id_almacen': id_almacen,
+            'id_articulo': id_articulo,
+            'cantidad': cantidad,
+            'precio_promedio': Decimal(precio).quantize(Decimal('0.0001')),
+            'fecha_registro': datetime.utcnow()
+        }
+        for (id_almacen, id_articulo), (cantidad, precio) in sorted(saldos.items())
+    ]
+    if filas:
+        db.session.execute(insert(StockCierre), filas)
+    return len(filas)
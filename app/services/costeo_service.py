@@ -0,0 +1,262 @@
+# app/services/costeo_service.py
+import heapq
+import itertools
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import bindparam, delete, event, insert, select, update
+from sqlalchemy.orm import Session
+from app.extensions import capas_cache, db
+from app.models.capa_costo import CapaCosto
+from app.utils.sql import chunked
+
+PROMEDIO = 'PROM'
+FIFO = 'FIFO'
+FEFO = 'FEFO'
+METODOS_COSTEO = (PROMEDIO, FIFO, FEFO)
+METODOS_CAPAS = (FIFO, FEFO)
+
+# Capa creada para el stock que existía antes de llevar capas; se consume primero
+FECHA_APERTURA = datetime(1900, 1, 1)
+# Clave de session.info con las capas a publicar en la caché cuando confirme la transacción
+CAPAS_PENDIENTES = 'capas_pendientes'
+
+
+class CapasInsuficientes(ValueError):
+    """Una salida supera la cantidad de las capas abiertas"""
+
+
+class Capa:
+    """Lote ingresado con saldo; `cantidad_guardada` es el saldo en la base (None si es nueva)"""
+
+    __slots__ = ('id_capa_costo', 'id_vale_almacen_det', 'fecha_ingreso', 'fecha_vencimiento',
+                 'cantidad', 'costo_unitario', 'cantidad_guardada')
+
+    def __init__(self, cantidad, costo_unitario, id_vale_almacen_det=None, fecha_ingreso=None,
+                 fecha_vencimiento=None, id_capa_costo=None):
+        self.id_capa_costo = id_capa_costo
+        self.id_vale_almacen_det = id_vale_almacen_det
+        self.fecha_ingreso = fecha_ingreso or FECHA_APERTURA
+        self.fecha_vencimiento = fecha_vencimiento
+        self.cantidad = cantidad
+        self.costo_unitario = costo_unitario
+        self.cantidad_guardada = cantidad if id_capa_costo is not None else None
+
+    def orden_fefo(self):
+        # La capa de apertura primero; luego por vencimiento (sin vencimiento al final) e ingreso
+        if self.id_vale_almacen_det is None:
+            return (date.min, self.fecha_ingreso)
+        return (self.fecha_vencimiento or date.max, self.fecha_ingreso)
+
+
+class CapasCosto:
+    """Capas abiertas de un (almacén, artículo) en orden de consumo.
+
+    FIFO las guarda en una deque y FEFO en un heap por vencimiento, así una
+    salida recorre solo las capas que consume. Mantiene la cantidad y el
+    valorizado totales y anota las capas tocadas para guardar solo esas.
+    """
+
+    def __init__(self, metodo):
+        self.metodo = metodo
+        self._capas = deque() if metodo == FIFO else []
+        self._secuencia = itertools.count()
+        self.cantidad = Decimal(0)
+        self.valorizado = Decimal(0)
+        self._tocadas = []
+        self._eliminadas = []
+
+    def __len__(self):
+        return len(self._capas)
+
+    @property
+    def precio_promedio(self):
+        return self.valorizado / self.cantidad if self.cantidad > 0 else Decimal(0)
+
+    def _primera(self):
+        return self._capas[0] if self.metodo == FIFO else self._capas[0][-1]
+
+    def _quitar_primera(self):
+        if self.metodo == FIFO:
+            self._capas.popleft()
+        else:
+            heapq.heappop(self._capas)
+
+    def agregar(self, capa, al_inicio=False):
+        if self.metodo == FIFO:
+            if al_inicio:
+                self._capas.appendleft(capa)
+            else:
+                self._capas.append(capa)
+        else:
+            heapq.heappush(self._capas, (*capa.orden_fefo(), next(self._secuencia), capa))
+        self.cantidad += capa.cantidad
+        self.valorizado += capa.cantidad * capa.costo_unitario
+        if capa.id_capa_costo is None:
+            self._tocadas.append(capa)
+        return capa
+
+    def ingresar(self, cantidad, costo_unitario, id_vale_almacen_det=None, fecha_ingreso=None, fecha_vencimiento=None):
+        return self.agregar(Capa(cantidad, costo_unitario, id_vale_almacen_det, fecha_ingreso, fecha_vencimiento))
+
+    def consumir(self, cantidad):
+        """Descontar `cantidad` de las primeras capas y devolver su costo total"""
+        costo = Decimal(0)
+        pendiente = cantidad
+        while pendiente > 0:
+            if not self._capas:
+                raise CapasInsuficientes("Las capas de costo no cubren la salida")
+            capa = self._primera()
+            tomado = min(pendiente, capa.cantidad)
+            capa.cantidad -= tomado
+            costo += tomado * capa.costo_unitario
+            pendiente -= tomado
+            if capa.cantidad == 0:
+                self._quitar_primera()
+                if capa.id_capa_costo is not None:
+                    self._eliminadas.append(capa.id_capa_costo)
+            elif capa.id_capa_costo is not None:
+                self._tocadas.append(capa)
+        self.cantidad -= cantidad
+        self.valorizado -= costo
+        return costo
+
+    def abiertas(self):
+        """Capas con saldo en orden de consumo"""
+        if self.metodo == FIFO:
+            return list(self._capas)
+        return [entrada[-1] for entrada in sorted(self._capas)]
+
+    def cambios(self):
+        """(nuevas, modificadas, ids eliminados) desde la última vez que se guardaron"""
+        nuevas, modificadas, vistas = [], [], set()
+        for capa in self._tocadas:
+            if id(capa) in vistas or capa.cantidad == 0:
+                continue
+            vistas.add(id(capa))
+            if capa.id_capa_costo is None:
+                nuevas.append(capa)
+            elif capa.cantidad != capa.cantidad_guardada:
+                modificadas.append(capa)
+        return nuevas, modificadas, list(self._eliminadas)
+
+    def marcar_guardadas(self):
+        for capa in self._tocadas:
+            capa.cantidad_guardada = capa.cantidad
+        self._tocadas = []
+        self._eliminadas = []
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar_tras_commit(session):
+    for clave, entrada in session.info.pop(CAPAS_PENDIENTES, {}).items():
+        capas_cache.set(clave, entrada)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_tras_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(CAPAS_PENDIENTES, None)
+
+
+def cargar_capas(id_almacen, metodo, saldos, versiones):
+    """Capas abiertas de los artículos de `saldos` ({id_articulo: [cantidad, precio]}).
+
+    Se toman de la caché (o de lo registrado antes en la misma transacción)
+    cuando la versión de la fila de stock no cambió; las demás se leen con
+    una sola consulta, en el mismo orden en que la deque FIFO las recibió:
+    la capa de apertura primero y luego por orden de registro
+    (id_capa_costo), no por fecha_ingreso. Si el stock supera a las capas
+    (stock anterior a llevar capas), la diferencia se abre como capa al
+    precio promedio. Devuelve {id_articulo: CapasCosto}.
+    """
+    pendientes = db.session.info.get(CAPAS_PENDIENTES, {})
+    resultado = {}
+    faltantes = []
+    for id_articulo in saldos:
+        clave = (id_almacen, id_articulo)
+        entrada = pendientes.get(clave) or capas_cache.pop(clave)
+        if entrada and entrada[0] == versiones.get(id_articulo) and entrada[1].metodo == metodo:
+            resultado[id_articulo] = entrada[1]
+        else:
+            faltantes.append(id_articulo)
+            resultado[id_articulo] = CapasCosto(metodo)
+
+    if faltantes:
+        consulta = (
+            select(CapaCosto)
+            .where(CapaCosto.id_almacen == id_almacen, CapaCosto.id_articulo.in_(faltantes))
+            .order_by(CapaCosto.id_articulo, CapaCosto.id_vale_almacen_det.isnot(None), CapaCosto.id_capa_costo)
+        )
+        for fila in db.session.scalars(consulta):
+            resultado[fila.id_articulo].agregar(Capa(
+                fila.cantidad, fila.costo_unitario, fila.id_vale_almacen_det, fila.fecha_ingreso,
+                fila.fecha_vencimiento, id_capa_costo=fila.id_capa_costo
+            ))
+        for id_articulo in faltantes:
+            capas = resultado[id_articulo]
+            cantidad, precio = saldos[id_articulo]
+            if cantidad > capas.cantidad:
+                capas.agregar(Capa(cantidad - capas.cantidad, precio), al_inicio=True)
+    return resultado
+
+
+def _fila_capa(id_almacen, id_articulo, capa):
+    return {
+        'id_almacen': id_almacen,
+        'id_articulo': id_articulo,
+        'id_vale_almacen_det': capa.id_vale_almacen_det,
+        'fecha_ingreso': capa.fecha_ingreso,
+        'fecha_vencimiento': capa.fecha_vencimiento,
+        'cantidad': capa.cantidad,
+        'costo_unitario': capa.costo_unitario
+    }
+
+
+def guardar_capas(id_almacen, capas_por_articulo, versiones):
+    """Escribir solo las capas tocadas: inserta las nuevas, actualiza saldos y borra las agotadas.
+
+    `versiones` es la versión de stock de cada artículo tras el movimiento;
+    con ella las capas quedan pendientes de publicarse en la caché al
+    confirmar la transacción.
+    """
+    nuevas, modificadas, eliminadas = [], [], []
+    for id_articulo, capas in sorted(capas_por_articulo.items()):
+        n, m, e = capas.cambios()
+        nuevas.extend((id_articulo, capa) for capa in n)
+        modificadas.extend(m)
+        eliminadas.extend(e)
+
+    tabla = CapaCosto.__table__
+    for lote in chunked(eliminadas):
+        db.session.execute(delete(tabla).where(tabla.c.id_capa_costo.in_(lote)))
+    if modificadas:
+        db.session.execute(
+            update(tabla).where(tabla.c.id_capa_costo == bindparam('b_id_capa_costo'))
+            .values(cantidad=bindparam('b_cantidad'))
+            .execution_options(synchronize_session=False),
+            [{'b_id_capa_costo': capa.id_capa_costo, 'b_cantidad': capa.cantidad} for capa in modificadas]
+        )
+    if nuevas:
+        ids = db.session.execute(
+            insert(tabla).returning(tabla.c.id_capa_costo, sort_by_parameter_order=True),
+            [_fila_capa(id_almacen, id_articulo, capa) for id_articulo, capa in nuevas]
+        ).scalars().all()
+        for (_, capa), id_capa_costo in zip(nuevas, ids):
+            capa.id_capa_costo = id_capa_costo
+
+    pendientes = db.session.info.setdefault(CAPAS_PENDIENTES, {})
+    for id_articulo, capas in capas_por_articulo.items():
+        capas.marcar_guardadas()
+        pendientes[(id_almacen, id_articulo)] = (versiones[id_articulo], capas)
+
+
+def reemplazar_capas(id_almacen, id_articulo, capas):
+    """Reemplazar todas las capas de un (almacén, artículo) por las abiertas de `capas` (tras un recálculo)"""
+    tabla = CapaCosto.__table__
+    db.session.execute(delete(tabla).where(tabla.c.id_almacen == id_almacen, tabla.c.id_articulo == id_articulo))
+    filas = [_fila_capa(id_almacen, id_articulo, capa) for capa in capas.abiertas()]
+    if filas:
+        db.session.execute(insert(tabla), filas)
+    db.session.info.get(CAPAS_PENDIENTES, {}).pop((id_almacen, id_articulo), None)
+    capas_cache.invalidate((id_almacen, id_articulo))
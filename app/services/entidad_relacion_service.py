@@ -0,0 +1,110 @@
+# app/services/entidad_relacion_service.py
+from sqlalchemy import insert, select, tuple_
+from app.extensions import db
+from app.models.entidad_relacion import EntidadRelacion
+from app.models.tipo_doc_ident import TipoDocIdent
+from app.utils.sql import chunked
+
+# Entidades aceptadas por petición en el alta por lotes
+MAX_ENTIDADES_POR_LOTE = 50000
+
+_LONGITUDES = {'nombre_entidad': 120, 'nro_doc_ident': 20, 'direccion': 120, 'telefono': 30}
+_FLAGS = {'flag_proveedor': '0', 'flag_cliente': '0', 'flag_estado': '1'}
+
+
+class EntidadRelacionError(ValueError):
+    """El lote de entidades no puede procesarse"""
+
+
+def _validar_entidad(entidad, tipos_doc):
+    """Normalizar una entidad del lote; devuelve (valores, None) o (None, mensaje)"""
+    if not isinstance(entidad, dict):
+        return None, "Formato de entidad inválido"
+    if not all(entidad.get(campo) for campo in ('nombre_entidad', 'id_tipo_doc_ident', 'nro_doc_ident')):
+        return None, "Faltan campos obligatorios"
+    valores = {
+        'nombre_entidad': str(entidad['nombre_entidad']).strip(),
+        'nro_doc_ident': str(entidad['nro_doc_ident']).strip(),
+        'direccion': str(entidad.get('direccion') or ''),
+        'telefono': str(entidad.get('telefono') or ''),
+    }
+    for campo, longitud in _LONGITUDES.items():
+        if len(valores[campo]) > longitud:
+            return None, f"{campo} supera {longitud} caracteres"
+    for campo, defecto in _FLAGS.items():
+        valores[campo] = str(entidad.get(campo, defecto))
+        if valores[campo] not in ('0', '1'):
+            return None, f"{campo} debe ser '0' o '1'"
+    try:
+        valores['id_tipo_doc_ident'] = int(entidad['id_tipo_doc_ident'])
+    except (TypeError, ValueError):
+        return None, "id_tipo_doc_ident no numérico"
+    if valores['id_tipo_doc_ident'] not in tipos_doc:
+        return None, "El tipo de documento de identidad no existe"
+    return valores, None
+
+
+def crear_entidades(entidades):
+    """Registrar un lote de entidades (clientes/proveedores) con resultado por fila.
+
+    Los duplicados dentro del lote se detectan con conjuntos en memoria (por
+    nombre y por documento); los ya registrados, con consultas IN por bloques
+    sobre los índices de nombre y documento. Las válidas se insertan con
+    INSERT ... RETURNING por bloques; las demás se informan sin detener el
+    lote. No hace commit; devuelve una lista con el resultado de cada fila en
+    el orden recibido.
+    """
+    if not isinstance(entidades, list) or not entidades:
+        raise EntidadRelacionError("Se requiere una lista de entidades")
+    if len(entidades) > MAX_ENTIDADES_POR_LOTE:
+        raise EntidadRelacionError(f"El lote supera el máximo de {MAX_ENTIDADES_POR_LOTE} entidades")
+
+    tipos_doc = set(db.session.scalars(select(TipoDocIdent.id_tipo_doc_ident)))
+    resultados = [None] * len(entidades)
+    validas = []
+    nombres, documentos = set(), set()
+    for indice, entidad in enumerate(entidades):
+        valores, mensaje = _validar_entidad(entidad, tipos_doc)
+        if not mensaje:
+            documento = (valores['nro_doc_ident'], valores['id_tipo_doc_ident'])
+            if valores['nombre_entidad'] in nombres:
+                mensaje = "Nombre de entidad repetido en el lote"
+            elif documento in documentos:
+                mensaje = "Documento de identidad repetido en el lote"
+            else:
+                nombres.add(valores['nombre_entidad'])
+                documentos.add(documento)
+                validas.append((indice, valores))
+        if mensaje:
+            resultados[indice] = {"indice": indice, "estado": "error", "message": mensaje}
+
+    nombres_existentes, documentos_existentes = set(), set()
+    for bloque in chunked(list(nombres)):
+        nombres_existentes.update(db.session.scalars(
+            select(EntidadRelacion.nombre_entidad).where(EntidadRelacion.nombre_entidad.in_(bloque))
+        ))
+    columnas_doc = tuple_(EntidadRelacion.nro_doc_ident, EntidadRelacion.id_tipo_doc_ident)
+    for bloque in chunked(list(documentos)):
+        documentos_existentes.update(tuple(fila) for fila in db.session.execute(
+            select(EntidadRelacion.nro_doc_ident, EntidadRelacion.id_tipo_doc_ident).where(columnas_doc.in_(bloque))
+        ))
+
+    nuevas = []
+    for indice, valores in validas:
+        if valores['nombre_entidad'] in nombres_existentes:
+            resultados[indice] = {"indice": indice, "estado": "error", "message": "El nombre de la entidad ya existe"}
+        elif (valores['nro_doc_ident'], valores['id_tipo_doc_ident']) in documentos_existentes:
+            resultados[indice] = {"indice": indice, "estado": "error",
+                                  "message": "Ya existe una entidad con este documento de identidad"}
+        else:
+            nuevas.append((indice, valores))
+
+    tabla = EntidadRelacion.__table__
+    for bloque in chunked(nuevas):
+        ids = db.session.execute(
+            insert(tabla).returning(tabla.c.id_entidad, sort_by_parameter_order=True),
+            [valores for _, valores in bloque]
+        ).scalars().all()
+        for (indice, _), id_entidad in zip(bloque, ids):
+            resultados[indice] = {"indice": indice, "estado": "creada", "id_entidad": id_entidad}
+    return resultados
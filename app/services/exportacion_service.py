@@ -0,0 +1,67 @@
+# app/services/exportacion_service.py
+from sqlalchemy import select
+from app.models.almacen import Almacen
+from app.models.articulo import Articulo
+from app.models.kardex import Kardex
+from app.models.tipo_mov_almacen import TipoMovAlmacen
+from app.models.vale_almacen import ValeAlmacen
+from app.models.vale_almacen_det import ValeAlmacenDet
+
+COLUMNAS_DETALLES = [
+    'fecha_vale', 'cod_vale_almacen', 'cod_tipo_mov_alm', 'cod_almacen', 'nombre_almacen', 'item',
+    'cod_articulo', 'nombre_articulo', 'cantidad', 'precio_soles', 'importe', 'fecha_vencimiento'
+]
+COLUMNAS_KARDEX = [
+    'fecha', 'cod_almacen', 'cod_articulo', 'nombre_articulo', 'cod_vale_almacen', 'cod_tipo_mov_alm',
+    'cantidad', 'precio_soles', 'saldo_cantidad', 'saldo_valorizado'
+]
+
+
+def consulta_detalles(desde, hasta, id_almacen=None):
+    """Líneas activas de los vales activos con fecha en [desde, hasta), con vale, almacén y artículo.
+
+    Sigue el índice (fecha_vale, id_vale_almacen) de vale_almacen.
+    """
+    consulta = (
+        select(
+            ValeAlmacen.fecha_vale, ValeAlmacen.cod_vale_almacen, TipoMovAlmacen.cod_tipo_mov_alm,
+            Almacen.cod_almacen, Almacen.nombre_almacen, ValeAlmacenDet.item,
+            Articulo.cod_articulo, Articulo.nombre_articulo, ValeAlmacenDet.cantidad, ValeAlmacenDet.precio_soles,
+            (ValeAlmacenDet.cantidad * ValeAlmacenDet.precio_soles).label('importe'),
+            ValeAlmacenDet.fecha_vencimiento
+        )
+        .join(ValeAlmacenDet, ValeAlmacenDet.id_vale_almacen == ValeAlmacen.id_vale_almacen)
+        .join(TipoMovAlmacen, TipoMovAlmacen.id_tipo_mov_almacen == ValeAlmacen.id_tipo_mov_almacen)
+        .join(Almacen, Almacen.id_almacen == ValeAlmacen.id_almacen)
+        .join(Articulo, Articulo.id_articulo == ValeAlmacenDet.id_articulo)
+        .where(ValeAlmacen.fecha_vale >= desde, ValeAlmacen.fecha_vale < hasta,
+               ValeAlmacen.flag_estado == '1', ValeAlmacenDet.flag_estado == '1')
+        .order_by(ValeAlmacen.fecha_vale, ValeAlmacen.id_vale_almacen, ValeAlmacenDet.id_vale_almacen_det)
+    )
+    if id_almacen:
+        consulta = consulta.where(ValeAlmacen.id_almacen == id_almacen)
+    return consulta
+
+
+def consulta_kardex(desde, hasta, id_almacen=None):
+    """Movimientos de kardex con fecha en [desde, hasta), por almacén y en orden de registro.
+
+    Sigue el índice (id_almacen, fecha) de kardex.
+    """
+    consulta = (
+        select(
+            Kardex.fecha, Almacen.cod_almacen, Articulo.cod_articulo, Articulo.nombre_articulo,
+            ValeAlmacen.cod_vale_almacen, TipoMovAlmacen.cod_tipo_mov_alm,
+            Kardex.cantidad, Kardex.precio_soles, Kardex.saldo_cantidad, Kardex.saldo_valorizado
+        )
+        .join(Almacen, Almacen.id_almacen == Kardex.id_almacen)
+        .join(Articulo, Articulo.id_articulo == Kardex.id_articulo)
+        .join(ValeAlmacenDet, ValeAlmacenDet.id_vale_almacen_det == Kardex.id_vale_almacen_det)
+        .join(ValeAlmacen, ValeAlmacen.id_vale_almacen == ValeAlmacenDet.id_vale_almacen)
+        .join(TipoMovAlmacen, TipoMovAlmacen.id_tipo_mov_almacen == ValeAlmacen.id_tipo_mov_almacen)
+        .where(Kardex.fecha >= desde, Kardex.fecha < hasta)
+        .order_by(Kardex.id_almacen, Kardex.fecha, Kardex.id_kardex)
+    )
+    if id_almacen:
+        consulta = consulta.where(Kardex.id_almacen == id_almacen)
+    return consulta
@@ -0,0 +1,932 @@
+# app/services/stock_service.py
+import threading
+from collections import Counter
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import and_, bindparam, case, create_engine, delete, func, insert, literal, not_, or_, select, update
+from app.extensions import db
+from app.models.alerta_stock import AlertaStock
+from app.models.almacen import Almacen
+from app.models.articulo import Articulo
+from app.models.capa_costo import CapaCosto
+from app.models.kardex import Kardex
+from app.models.stock import Stock
+from app.models.stock_articulo_delta import StockArticuloDelta
+from app.models.tipo_mov_almacen import TipoMovAlmacen
+from app.models.vale_almacen import ValeAlmacen
+from app.models.vale_almacen_det import ValeAlmacenDet
+from app.services.cierre_service import periodo_cerrado
+from app.services.costeo_service import (
+    METODOS_CAPAS, PROMEDIO, CapasCosto, CapasInsuficientes, cargar_capas, guardar_capas, reemplazar_capas
+)
+from app.services.valorizacion_service import marcar_almacen_modificado
+from app.utils.sql import advisory_lock, chunked, id_transaccion, insert_ignore, upsert
+
+# Fuerza división decimal en SQLite, donde NUMERIC entero / entero trunca
+_UNO = literal(Decimal(1), db.Numeric(16, 4))
+_CUATRO_DECIMALES = Decimal('0.0001')
+# Filas leídas (yield_per) y escritas por lote al recalcular un almacén
+LOTE_RECALCULO = 10000
+# Clase del candado por almacén: compartido al registrar o revertir vales, exclusivo al recalcular
+CANDADO_ALMACEN = 1501
+# Candado de consolidar_stock_articulo y corregir_stock_articulo (no deben cruzarse)
+CANDADO_STOCK_ARTICULO = 1502
+
+
+class StockError(ValueError):
+    """El movimiento no pudo aplicarse al stock"""
+
+    def __init__(self, message, errores=None):
+        super().__init__(message)
+        self.message = message
+        self.errores = errores or []
+
+    def to_dict(self):
+        respuesta = {"message": self.message}
+        if self.errores:
+            respuesta["errores"] = self.errores
+        return respuesta
+
+
+class StockInsuficiente(StockError):
+    """Una salida dejaría el stock de uno o más artículos en negativo"""
+
+
+class StockOcupado(StockError):
+    """Se agotaron los reintentos por escrituras concurrentes sobre las mismas filas"""
+
+
+class _Conflicto(Exception):
+    """Otra transacción modificó la fila de stock entre la lectura y la escritura"""
+
+
+class _Contadores:
+    """Contadores del registro de movimientos (intentos, conflictos, rechazos)"""
+
+    def __init__(self):
+        self._valores = Counter()
+        self._lock = threading.Lock()
+
+    def sumar(self, clave, cantidad=1):
+        with self._lock:
+            self._valores[clave] += cantidad
+
+    def stats(self):
+        with self._lock:
+            valores = dict(self._valores)
+        vales = valores.get('vales', 0)
+        valores['conflictos_por_vale'] = round(valores.get('conflictos', 0) / vales, 4) if vales else 0.0
+        return valores
+
+    def clear(self):
+        with self._lock:
+            self._valores.clear()
+
+
+contadores = _Contadores()
+
+
+def _decimal(valor):
+    return valor if isinstance(valor, Decimal) else Decimal(str(valor))
+
+
+def agrupar_lineas(id_almacen, factor_mov, lineas):
+    """Consolidar las líneas de un vale en un movimiento por (almacén, artículo).
+
+    La cantidad lleva el signo de factor_mov y el precio es el promedio
+    ponderado de las líneas del mismo artículo.
+    """
+    grupos = {}
+    for linea in lineas:
+        cantidad = _decimal(linea.cantidad)
+        acumulado = grupos.setdefault(linea.id_articulo, [Decimal(0), Decimal(0)])
+        acumulado[0] += cantidad
+        acumulado[1] += cantidad * _decimal(linea.precio_soles)
+
+    return [
+        {
+            'id_almacen': id_almacen,
+            'id_articulo': id_articulo,
+            'cantidad': cantidad * factor_mov,
+            'precio_promedio': (valor / cantidad).quantize(_CUATRO_DECIMALES) if cantidad else Decimal(0)
+        }
+        # Orden fijo de llaves: transacciones concurrentes bloquean filas en el mismo orden
+        for id_articulo, (cantidad, valor) in sorted(grupos.items())
+    ]
+
+
+def _saldos_actuales(id_almacen, ids_articulo, bloquear=True):
+    """Saldo [cantidad, precio promedio] y versión previos de cada artículo.
+
+    Con `bloquear` las filas se toman con FOR UPDATE en orden de id_articulo:
+    dos vales con los mismos artículos siempre bloquean en el mismo orden, así
+    que esperan uno al otro en lugar de caer en un deadlock.
+    """
+    consulta = (
+        select(Stock.id_articulo, Stock.cantidad, Stock.precio_promedio, Stock.version)
+        .where(Stock.id_almacen == id_almacen, Stock.id_articulo.in_(ids_articulo))
+        .order_by(Stock.id_articulo)
+    )
+    if bloquear:
+        consulta = consulta.with_for_update()
+    saldos, versiones = {}, {}
+    for fila in db.session.execute(consulta):
+        saldos[fila.id_articulo] = [fila.cantidad, fila.precio_promedio]
+        versiones[fila.id_articulo] = fila.version
+    return saldos, versiones
+
+
+def _crear_saldos_faltantes(id_almacen, ids_articulo):
+    """Crear con saldo cero (versión 0) las filas de stock que aún no existen.
+
+    FOR UPDATE no bloquea filas inexistentes: sin este paso, dos transacciones
+    que registran el primer movimiento de un artículo leerían ambas saldo
+    cero y la segunda pisaría el saldo (y el kardex) de la primera. Con la
+    fila ya creada, la segunda espera en el INSERT hasta el commit de la
+    primera y luego la bloquea con su saldo vigente.
+    """
+    filas = [
+        {'id_almacen': id_almacen, 'id_articulo': id_articulo, 'cantidad': 0, 'precio_promedio': 0, 'version': 0}
+        for id_articulo in sorted(set(ids_articulo))
+    ]
+    engine = db.session.get_bind()
+    for lote in chunked(filas):
+        db.session.execute(insert_ignore(Stock.__table__, engine, lote, ['id_almacen', 'id_articulo']))
+
+
+def bloquear_saldos(id_almacen, ids_articulo):
+    """Bloquear (FOR UPDATE, en orden de artículo) las filas de stock y devolver sus saldos.
+
+    Para operaciones sobre varios almacenes: se llama por almacén en orden de
+    id_almacen antes de registrar, así todas toman los bloqueos en el mismo
+    orden. Las filas que faltan se crean antes en cero para que también
+    queden bloqueadas. Devuelve {id_articulo: [cantidad, precio_promedio]}.
+    """
+    _crear_saldos_faltantes(id_almacen, ids_articulo)
+    saldos, _ = _saldos_actuales(id_almacen, sorted(set(ids_articulo)))
+    return saldos
+
+
+def _validar_disponible(movimientos, saldos):
+    """Rechazar el vale si alguna salida supera el saldo disponible"""
+    faltantes = []
+    for movimiento in movimientos:
+        if movimiento['cantidad'] >= 0:
+            continue
+        disponible = saldos[movimiento['id_articulo']][0] if movimiento['id_articulo'] in saldos else Decimal(0)
+        if disponible + movimiento['cantidad'] < 0:
+            faltantes.append({
+                "id_articulo": movimiento['id_articulo'],
+                "disponible": float(disponible),
+                "solicitado": float(-movimiento['cantidad']),
+                "message": "Stock insuficiente"
+            })
+    if faltantes:
+        contadores.sumar('rechazados')
+        raise StockInsuficiente("Stock insuficiente", faltantes)
+
+
+def _aplicar_linea(saldos, id_articulo, cantidad, precio):
+    """Aplicar una línea (cantidad con signo) al saldo [cantidad, precio_promedio] del artículo.
+
+    Los ingresos recalculan el promedio ponderado; las salidas salen al costo
+    promedio vigente. Devuelve (costo de la línea, saldo actualizado).
+    """
+    saldo = saldos.get(id_articulo)
+    if saldo is None:
+        saldo = saldos[id_articulo] = [Decimal(0), precio]
+
+    if cantidad > 0:
+        if saldo[0] > 0:
+            saldo[1] = (saldo[0] * saldo[1] + cantidad * precio) / (saldo[0] + cantidad)
+        else:
+            saldo[1] = precio
+        costo = precio
+    else:
+        costo = saldo[1]
+    saldo[0] += cantidad
+    return costo, saldo
+
+
+def _fila_kardex(id_almacen, fecha, id_vale_almacen_det, id_articulo, cantidad, costo,
+                 saldo_cantidad, saldo_valorizado):
+    return {
+        'id_almacen': id_almacen,
+        'id_articulo': id_articulo,
+        'id_vale_almacen_det': id_vale_almacen_det,
+        'fecha': fecha,
+        'cantidad': cantidad,
+        'precio_soles': costo.quantize(_CUATRO_DECIMALES),
+        'saldo_cantidad': saldo_cantidad,
+        'saldo_valorizado': saldo_valorizado.quantize(_CUATRO_DECIMALES)
+    }
+
+
+def kardex_lineas(vale, factor_mov, lineas, saldos):
+    """Filas de kardex de las líneas de un vale, con el saldo acumulado tras cada una.
+
+    Parte de `saldos` (el stock previo) y reproduce línea a línea el mismo
+    cálculo de promedio ponderado que aplica el upsert de stock.
+    """
+    filas = []
+    for linea in lineas:
+        cantidad = _decimal(linea.cantidad) * factor_mov
+        costo, saldo = _aplicar_linea(saldos, linea.id_articulo, cantidad, _decimal(linea.precio_soles))
+        filas.append(_fila_kardex(vale.id_almacen, vale.fecha_vale, linea.id_vale_almacen_det,
+                                  linea.id_articulo, cantidad, costo, saldo[0], saldo[0] * saldo[1]))
+    return filas
+
+
+def _nuevo_saldo(stock, entrante):
+    """Saldo tras el movimiento: los ingresos recalculan el promedio ponderado, las salidas no"""
+    cantidad_total = stock.c.cantidad + entrante.cantidad
+    precio_promedio = case(
+        (entrante.cantidad <= 0, stock.c.precio_promedio),
+        (stock.c.cantidad <= 0, entrante.precio_promedio),
+        else_=(stock.c.cantidad * stock.c.precio_promedio + entrante.cantidad * entrante.precio_promedio)
+        * _UNO / cantidad_total
+    )
+    return {'cantidad': cantidad_total, 'precio_promedio': precio_promedio, 'version': stock.c.version + 1}
+
+
+def aplicar_movimientos(movimientos):
+    """Aplicar movimientos consolidados a la tabla stock con INSERT ... ON CONFLICT DO UPDATE"""
+    engine = db.session.get_bind()
+    for lote in chunked(movimientos):
+        db.session.execute(
+            upsert(Stock.__table__, engine, lote, ['id_almacen', 'id_articulo'], _nuevo_saldo)
+        )
+
+
+def _post_pesimista(vale, factor_mov, lineas, movimientos):
+    ids_articulo = [m['id_articulo'] for m in movimientos]
+    _crear_saldos_faltantes(vale.id_almacen, ids_articulo)
+    saldos, _ = _saldos_actuales(vale.id_almacen, ids_articulo)
+    _validar_disponible(movimientos, saldos)
+    db.session.execute(insert(Kardex), kardex_lineas(vale, factor_mov, lineas, saldos))
+    aplicar_movimientos(movimientos)
+
+
+def _escribir_saldos(id_almacen, saldos, versiones):
+    """Escribir los saldos nuevos solo si cada fila sigue en la versión leída"""
+    engine = db.session.get_bind()
+    for id_articulo, (cantidad, precio) in sorted(saldos.items()):
+        valores = {'cantidad': cantidad, 'precio_promedio': precio.quantize(_CUATRO_DECIMALES)}
+        if id_articulo in versiones:
+            resultado = db.session.execute(
+                update(Stock)
+                .where(Stock.id_almacen == id_almacen, Stock.id_articulo == id_articulo,
+                       Stock.version == versiones[id_articulo])
+                .values(version=versiones[id_articulo] + 1, **valores)
+                .execution_options(synchronize_session=False)
+            )
+        else:
+            resultado = db.session.execute(insert_ignore(
+                Stock.__table__, engine,
+                [dict(id_almacen=id_almacen, id_articulo=id_articulo, version=0, **valores)],
+                ['id_almacen', 'id_articulo']
+            ))
+        if resultado.rowcount != 1:
+            raise _Conflicto()
+
+
+def _post_optimista(vale, factor_mov, lineas, movimientos):
+    ids_articulo = [m['id_articulo'] for m in movimientos]
+    reintentos = current_app.config.get('STOCK_REINTENTOS', 5)
+    for intento in range(reintentos + 1):
+        # Lectura sin bloqueo; los bloqueos de fila solo se toman al escribir
+        saldos, versiones = _saldos_actuales(vale.id_almacen, ids_articulo, bloquear=False)
+        _validar_disponible(movimientos, saldos)
+        filas_kardex = kardex_lineas(vale, factor_mov, lineas, saldos)
+        try:
+            with db.session.begin_nested():
+                _escribir_saldos(vale.id_almacen, {i: saldos[i] for i in ids_articulo}, versiones)
+                db.session.execute(insert(Kardex), filas_kardex)
+            return
+        except _Conflicto:
+            contadores.sumar('conflictos')
+    contadores.sumar('agotados')
+    raise StockOcupado("El stock está siendo modificado por otro movimiento, reintente")
+
+
+def _aplicar_capa(capas, linea, cantidad, fecha, fecha_vencimiento=None):
+    """Agregar (ingreso) o consumir (salida) capas por una línea; devuelve su costo unitario"""
+    if cantidad > 0:
+        costo = _decimal(linea.precio_soles)
+        capas.ingresar(cantidad, costo, linea.id_vale_almacen_det, fecha, fecha_vencimiento)
+        return costo
+    return capas.consumir(-cantidad) / -cantidad
+
+
+def _post_capas(vale, factor_mov, lineas, movimientos, metodo):
+    """Registrar las líneas de un almacén FIFO/FEFO consumiendo o agregando capas de costo.
+
+    Siempre con bloqueo de filas: las capas en memoria se validan con la
+    versión de la fila de stock, que así no cambia hasta el commit. Cada
+    salida sale al costo de las capas que consume y el precio del stock queda
+    como el valorizado de las capas abiertas entre su cantidad.
+    """
+    ids_articulo = [m['id_articulo'] for m in movimientos]
+    # El upsert de abajo escribe saldos absolutos: sin fila bloqueada perdería movimientos concurrentes
+    _crear_saldos_faltantes(vale.id_almacen, ids_articulo)
+    saldos, versiones = _saldos_actuales(vale.id_almacen, ids_articulo)
+    _validar_disponible(movimientos, saldos)
+    capas = cargar_capas(
+        vale.id_almacen, metodo, {i: saldos.get(i, [Decimal(0), Decimal(0)]) for i in ids_articulo}, versiones
+    )
+
+    filas = []
+    try:
+        for linea in lineas:
+            cantidad = _decimal(linea.cantidad) * factor_mov
+            capas_articulo = capas[linea.id_articulo]
+            costo = _aplicar_capa(capas_articulo, linea, cantidad, vale.fecha_vale, linea.fecha_vencimiento)
+            filas.append(_fila_kardex(vale.id_almacen, vale.fecha_vale, linea.id_vale_almacen_det, linea.id_articulo,
+                                      cantidad, costo, capas_articulo.cantidad, capas_articulo.valorizado))
+    except CapasInsuficientes:
+        contadores.sumar('rechazados')
+        raise StockInsuficiente("Stock insuficiente: una salida del vale precede al ingreso que la cubre")
+    db.session.execute(insert(Kardex), filas)
+
+    engine = db.session.get_bind()
+    db.session.execute(upsert(
+        Stock.__table__, engine,
+        [
+            {'id_almacen': vale.id_almacen, 'id_articulo': id_articulo, 'cantidad': capas[id_articulo].cantidad,
+             'precio_promedio': capas[id_articulo].precio_promedio.quantize(_CUATRO_DECIMALES), 'version': 0}
+            for id_articulo in ids_articulo
+        ],
+        ['id_almacen', 'id_articulo'],
+        lambda stock, excluded: {'cantidad': excluded.cantidad, 'precio_promedio': excluded.precio_promedio,
+                                 'version': stock.c.version + 1}
+    ))
+    guardar_capas(vale.id_almacen, capas, {i: versiones[i] + 1 if i in versiones else 0 for i in ids_articulo})
+
+
+def sumar_stock_articulo(movimientos):
+    """Anotar en stock_articulo_delta el mismo delta aplicado al stock del almacén.
+
+    Solo inserta: la fila de un artículo muy movido no queda bloqueada por
+    cada vale. Articulo.stock_articulo se pone al día con
+    consolidar_stock_articulo().
+    """
+    filas = [{'id_articulo': m['id_articulo'], 'cantidad': m['cantidad']} for m in movimientos if m['cantidad']]
+    if filas:
+        db.session.execute(insert(StockArticuloDelta), filas)
+
+
+def consolidar_stock_articulo():
+    """Sumar a Articulo.stock_articulo los deltas pendientes y eliminarlos.
+
+    El DELETE ... RETURNING toma solo los deltas ya confirmados; los de vales
+    en curso quedan para la próxima vez. No hace commit; devuelve la
+    cantidad de artículos actualizados.
+    """
+    advisory_lock(db.session, CANDADO_STOCK_ARTICULO, 0)
+    tabla = StockArticuloDelta.__table__
+    totales = Counter()
+    for fila in db.session.execute(delete(tabla).returning(tabla.c.id_articulo, tabla.c.cantidad)):
+        totales[fila.id_articulo] += _decimal(fila.cantidad)
+    articulo = Articulo.__table__
+    for lote in chunked(sorted(totales.items())):
+        db.session.execute(
+            update(articulo)
+            .where(articulo.c.id_articulo.in_([id_articulo for id_articulo, _ in lote]))
+            .values(stock_articulo=articulo.c.stock_articulo + case(dict(lote), value=articulo.c.id_articulo))
+        )
+    return len(totales)
+
+
+def diferencias_stock_articulo(ids_articulo=None):
+    """Artículos cuyo stock_articulo más sus deltas pendientes no coincide con la suma de su stock por almacén.
+
+    Devuelve [(id_articulo, cod_articulo, stock_articulo, pendiente, suma_stock)].
+    """
+    suma = (
+        select(Stock.id_articulo, func.sum(Stock.cantidad).label('cantidad'))
+        .group_by(Stock.id_articulo)
+        .subquery()
+    )
+    deltas = (
+        select(StockArticuloDelta.id_articulo, func.sum(StockArticuloDelta.cantidad).label('cantidad'))
+        .group_by(StockArticuloDelta.id_articulo)
+        .subquery()
+    )
+    total = func.coalesce(suma.c.cantidad, 0)
+    pendiente = func.coalesce(deltas.c.cantidad, 0)
+    consulta = (
+        select(Articulo.id_articulo, Articulo.cod_articulo, Articulo.stock_articulo,
+               pendiente.label('pendiente'), total.label('suma_stock'))
+        .outerjoin(suma, suma.c.id_articulo == Articulo.id_articulo)
+        .outerjoin(deltas, deltas.c.id_articulo == Articulo.id_articulo)
+        .where(Articulo.stock_articulo + pendiente != total)
+        .order_by(Articulo.id_articulo)
+    )
+    if ids_articulo is not None:
+        consulta = consulta.where(Articulo.id_articulo.in_(ids_articulo))
+    return db.session.execute(consulta).all()
+
+
+def corregir_stock_articulo(ids_articulo=None):
+    """Recalcular stock_articulo desde la tabla stock para los artículos con diferencias.
+
+    Deja stock_articulo en la suma del stock menos los deltas pendientes,
+    leídos en la misma consulta, de modo que al consolidarlos el total
+    coincida. No hace commit; devuelve la cantidad de artículos corregidos.
+    """
+    advisory_lock(db.session, CANDADO_STOCK_ARTICULO, 0)
+    diferencias = diferencias_stock_articulo(ids_articulo)
+    articulo = Articulo.__table__
+    for lote in chunked(diferencias):
+        totales = {fila.id_articulo: fila.suma_stock - fila.pendiente for fila in lote}
+        db.session.execute(
+            update(articulo)
+            .where(articulo.c.id_articulo.in_(totales))
+            .values(stock_articulo=case(totales, value=articulo.c.id_articulo))
+        )
+    return len(diferencias)
+
+
+def _bajo_stock(stock):
+    return and_(stock.c.stock_minimo.isnot(None), stock.c.cantidad <= stock.c.stock_minimo)
+
+
+def actualizar_bajo_stock(id_almacen, ids_articulo, id_vale_almacen=None):
+    """Actualizar flag_bajo_stock de los artículos movidos y encolar las alertas nuevas.
+
+    Solo cambian las filas cuyo estado cambió: las que cruzan el mínimo hacia
+    abajo pasan a '1' y generan una fila en alerta_stock, las que se reponen
+    vuelven a '0'. No hace commit; devuelve la cantidad de alertas nuevas.
+    """
+    stock = Stock.__table__
+    filtro = (stock.c.id_almacen == id_almacen, stock.c.id_articulo.in_(ids_articulo))
+    nuevos = db.session.execute(
+        update(stock)
+        .where(*filtro, stock.c.flag_bajo_stock == '0', _bajo_stock(stock))
+        .values(flag_bajo_stock='1')
+        .returning(stock.c.id_articulo, stock.c.cantidad, stock.c.stock_minimo)
+    ).all()
+    db.session.execute(
+        update(stock)
+        .where(*filtro, stock.c.flag_bajo_stock == '1', not_(_bajo_stock(stock)))
+        .values(flag_bajo_stock='0')
+    )
+    if nuevos:
+        transaccion = id_transaccion(db.session)
+        db.session.execute(insert(AlertaStock), [
+            {
+                'id_almacen': id_almacen,
+                'id_articulo': fila.id_articulo,
+                'id_vale_almacen': id_vale_almacen,
+                'cantidad': fila.cantidad,
+                'stock_minimo': fila.stock_minimo,
+                'id_transaccion': transaccion
+            }
+            for fila in sorted(nuevos)
+        ])
+    return len(nuevos)
+
+
+def fijar_stock_minimo(id_almacen, minimos):
+    """Fijar el stock mínimo {id_articulo: minimo o None} de artículos de un almacén.
+
+    Crea con saldo cero las filas de stock que aún no existen. No hace commit;
+    devuelve la cantidad de alertas nuevas.
+    """
+    filas = [
+        {'id_almacen': id_almacen, 'id_articulo': id_articulo, 'cantidad': 0,
+         'precio_promedio': 0, 'version': 0, 'stock_minimo': minimo}
+        for id_articulo, minimo in sorted(minimos.items())
+    ]
+    engine = db.session.get_bind()
+    for lote in chunked(filas):
+        db.session.execute(upsert(
+            Stock.__table__, engine, lote, ['id_almacen', 'id_articulo'],
+            lambda stock, excluded: {'stock_minimo': excluded.stock_minimo}
+        ))
+    return actualizar_bajo_stock(id_almacen, sorted(minimos))
+
+
+def post_detalles(vale, lineas):
+    """Registrar en kardex y stock las líneas recién insertadas de un vale.
+
+    `lineas` son las filas devueltas por insert_detalles(), en orden de
+    registro. En almacenes FIFO/FEFO las líneas consumen o agregan capas de
+    costo (siempre con bloqueo). En los de promedio ponderado, según
+    STOCK_CONCURRENCIA, los saldos se leen bloqueados (y el stock se
+    actualiza con un upsert consolidado por artículo) o sin bloqueo con
+    escritura condicionada a la versión y reintentos. Lanza
+    StockInsuficiente si una salida supera el saldo (o StockOcupado si se
+    agotan los reintentos) y StockError si el vale cae en un periodo cerrado.
+    Mientras tanto retiene el candado compartido del almacén, que excluye a
+    rebuild_almacen. Luego anota los mismos deltas para el total
+    Articulo.stock_articulo y actualiza las marcas de stock bajo. No hace commit; devuelve la cantidad
+    de artículos afectados.
+    """
+    if vale.flag_estado != '1' or not lineas:
+        return 0
+
+    # Todo registro pasa por aquí: ningún vale puede mover saldos ya cerrados
+    cerrado = periodo_cerrado(vale.fecha_vale)
+    if cerrado:
+        raise StockError(f"La fecha del vale pertenece a un periodo cerrado ({cerrado}); use una fecha posterior")
+
+    factor_mov = int(db.session.get(TipoMovAlmacen, vale.id_tipo_mov_almacen).factor_mov)
+    movimientos = agrupar_lineas(vale.id_almacen, factor_mov, lineas)
+    contadores.sumar('vales')
+    advisory_lock(db.session, CANDADO_ALMACEN, vale.id_almacen, compartido=True)
+    metodo = db.session.get(Almacen, vale.id_almacen).metodo_costeo
+    if metodo in METODOS_CAPAS:
+        _post_capas(vale, factor_mov, lineas, movimientos, metodo)
+    elif current_app.config.get('STOCK_CONCURRENCIA') == 'optimista':
+        _post_optimista(vale, factor_mov, lineas, movimientos)
+    else:
+        _post_pesimista(vale, factor_mov, lineas, movimientos)
+    sumar_stock_articulo(movimientos)
+    actualizar_bajo_stock(vale.id_almacen, [m['id_articulo'] for m in movimientos], vale.id_vale_almacen)
+    marcar_almacen_modificado(vale.id_almacen)
+    return len(movimientos)
+
+
+def _compensar_kardex(id_almacen, ids_lineas, bases):
+    """Agregar al kardex, con un INSERT ... SELECT, una fila opuesta por cada movimiento de las líneas.
+
+    El saldo acumulado de cada fila nueva parte de `bases` ({id_articulo:
+    (saldo_cantidad, saldo_valorizado)} del último movimiento) y se acumula
+    por artículo con funciones de ventana.
+    """
+    k = Kardex.__table__
+    ventana = {'partition_by': k.c.id_articulo, 'order_by': k.c.id_kardex}
+    base_cantidad = case({i: base[0] for i, base in bases.items()}, value=k.c.id_articulo)
+    base_valorizado = case({i: base[1] for i, base in bases.items()}, value=k.c.id_articulo)
+    compensaciones = (
+        select(
+            k.c.id_almacen, k.c.id_articulo, k.c.id_vale_almacen_det, k.c.fecha,
+            (-k.c.cantidad).label('cantidad'),
+            k.c.precio_soles,
+            (base_cantidad - func.sum(k.c.cantidad).over(**ventana)).label('saldo_cantidad'),
+            (base_valorizado - func.sum(k.c.cantidad * k.c.precio_soles).over(**ventana)).label('saldo_valorizado')
+        )
+        .where(k.c.id_almacen == id_almacen, k.c.id_vale_almacen_det.in_(ids_lineas))
+        .order_by(k.c.id_kardex)
+    )
+    columnas = ['id_almacen', 'id_articulo', 'id_vale_almacen_det', 'fecha', 'cantidad',
+                'precio_soles', 'saldo_cantidad', 'saldo_valorizado']
+    db.session.execute(insert(k).from_select(columnas, compensaciones))
+
+
+def _recalcular_desde(id_almacen, id_articulo, desde_id_kardex, metodo=PROMEDIO):
+    """Recalcular costos y saldos del kardex de un (almacén, artículo) desde `desde_id_kardex`.
+
+    Reproduce los movimientos en orden de registro partiendo del saldo anterior;
+    las filas de líneas o vales inactivos (y sus compensaciones) no mueven el
+    saldo, y las salidas se recostean al promedio resultante. Lanza
+    StockInsuficiente si el saldo queda negativo en algún movimiento, aunque
+    el final no lo sea. Devuelve el saldo final [cantidad, precio_promedio].
+    """
+    if metodo in METODOS_CAPAS:
+        return _recalcular_capas(id_almacen, id_articulo, desde_id_kardex, metodo)
+    previo = db.session.execute(
+        select(Kardex.saldo_cantidad, Kardex.saldo_valorizado)
+        .where(Kardex.id_almacen == id_almacen, Kardex.id_articulo == id_articulo,
+               Kardex.id_kardex < desde_id_kardex)
+        .order_by(Kardex.id_kardex.desc())
+        .limit(1)
+    ).first()
+    saldos = {}
+    if previo and previo.saldo_cantidad:
+        saldos[id_articulo] = [_decimal(previo.saldo_cantidad),
+                               _decimal(previo.saldo_valorizado) / _decimal(previo.saldo_cantidad)]
+    else:
+        saldos[id_articulo] = [Decimal(0), Decimal(0)]
+
+    anulada = or_(ValeAlmacenDet.flag_estado != '1', ValeAlmacen.flag_estado != '1')
+    filas = db.session.execute(
+        select(Kardex.id_kardex, Kardex.cantidad, Kardex.precio_soles, anulada.label('anulada'))
+        .join(ValeAlmacenDet, ValeAlmacenDet.id_vale_almacen_det == Kardex.id_vale_almacen_det)
+        .join(ValeAlmacen, ValeAlmacen.id_vale_almacen == ValeAlmacenDet.id_vale_almacen)
+        .where(Kardex.id_almacen == id_almacen, Kardex.id_articulo == id_articulo,
+               Kardex.id_kardex >= desde_id_kardex)
+        .order_by(Kardex.id_kardex)
+    )
+    cambios = []
+    for fila in filas:
+        if fila.anulada:
+            saldo, costo = saldos[id_articulo], _decimal(fila.precio_soles)
+        else:
+            costo, saldo = _aplicar_linea(saldos, id_articulo, _decimal(fila.cantidad), _decimal(fila.precio_soles))
+            if saldo[0] < 0:
+                contadores.sumar('rechazados')
+                raise StockInsuficiente("Stock insuficiente", [{
+                    "id_articulo": id_articulo,
+                    "id_kardex": fila.id_kardex,
+                    "disponible": float(saldo[0] - _decimal(fila.cantidad)),
+                    "solicitado": float(-_decimal(fila.cantidad)),
+                    "message": "Sin el vale, una salida posterior queda sin stock"
+                }])
+        cambios.append({
+            'b_id_kardex': fila.id_kardex,
+            'precio_soles': costo.quantize(_CUATRO_DECIMALES),
+            'saldo_cantidad': saldo[0],
+            'saldo_valorizado': (saldo[0] * saldo[1]).quantize(_CUATRO_DECIMALES)
+        })
+    _actualizar_kardex(cambios)
+    return saldos[id_articulo]
+
+
+def _actualizar_kardex(cambios):
+    k = Kardex.__table__
+    for lote in chunked(cambios):
+        db.session.execute(
+            update(k).where(k.c.id_kardex == bindparam('b_id_kardex'))
+            .values(precio_soles=bindparam('precio_soles'), saldo_cantidad=bindparam('saldo_cantidad'),
+                    saldo_valorizado=bindparam('saldo_valorizado'))
+            .execution_options(synchronize_session=False),
+            lote
+        )
+
+
+def _recalcular_capas(id_almacen, id_articulo, desde_id_kardex, metodo):
+    """Recalcular un (almacén, artículo) FIFO/FEFO reconstruyendo sus capas.
+
+    El estado de las capas en un punto intermedio no se guarda, así que se
+    reproducen todos sus movimientos activos; solo se reescriben las filas de
+    kardex desde `desde_id_kardex` y luego se reemplazan las capas abiertas.
+    Lanza CapasInsuficientes si sin las líneas anuladas alguna salida queda
+    sin cubrir.
+    """
+    capas = CapasCosto(metodo)
+    anulada = or_(ValeAlmacenDet.flag_estado != '1', ValeAlmacen.flag_estado != '1')
+    filas = db.session.execute(
+        select(Kardex.id_kardex, Kardex.id_vale_almacen_det, Kardex.cantidad, Kardex.precio_soles,
+               ValeAlmacen.fecha_vale, ValeAlmacenDet.fecha_vencimiento, anulada.label('anulada'))
+        .join(ValeAlmacenDet, ValeAlmacenDet.id_vale_almacen_det == Kardex.id_vale_almacen_det)
+        .join(ValeAlmacen, ValeAlmacen.id_vale_almacen == ValeAlmacenDet.id_vale_almacen)
+        .where(Kardex.id_almacen == id_almacen, Kardex.id_articulo == id_articulo)
+        .order_by(Kardex.id_kardex)
+    )
+    cambios = []
+    for fila in filas:
+        costo = _decimal(fila.precio_soles)
+        if not fila.anulada:
+            costo = _aplicar_capa(capas, fila, _decimal(fila.cantidad), fila.fecha_vale, fila.fecha_vencimiento)
+        if fila.id_kardex >= desde_id_kardex:
+            cambios.append({
+                'b_id_kardex': fila.id_kardex,
+                'precio_soles': costo.quantize(_CUATRO_DECIMALES),
+                'saldo_cantidad': capas.cantidad,
+                'saldo_valorizado': capas.valorizado.quantize(_CUATRO_DECIMALES)
+            })
+    _actualizar_kardex(cambios)
+    reemplazar_capas(id_almacen, id_articulo, capas)
+    return [capas.cantidad, capas.precio_promedio]
+
+
+def revertir_vale(vale):
+    """Revertir el efecto en stock y kardex de las líneas activas de un vale (antes de inactivarlo).
+
+    Agrega filas de kardex opuestas a las del vale y aplica al stock el delta
+    inverso por artículo. Si después del vale hubo otros movimientos del mismo
+    artículo en el almacén, su costo dependía del vale: solo esos pares
+    (almacén, artículo) se recalculan desde el primer movimiento del vale. En
+    almacenes FIFO/FEFO todos los artículos del vale se recalculan, porque
+    sus capas abiertas también cambian.
+    Lanza StockError si el vale cae en un periodo cerrado y StockInsuficiente
+    si anular un ingreso deja saldo negativo, al final o en algún movimiento
+    posterior. Bloquea la cabecera del vale y la relee, así dos peticiones no
+    revierten el mismo vale. No hace commit ni cambia flag_estado; devuelve
+    la cantidad de artículos revertidos.
+    """
+    db.session.execute(
+        select(ValeAlmacen).where(ValeAlmacen.id_vale_almacen == vale.id_vale_almacen)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    if vale.flag_estado != '1':
+        return 0
+    ids_lineas = select(ValeAlmacenDet.id_vale_almacen_det).where(
+        ValeAlmacenDet.id_vale_almacen == vale.id_vale_almacen, ValeAlmacenDet.flag_estado == '1'
+    )
+    movido = db.session.execute(
+        select(
+            Kardex.id_articulo,
+            func.sum(Kardex.cantidad).label('cantidad'),
+            func.sum(Kardex.cantidad * Kardex.precio_soles * _UNO).label('valorizado'),
+            func.min(Kardex.id_kardex).label('primero'),
+            func.max(Kardex.id_kardex).label('ultimo')
+        )
+        .where(Kardex.id_almacen == vale.id_almacen, Kardex.id_vale_almacen_det.in_(ids_lineas))
+        .group_by(Kardex.id_articulo)
+        .order_by(Kardex.id_articulo)
+    ).all()
+    if not movido:
+        return 0
+
+    cerrado = periodo_cerrado(vale.fecha_vale)
+    if cerrado:
+        raise StockError(f"El vale pertenece a un periodo cerrado ({cerrado}); registre un vale de ajuste")
+
+    ids_articulo = [fila.id_articulo for fila in movido]
+    advisory_lock(db.session, CANDADO_ALMACEN, vale.id_almacen, compartido=True)
+    bloquear_saldos(vale.id_almacen, ids_articulo)
+    # Último movimiento de cada artículo: su saldo valorizado no arrastra el redondeo del precio promedio
+    ultimos = {
+        fila.id_articulo: fila
+        for fila in db.session.execute(
+            select(Kardex.id_articulo, Kardex.id_kardex, Kardex.saldo_cantidad, Kardex.saldo_valorizado)
+            .where(Kardex.id_kardex.in_(
+                select(func.max(Kardex.id_kardex))
+                .where(Kardex.id_almacen == vale.id_almacen, Kardex.id_articulo.in_(ids_articulo))
+                .group_by(Kardex.id_articulo)
+            ))
+        )
+    }
+    bases = {i: (_decimal(u.saldo_cantidad), _decimal(u.saldo_valorizado)) for i, u in ultimos.items()}
+
+    nuevos = {}
+    faltantes = []
+    for fila in movido:
+        cantidad, valorizado = bases[fila.id_articulo]
+        restante = cantidad - _decimal(fila.cantidad)
+        if restante < 0:
+            faltantes.append({
+                "id_articulo": fila.id_articulo,
+                "disponible": float(cantidad),
+                "solicitado": float(fila.cantidad),
+                "message": "Stock insuficiente para anular el ingreso"
+            })
+            continue
+        valorizado -= _decimal(fila.valorizado)
+        nuevos[fila.id_articulo] = [restante, valorizado / restante if restante > 0 else Decimal(0)]
+    if faltantes:
+        contadores.sumar('rechazados')
+        raise StockInsuficiente("Stock insuficiente", faltantes)
+
+    # Pares con movimientos posteriores al vale: el costo de esos movimientos incluía al vale
+    metodo = db.session.get(Almacen, vale.id_almacen).metodo_costeo
+    if metodo in METODOS_CAPAS:
+        recalcular = movido
+    else:
+        recalcular = [fila for fila in movido if ultimos[fila.id_articulo].id_kardex > fila.ultimo]
+
+    _compensar_kardex(vale.id_almacen, ids_lineas, bases)
+    # Las líneas quedan inactivas antes de recalcular, para que el recálculo las salte
+    db.session.execute(
+        update(ValeAlmacenDet)
+        .where(ValeAlmacenDet.id_vale_almacen == vale.id_vale_almacen, ValeAlmacenDet.flag_estado == '1')
+        .values(flag_estado='0')
+        .execution_options(synchronize_session='fetch')
+    )
+    try:
+        for fila in recalcular:
+            nuevos[fila.id_articulo] = _recalcular_desde(vale.id_almacen, fila.id_articulo, fila.primero, metodo)
+    except CapasInsuficientes:
+        contadores.sumar('rechazados')
+        raise StockInsuficiente("Stock insuficiente para anular el ingreso: sus capas ya fueron consumidas")
+
+    stock = Stock.__table__
+    db.session.execute(
+        update(stock)
+        .where(stock.c.id_almacen == vale.id_almacen, stock.c.id_articulo.in_(nuevos))
+        .values(
+            cantidad=case({i: saldo[0] for i, saldo in nuevos.items()}, value=stock.c.id_articulo),
+            precio_promedio=case({i: saldo[1].quantize(_CUATRO_DECIMALES) for i, saldo in nuevos.items()},
+                                 value=stock.c.id_articulo),
+            version=stock.c.version + 1
+        )
+    )
+
+    movimientos = [{'id_articulo': fila.id_articulo, 'cantidad': -_decimal(fila.cantidad)} for fila in movido]
+    sumar_stock_articulo(movimientos)
+    actualizar_bajo_stock(vale.id_almacen, ids_articulo, vale.id_vale_almacen)
+    marcar_almacen_modificado(vale.id_almacen)
+    return len(movido)
+
+
+def rebuild_almacen(database_uri, id_almacen, progreso=None, lote=LOTE_RECALCULO):
+    """Recalcular desde los vales el kardex y el stock de un almacén.
+
+    Pensado para ejecutarse en un proceso aparte (crea su propio engine). Lee
+    las líneas activas en orden de registro (id_vale_almacen_det, el mismo
+    orden en que post_detalles las registró y que siguen _recalcular_desde y
+    las consultas de kardex por id_kardex) con un cursor del lado del
+    servidor y reescribe kardex y stock del almacén en lotes dentro de la misma
+    transacción: las consultas ven los saldos anteriores o los nuevos, nunca
+    un estado intermedio. Toma el candado exclusivo del almacén
+    (CANDADO_ALMACEN), así ningún vale se registra ni se revierte en él
+    mientras tanto. En almacenes FIFO/FEFO reconstruye también las
+    capas de costo. Conserva los stock mínimos, incrementa la versión de cada
+    fila (invalida las capas en caché) y recalcula las marcas de stock bajo
+    sin encolar alertas; Articulo.stock_articulo queda a cargo de quien llama
+    (corregir_stock_articulo), una vez terminados todos los almacenes. Informa
+    por `progreso` (una cola) las líneas procesadas y devuelve el total.
+
+    El kardex reconstruido solo tiene las líneas activas: las de los vales
+    inactivados y sus filas compensatorias (revertir_vale) se eliminan, así
+    que el rastro de esas anulaciones queda solo en los vales y sus líneas
+    con flag_estado '0'.
+    """
+    det = ValeAlmacenDet.__table__
+    vale = ValeAlmacen.__table__
+    tipo = TipoMovAlmacen.__table__
+    kardex = Kardex.__table__
+    stock = Stock.__table__
+    capa = CapaCosto.__table__
+
+    consulta = (
+        select(det.c.id_vale_almacen_det, det.c.id_articulo, det.c.cantidad, det.c.precio_soles,
+               det.c.fecha_vencimiento, vale.c.fecha_vale, tipo.c.factor_mov)
+        .join(vale, vale.c.id_vale_almacen == det.c.id_vale_almacen)
+        .join(tipo, tipo.c.id_tipo_mov_almacen == vale.c.id_tipo_mov_almacen)
+        .where(vale.c.id_almacen == id_almacen, vale.c.flag_estado == '1', det.c.flag_estado == '1')
+        .order_by(det.c.id_vale_almacen_det)
+    )
+
+    engine = create_engine(database_uri)
+    saldos = {}
+    procesadas = 0
+    try:
+        with engine.begin() as conexion:
+            # Espera a los vales en curso del almacén y frena los nuevos hasta el commit
+            advisory_lock(conexion, CANDADO_ALMACEN, id_almacen)
+            metodo = conexion.execute(
+                select(Almacen.__table__.c.metodo_costeo).where(Almacen.__table__.c.id_almacen == id_almacen)
+            ).scalar()
+            capas = {}
+            conexion.execute(delete(kardex).where(kardex.c.id_almacen == id_almacen))
+            filas = []
+            # Misma conexión para leer y escribir (en SQLite otra conexión quedaría bloqueada)
+            resultado = conexion.execute(consulta, execution_options={'stream_results': True, 'yield_per': lote})
+            for linea in resultado:
+                cantidad = _decimal(linea.cantidad) * int(linea.factor_mov)
+                if metodo in METODOS_CAPAS:
+                    capas_articulo = capas.setdefault(linea.id_articulo, CapasCosto(metodo))
+                    try:
+                        costo = _aplicar_capa(capas_articulo, linea, cantidad, linea.fecha_vale, linea.fecha_vencimiento)
+                    except CapasInsuficientes:
+                        raise StockError(f"El artículo {linea.id_articulo} queda con saldo negativo en el "
+                                         f"vale de la línea {linea.id_vale_almacen_det}")
+                    saldos[linea.id_articulo] = [capas_articulo.cantidad, capas_articulo.precio_promedio]
+                    saldo_cantidad, saldo_valorizado = capas_articulo.cantidad, capas_articulo.valorizado
+                else:
+                    costo, saldo = _aplicar_linea(saldos, linea.id_articulo, cantidad, _decimal(linea.precio_soles))
+                    saldo_cantidad, saldo_valorizado = saldo[0], saldo[0] * saldo[1]
+                filas.append(_fila_kardex(id_almacen, linea.fecha_vale, linea.id_vale_almacen_det,
+                                          linea.id_articulo, cantidad, costo, saldo_cantidad, saldo_valorizado))
+                if len(filas) >= lote:
+                    conexion.execute(insert(kardex), filas)
+                    procesadas += len(filas)
+                    filas = []
+                    if progreso is not None:
+                        progreso.put((id_almacen, procesadas))
+            if filas:
+                conexion.execute(insert(kardex), filas)
+                procesadas += len(filas)
+
+            conexion.execute(delete(capa).where(capa.c.id_almacen == id_almacen))
+            abiertas = [
+                {
+                    'id_almacen': id_almacen,
+                    'id_articulo': id_articulo,
+                    'id_vale_almacen_det': abierta.id_vale_almacen_det,
+                    'fecha_ingreso': abierta.fecha_ingreso,
+                    'fecha_vencimiento': abierta.fecha_vencimiento,
+                    'cantidad': abierta.cantidad,
+                    'costo_unitario': abierta.costo_unitario
+                }
+                for id_articulo, capas_articulo in sorted(capas.items())
+                for abierta in capas_articulo.abiertas()
+            ]
+            for bloque in chunked(abiertas):
+                conexion.execute(insert(capa), bloque)
+
+            # Los mínimos se conservan; los artículos sin movimientos quedan con saldo cero
+            anteriores = conexion.execute(
+                select(stock.c.id_articulo, stock.c.stock_minimo, stock.c.version)
+                .where(stock.c.id_almacen == id_almacen)
+            ).all()
+            minimos = {fila.id_articulo: fila.stock_minimo for fila in anteriores if fila.stock_minimo is not None}
+            versiones = {fila.id_articulo: fila.version for fila in anteriores}
+            for id_articulo in minimos:
+                saldos.setdefault(id_articulo, [Decimal(0), Decimal(0)])
+            conexion.execute(delete(stock).where(stock.c.id_almacen == id_almacen))
+            nuevos = [
+                {
+                    'id_almacen': id_almacen,
+                    'id_articulo': id_articulo,
+                    'cantidad': cantidad,
+                    'precio_promedio': precio.quantize(_CUATRO_DECIMALES),
+                    'stock_minimo': minimos.get(id_articulo),
+                    'version': versiones[id_articulo] + 1 if id_articulo in versiones else 0,
+                    'flag_bajo_stock': '1' if id_articulo in minimos and cantidad <= minimos[id_articulo] else '0'
+                }
+                for id_articulo, (cantidad, precio) in sorted(saldos.items())
+            ]
+            for bloque in chunked(nuevos):
+                conexion.execute(insert(stock), bloque)
+    finally:
+        engine.dispose()
+
+    if progreso is not None:
+        progreso.put((id_almacen, procesadas))
+    return procesadas
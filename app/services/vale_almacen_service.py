@@ -0,0 +1,373 @@
+# app/services/vale_almacen_service.py
+import math
+from datetime import datetime
+from types import SimpleNamespace
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models.almacen import Almacen
+from app.models.articulo import Articulo
+from app.models.entidad_relacion import EntidadRelacion
+from app.models.kardex import Kardex
+from app.models.tipo_documento import TipoDocumento
+from app.models.tipo_mov_almacen import TipoMovAlmacen
+from app.models.vale_almacen import ValeAlmacen
+from app.models.vale_almacen_det import ValeAlmacenDet
+from app.services.costeo_service import METODOS_CAPAS
+from app.services.stock_service import bloquear_saldos, post_detalles, revertir_vale
+from app.utils.serializers import eager
+
+
+class ValeAlmacenError(ValueError):
+    """Datos inválidos al registrar un vale o sus detalles"""
+
+    def __init__(self, message, errores=None):
+        super().__init__(message)
+        self.message = message
+        self.errores = errores or []
+
+    def to_dict(self):
+        respuesta = {"message": self.message}
+        if self.errores:
+            respuesta["errores"] = self.errores
+        return respuesta
+
+
+def _parse_fecha(valor):
+    if not valor:
+        return datetime.utcnow()
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValeAlmacenError("Formato de fecha inválido. Use YYYY-MM-DD.")
+
+
+def _parse_id(valor):
+    """Convertir un identificador a int; acepta enteros y cadenas numéricas (no bool ni decimales)"""
+    if isinstance(valor, bool) or (isinstance(valor, float) and not valor.is_integer()):
+        raise ValueError(valor)
+    return int(valor)
+
+
+def _parse_vencimiento(valor):
+    """Fecha de vencimiento opcional de una línea (YYYY-MM-DD); None si no se indica"""
+    if not valor:
+        return None
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def validate_detalles(detalles):
+    """Validar las líneas de un vale y devolverlas como filas listas para insertar.
+
+    Todos los id_articulo se verifican con una sola consulta IN.
+    """
+    if not isinstance(detalles, list) or not detalles:
+        raise ValeAlmacenError("Datos incompletos para agregar detalles")
+
+    filas = []
+    errores = []
+    for indice, detalle in enumerate(detalles):
+        if not isinstance(detalle, dict) or any(
+                campo not in detalle for campo in ('id_articulo', 'cantidad', 'precio_soles')):
+            errores.append({"indice": indice, "message": "Datos incompletos en el detalle"})
+            continue
+        try:
+            id_articulo = _parse_id(detalle['id_articulo'])
+        except (TypeError, ValueError):
+            errores.append({"indice": indice, "message": "id_articulo debe ser un entero"})
+            continue
+        try:
+            cantidad = float(detalle['cantidad'])
+            precio_soles = float(detalle['precio_soles'])
+        except (TypeError, ValueError):
+            errores.append({"indice": indice, "message": "Cantidad o precio no numéricos"})
+            continue
+        # float() acepta 'nan' e 'inf', que no pueden entrar al stock ni al kardex
+        if not (math.isfinite(cantidad) and math.isfinite(precio_soles)):
+            errores.append({"indice": indice, "message": "Cantidad o precio no numéricos"})
+            continue
+        try:
+            fecha_vencimiento = _parse_vencimiento(detalle.get('fecha_vencimiento'))
+        except (TypeError, ValueError):
+            errores.append({"indice": indice, "message": "Fecha de vencimiento inválida. Use YYYY-MM-DD."})
+            continue
+        if cantidad <= 0 or precio_soles < 0:
+            errores.append({"indice": indice, "message": "Cantidad debe ser positiva y precio no negativo"})
+            continue
+        filas.append({
+            'id_articulo': id_articulo,
+            'cantidad': cantidad,
+            'precio_soles': precio_soles,
+            'fecha_vencimiento': fecha_vencimiento,
+            'item': detalle.get('item'),
+        })
+
+    if errores:
+        raise ValeAlmacenError("Datos incompletos en uno de los detalles", errores)
+
+    ids = {fila['id_articulo'] for fila in filas}
+    existentes = set(db.session.scalars(select(Articulo.id_articulo).where(Articulo.id_articulo.in_(ids))))
+    faltantes = sorted(ids - existentes)
+    if faltantes:
+        raise ValeAlmacenError(
+            "Artículos no encontrados",
+            [{"id_articulo": id_articulo, "message": "Artículo no encontrado"} for id_articulo in faltantes]
+        )
+
+    return filas
+
+
+def _insert_lineas(filas):
+    """Insertar líneas (de uno o más vales) con un solo INSERT ... RETURNING en lote"""
+    tabla = ValeAlmacenDet.__table__
+    insertadas = db.session.execute(
+        insert(tabla).returning(
+            tabla.c.id_vale_almacen_det, tabla.c.id_vale_almacen, tabla.c.id_articulo,
+            tabla.c.cantidad, tabla.c.precio_soles, tabla.c.fecha_vencimiento
+        ),
+        filas
+    ).all()
+    return sorted(insertadas, key=lambda linea: linea.id_vale_almacen_det)
+
+
+def insert_detalles(id_vale, filas):
+    """Insertar las líneas de un vale en lote (sin un add() por fila).
+
+    Devuelve las líneas insertadas (id, artículo, cantidad y precio) en el
+    orden en que se registraron, listas para post_detalles().
+    """
+    for fila in filas:
+        fila['id_vale_almacen'] = id_vale
+    return _insert_lineas(filas)
+
+
+def crear_vale_con_detalles(data, id_user):
+    """Registrar la cabecera y todas las líneas de un vale en una misma transacción.
+
+    No hace commit: el llamador decide cuándo confirmar. Lanza ValeAlmacenError
+    si algún dato es inválido (también si el INSERT viola una restricción);
+    el llamador debe hacer rollback.
+    """
+    if not data:
+        raise ValeAlmacenError("Datos incompletos para crear el vale de almacén")
+
+    faltantes = [c for c in ('cod_vale_almacen', 'id_almacen', 'id_tipo_mov_almacen') if not data.get(c)]
+    if faltantes:
+        raise ValeAlmacenError(f"Faltan campos obligatorios: {', '.join(faltantes)}")
+
+    fecha_vale = _parse_fecha(data.get('fecha_vale'))
+    referencias = {}
+    for campo in ('id_almacen', 'id_tipo_mov_almacen', 'id_entidad', 'id_tipo_doc'):
+        if data.get(campo) is None:
+            referencias[campo] = None
+            continue
+        try:
+            referencias[campo] = _parse_id(data[campo])
+        except (TypeError, ValueError):
+            raise ValeAlmacenError(f"{campo} debe ser un entero")
+
+    if ValeAlmacen.query.filter_by(cod_vale_almacen=data['cod_vale_almacen']).first():
+        raise ValeAlmacenError("El código de vale ya existe")
+    if not db.session.get(Almacen, referencias['id_almacen']):
+        raise ValeAlmacenError("El almacén no existe")
+    if not db.session.get(TipoMovAlmacen, referencias['id_tipo_mov_almacen']):
+        raise ValeAlmacenError("El tipo de movimiento no existe")
+    if referencias['id_entidad'] is not None and not db.session.get(EntidadRelacion, referencias['id_entidad']):
+        raise ValeAlmacenError("La entidad no existe")
+    if referencias['id_tipo_doc'] is not None and not db.session.get(TipoDocumento, referencias['id_tipo_doc']):
+        raise ValeAlmacenError("El tipo de documento no existe")
+
+    filas = validate_detalles(data.get('detalles'))
+    # Las líneas sin item se numeran según su posición en el documento
+    for indice, fila in enumerate(filas, start=1):
+        if fila['item'] is None:
+            fila['item'] = indice
+
+    vale = ValeAlmacen(
+        cod_vale_almacen=data['cod_vale_almacen'],
+        fecha_vale=fecha_vale,
+        fecha_registro=datetime.utcnow(),
+        id_user=id_user,
+        serie_doc=data.get('serie_doc'),
+        nro_documento=data.get('nro_documento'),
+        flag_estado=data.get('flag_estado', '1'),
+        **referencias
+    )
+    db.session.add(vale)
+    try:
+        db.session.flush()
+        lineas = insert_detalles(vale.id_vale_almacen, filas)
+    except IntegrityError:
+        # Otro vale tomó el mismo código, o una referencia se eliminó entre la validación y el INSERT
+        raise ValeAlmacenError("El código de vale ya existe o alguna referencia del vale no es válida")
+    post_detalles(vale, lineas)
+    detalles = eager(
+        ValeAlmacenDet.query.filter_by(id_vale_almacen=vale.id_vale_almacen)
+        .order_by(ValeAlmacenDet.id_vale_almacen_det),
+        ValeAlmacenDet
+    ).all()
+    return vale, detalles
+
+
+def registrar_transferencia(data, id_user):
+    """Registrar una transferencia entre almacenes: vale S03 en el origen y I03 en el destino.
+
+    Ambos vales, sus líneas (un solo INSERT para los dos) y los dos
+    movimientos de stock van en la misma transacción, así la mercadería nunca
+    queda fuera de ambos almacenes. Las filas de stock de los dos almacenes se
+    bloquean en orden de id_almacen y las líneas se valorizan al costo
+    promedio del origen (o, si el origen es FIFO/FEFO, al costo de las capas
+    que consumió la salida). No hace commit; lanza ValeAlmacenError o StockError.
+    Devuelve (vale_salida, vale_ingreso, cantidad de líneas por vale).
+    """
+    if not data:
+        raise ValeAlmacenError("Datos incompletos para registrar la transferencia")
+
+    campos = ('cod_vale_salida', 'cod_vale_ingreso', 'id_almacen_origen', 'id_almacen_destino')
+    faltantes = [c for c in campos if not data.get(c)]
+    if faltantes:
+        raise ValeAlmacenError(f"Faltan campos obligatorios: {', '.join(faltantes)}")
+
+    origen, destino = data['id_almacen_origen'], data['id_almacen_destino']
+    if origen == destino:
+        raise ValeAlmacenError("El almacén de origen y el de destino deben ser distintos")
+    codigos = (data['cod_vale_salida'], data['cod_vale_ingreso'])
+    if codigos[0] == codigos[1]:
+        raise ValeAlmacenError("Los códigos de los vales de salida e ingreso deben ser distintos")
+
+    fecha_vale = _parse_fecha(data.get('fecha_vale'))
+
+    duplicados = db.session.scalars(
+        select(ValeAlmacen.cod_vale_almacen).where(ValeAlmacen.cod_vale_almacen.in_(codigos))
+    ).all()
+    if duplicados:
+        raise ValeAlmacenError(
+            "El código de vale ya existe",
+            [{"cod_vale_almacen": codigo, "message": "El código de vale ya existe"} for codigo in sorted(duplicados)]
+        )
+    metodos = dict(db.session.execute(
+        select(Almacen.id_almacen, Almacen.metodo_costeo).where(Almacen.id_almacen.in_((origen, destino)))
+    ).all())
+    if {origen, destino} - set(metodos):
+        raise ValeAlmacenError("El almacén no existe")
+    tipos = {
+        tipo.cod_tipo_mov_alm: tipo.id_tipo_mov_almacen
+        for tipo in TipoMovAlmacen.query.filter(TipoMovAlmacen.cod_tipo_mov_alm.in_(('S03', 'I03')))
+    }
+    if len(tipos) != 2:
+        raise ValeAlmacenError("Los tipos de movimiento de transferencia (S03/I03) no están registrados")
+
+    # El precio de las líneas es el costo promedio del origen, no lo envía el cliente
+    detalles = data.get('detalles')
+    if isinstance(detalles, list):
+        detalles = [{**detalle, 'precio_soles': 0} if isinstance(detalle, dict) else detalle for detalle in detalles]
+    filas = validate_detalles(detalles)
+    for indice, fila in enumerate(filas, start=1):
+        if fila['item'] is None:
+            fila['item'] = indice
+
+    ids_articulo = [fila['id_articulo'] for fila in filas]
+    saldos = {}
+    for id_almacen in sorted((origen, destino)):
+        saldos[id_almacen] = bloquear_saldos(id_almacen, ids_articulo)
+
+    comunes = {
+        'fecha_vale': fecha_vale,
+        'fecha_registro': datetime.utcnow(),
+        'id_user': id_user,
+        'id_entidad': data.get('id_entidad'),
+        'id_tipo_doc': data.get('id_tipo_doc'),
+        'serie_doc': data.get('serie_doc'),
+        'nro_documento': data.get('nro_documento'),
+        'flag_estado': '1'
+    }
+    salida = ValeAlmacen(cod_vale_almacen=codigos[0], id_almacen=origen,
+                         id_tipo_mov_almacen=tipos['S03'], **comunes)
+    ingreso = ValeAlmacen(cod_vale_almacen=codigos[1], id_almacen=destino,
+                          id_tipo_mov_almacen=tipos['I03'], **comunes)
+    db.session.add_all([salida, ingreso])
+    db.session.flush()
+
+    # Artículos sin stock en el origen: post_detalles rechazará la salida
+    costos = {id_articulo: saldo[1] for id_articulo, saldo in saldos[origen].items()}
+    lineas = _insert_lineas([
+        {**fila, 'id_vale_almacen': vale.id_vale_almacen, 'precio_soles': costos.get(fila['id_articulo'], 0)}
+        for vale in (salida, ingreso)
+        for fila in filas
+    ])
+    lineas_salida = [linea for linea in lineas if linea.id_vale_almacen == salida.id_vale_almacen]
+    lineas_ingreso = [linea for linea in lineas if linea.id_vale_almacen == ingreso.id_vale_almacen]
+    post_detalles(salida, lineas_salida)
+    if metodos[origen] in METODOS_CAPAS:
+        lineas_ingreso = _costear_ingreso(lineas_salida, lineas_ingreso)
+    post_detalles(ingreso, lineas_ingreso)
+    return salida, ingreso, len(filas)
+
+
+def _costear_ingreso(lineas_salida, lineas_ingreso):
+    """Valorizar cada línea del ingreso al costo que el kardex asignó a su línea de salida.
+
+    Las líneas de ambos vales se insertaron en el mismo orden, así que se
+    emparejan por posición. Devuelve las líneas del ingreso con el precio nuevo.
+    """
+    costos = dict(db.session.execute(
+        select(Kardex.id_vale_almacen_det, Kardex.precio_soles)
+        .where(Kardex.id_vale_almacen_det.in_([linea.id_vale_almacen_det for linea in lineas_salida]))
+    ).all())
+    precios = [costos[linea.id_vale_almacen_det] for linea in lineas_salida]
+    tabla = ValeAlmacenDet.__table__
+    db.session.execute(
+        update(tabla).where(tabla.c.id_vale_almacen_det == bindparam('b_id_vale_almacen_det'))
+        .values(precio_soles=bindparam('b_precio_soles'))
+        .execution_options(synchronize_session=False),
+        [{'b_id_vale_almacen_det': linea.id_vale_almacen_det, 'b_precio_soles': precio}
+         for linea, precio in zip(lineas_ingreso, precios)]
+    )
+    return [SimpleNamespace(**{**linea._asdict(), 'precio_soles': precio})
+            for linea, precio in zip(lineas_ingreso, precios)]
+
+
+def inactivar_vale(vale):
+    """Inactivar un vale y sus detalles revirtiendo antes su efecto en stock y kardex.
+
+    No hace commit; lanza StockError si el movimiento no puede revertirse.
+    """
+    revertir_vale(vale)
+    vale.flag_estado = '0'
+    for detalle in vale.detalles:
+        detalle.flag_estado = '0'
+
+
+# Campos que determinan el kardex de un vale: no se modifican una vez registrado
+CAMPOS_REGISTRADOS = ('id_almacen', 'id_tipo_mov_almacen', 'fecha_vale')
+
+
+def tiene_kardex(vale):
+    """True si alguna línea del vale ya se registró en kardex"""
+    return db.session.execute(
+        select(Kardex.id_kardex)
+        .join(ValeAlmacenDet, ValeAlmacenDet.id_vale_almacen_det == Kardex.id_vale_almacen_det)
+        .where(ValeAlmacenDet.id_vale_almacen == vale.id_vale_almacen)
+        .limit(1)
+    ).first() is not None
+
+
+def validar_modificacion(vale, cambios):
+    """Rechazar los cambios de cabecera que dejarían el vale desalineado con stock y kardex.
+
+    `cambios` tiene los valores nuevos (ya convertidos) de los campos que
+    envió el cliente. flag_estado solo puede pasar a '0' (vía
+    inactivar_vale); los CAMPOS_REGISTRADOS no cambian si el vale tiene
+    kardex. Lanza ValeAlmacenError.
+    """
+    estado = cambios.get('flag_estado', vale.flag_estado)
+    if estado != vale.flag_estado and estado != '0':
+        raise ValeAlmacenError("Un vale inactivado no puede reactivarse; registre un vale nuevo")
+
+    modificados = [campo for campo in CAMPOS_REGISTRADOS
+                   if campo in cambios and cambios[campo] != getattr(vale, campo)]
+    if modificados and tiene_kardex(vale):
+        raise ValeAlmacenError(
+            "El vale ya está registrado en stock y kardex; inactívelo y registre uno nuevo",
+            [{"campo": campo, "message": "No se puede modificar en un vale registrado"} for campo in modificados]
+        )
@@ -0,0 +1,170 @@
+# app/services/valorizacion_service.py
+import threading
+from collections import Counter
+from sqlalchemy import and_, event, func, inspect, select
+from sqlalchemy.orm import Session
+from app.extensions import db, valorizacion_cache
+from app.models.almacen import Almacen
+from app.models.articulo import Articulo
+from app.models.capa_costo import CapaCosto
+from app.models.categoria import Categoria
+from app.models.stock import Stock
+from app.services.costeo_service import METODOS_CAPAS
+
+# Clave de session.info con los almacenes cuyo stock cambió en la transacción en curso
+# (TODOS si el cambio afecta a cualquier almacén, p. ej. la categoría de un artículo)
+ALMACENES_MODIFICADOS = 'almacenes_modificados'
+TODOS = None
+
+# Columnas que aparecen en la valorización además del stock
+CAMPOS_VALORIZACION = {
+    Articulo: ('id_categoria',),
+    Categoria: ('nombre_categoria',),
+    Almacen: ('cod_almacen', 'nombre_almacen', 'metodo_costeo'),
+}
+
+# Generación por almacén (y una global): una valorización calculada antes de una invalidación no se guarda
+_generaciones = Counter()
+_generacion_global = 0
+_lock = threading.Lock()
+
+
+def marcar_almacen_modificado(id_almacen):
+    """Registrar que la transacción en curso cambió el stock de `id_almacen`.
+
+    La caché se invalida recién en el commit: invalidar antes dejaría que otra
+    petición vuelva a guardar los saldos aún no confirmados como vigentes.
+    """
+    db.session.info.setdefault(ALMACENES_MODIFICADOS, set()).add(id_almacen)
+
+
+def marcar_todos_modificados():
+    """Como marcar_almacen_modificado(), para un cambio que puede afectar a cualquier almacén"""
+    db.session.info.setdefault(ALMACENES_MODIFICADOS, set()).add(TODOS)
+
+
+def invalidar_almacen(id_almacen):
+    with _lock:
+        _generaciones[id_almacen] += 1
+    valorizacion_cache.invalidate(id_almacen)
+
+
+def invalidar_todos():
+    global _generacion_global
+    with _lock:
+        _generacion_global += 1
+    valorizacion_cache.clear()
+
+
+@event.listens_for(Session, 'before_flush')
+def _marcar_cambios_de_valorizacion(session, flush_context, instances):
+    """Artículos que cambian de categoría, categorías y almacenes renombrados o con otro método de costeo"""
+    modificados = set()
+    for objeto in session.dirty:
+        campos = CAMPOS_VALORIZACION.get(type(objeto))
+        if not campos:
+            continue
+        estado = inspect(objeto)
+        if any(estado.attrs[campo].history.has_changes() for campo in campos):
+            modificados.add(objeto.id_almacen if isinstance(objeto, Almacen) else TODOS)
+    if modificados:
+        session.info.setdefault(ALMACENES_MODIFICADOS, set()).update(modificados)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_tras_commit(session):
+    modificados = session.info.pop(ALMACENES_MODIFICADOS, ())
+    if TODOS in modificados:
+        invalidar_todos()
+        return
+    for id_almacen in modificados:
+        invalidar_almacen(id_almacen)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_tras_rollback(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop(ALMACENES_MODIFICADOS, None)
+
+
+def _calcular(ids_almacen):
+    """Valorización por categoría de cada almacén de `ids_almacen`, en una sola consulta.
+
+    En almacenes FIFO/FEFO cada artículo vale lo que suman sus capas abiertas;
+    en los demás, cantidad por precio promedio (aunque queden capas de cuando
+    el almacén usaba otro método).
+    """
+    capas = (
+        select(CapaCosto.id_almacen, CapaCosto.id_articulo,
+               func.sum(CapaCosto.cantidad * CapaCosto.costo_unitario).label('valorizado'))
+        .join(Almacen, Almacen.id_almacen == CapaCosto.id_almacen)
+        .where(CapaCosto.id_almacen.in_(ids_almacen), Almacen.metodo_costeo.in_(METODOS_CAPAS))
+        .group_by(CapaCosto.id_almacen, CapaCosto.id_articulo)
+        .subquery()
+    )
+    consulta = (
+        select(
+            Almacen.id_almacen, Almacen.cod_almacen, Almacen.nombre_almacen,
+            Categoria.id_categoria, Categoria.nombre_categoria,
+            func.count().label('articulos'),
+            func.sum(Stock.cantidad).label('cantidad'),
+            func.sum(func.coalesce(capas.c.valorizado, Stock.cantidad * Stock.precio_promedio)).label('valorizado')
+        )
+        .join(Stock, Stock.id_almacen == Almacen.id_almacen)
+        .outerjoin(capas, and_(capas.c.id_almacen == Stock.id_almacen, capas.c.id_articulo == Stock.id_articulo))
+        .join(Articulo, Articulo.id_articulo == Stock.id_articulo)
+        .join(Categoria, Categoria.id_categoria == Articulo.id_categoria)
+        .where(Almacen.id_almacen.in_(ids_almacen), Stock.cantidad != 0)
+        .group_by(Almacen.id_almacen, Almacen.cod_almacen, Almacen.nombre_almacen,
+                  Categoria.id_categoria, Categoria.nombre_categoria)
+        .order_by(Almacen.id_almacen, Categoria.id_categoria)
+    )
+    tramos = {}
+    for fila in db.session.execute(consulta):
+        tramo = tramos.setdefault(fila.id_almacen, {
+            'id_almacen': fila.id_almacen,
+            'cod_almacen': fila.cod_almacen,
+            'nombre_almacen': fila.nombre_almacen,
+            'valorizado': 0.0,
+            'categorias': []
+        })
+        valorizado = round(float(fila.valorizado or 0), 2)
+        tramo['categorias'].append({
+            'id_categoria': fila.id_categoria,
+            'nombre_categoria': fila.nombre_categoria,
+            'articulos': fila.articulos,
+            'cantidad': float(fila.cantidad or 0),
+            'valorizado': valorizado
+        })
+        tramo['valorizado'] = round(tramo['valorizado'] + valorizado, 2)
+    return tramos
+
+
+def valorizacion(ids_almacen):
+    """Valorización de los almacenes pedidos, tomando de la caché los que no cambiaron.
+
+    Solo se consultan los almacenes sin entrada vigente, todos en una misma
+    consulta. Devuelve {id_almacen: tramo}; los almacenes sin stock no aparecen.
+    """
+    resultado = {}
+    faltantes = []
+    for id_almacen in ids_almacen:
+        tramo = valorizacion_cache.get(id_almacen)
+        if tramo is None:
+            faltantes.append(id_almacen)
+        elif tramo:
+            resultado[id_almacen] = tramo
+
+    if faltantes:
+        with _lock:
+            generaciones = {i: (_generacion_global, _generaciones[i]) for i in faltantes}
+        calculados = _calcular(faltantes)
+        with _lock:
+            for id_almacen in faltantes:
+                tramo = calculados.get(id_almacen)
+                # Almacén sin stock: se guarda vacío para no volver a consultarlo
+                if (_generacion_global, _generaciones[id_almacen]) == generaciones[id_almacen]:
+                    valorizacion_cache.set(id_almacen, tramo or {})
+                if tramo:
+                    resultado[id_almacen] = tramo
+    return resultado
@@ -0,0 +1,46 @@
+# app/utils/fieldsets.py
+from datetime import date, datetime
+from decimal import Decimal
+from flask import abort, jsonify, make_response, request
+
+
+def requested_columns(model):
+    """Columnas pedidas en ?fields=a,b,c (None si no se envió el parámetro).
+
+    Solo se aceptan columnas de la tabla del modelo; las listadas en
+    CAMPOS_OCULTOS (por ejemplo el hash de la contraseña) nunca se exponen.
+    """
+    raw = request.args.get('fields')
+    if not raw:
+        return None
+
+    nombres = list(dict.fromkeys(n.strip() for n in raw.split(',') if n.strip()))
+    ocultos = getattr(model, 'CAMPOS_OCULTOS', ())
+    disponibles = model.__table__.columns
+    invalidos = [n for n in nombres if n not in disponibles or n in ocultos]
+    if invalidos or not nombres:
+        abort(make_response(jsonify({
+            "message": "Campos inválidos en 'fields'",
+            "campos_invalidos": invalidos
+        }), 400))
+
+    return [getattr(model, n) for n in nombres]
+
+
+def _json_value(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def rows_to_dicts(filas, columnas):
+    """Convertir tuplas de una consulta proyectada en diccionarios JSON"""
+    claves = [c.key for c in columnas]
+    return [{k: _json_value(getattr(fila, k)) for k in claves} for fila in filas]
+
+
+def project_rows(query, columnas):
+    """Ejecutar la consulta seleccionando solo `columnas` (sin hidratar objetos ORM)"""
+    return rows_to_dicts(query.with_entities(*columnas).all(), columnas)
@@ -0,0 +1,98 @@
+# app/utils/pagination.py
+import base64
+import json
+from datetime import datetime
+from flask import request
+from sqlalchemy import DateTime, tuple_
+from app.models.vale_almacen import ValeAlmacen
+from app.utils.fieldsets import requested_columns, rows_to_dicts
+from app.utils.serializers import eager
+
+LIMITE_POR_DEFECTO = 100
+LIMITE_MAXIMO = 1000
+
+# Llave de paginación de los listados de vales: (fecha_vale, id_vale_almacen)
+ORDEN_VALES = [ValeAlmacen.fecha_vale, ValeAlmacen.id_vale_almacen]
+
+
+class CursorInvalido(ValueError):
+    """El cursor o el límite recibidos no son válidos"""
+
+
+def encode_cursor(valores):
+    """Codificar los valores de la llave de ordenamiento en un cursor opaco"""
+    serializables = [v.isoformat() if isinstance(v, datetime) else v for v in valores]
+    raw = json.dumps(serializables, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columnas):
+    """Decodificar un cursor y convertir sus valores al tipo de cada columna"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(raw)
+    except (ValueError, TypeError):
+        raise CursorInvalido("Cursor inválido")
+
+    if not isinstance(valores, list) or len(valores) != len(columnas):
+        raise CursorInvalido("Cursor inválido")
+
+    convertidos = []
+    for columna, valor in zip(columnas, valores):
+        if isinstance(columna.type, DateTime) and valor is not None:
+            try:
+                valor = datetime.fromisoformat(valor)
+            except (ValueError, TypeError):
+                raise CursorInvalido("Cursor inválido")
+        convertidos.append(valor)
+    return convertidos
+
+
+def get_page_args():
+    """Leer los parámetros limit/after de la petición actual"""
+    limit = request.args.get('limit', LIMITE_POR_DEFECTO)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise CursorInvalido("El parámetro 'limit' debe ser un entero")
+    if limit < 1:
+        raise CursorInvalido("El parámetro 'limit' debe ser mayor a 0")
+    return min(limit, LIMITE_MAXIMO), request.args.get('after')
+
+
+def paginate_keyset(query, columnas, limit, after=None):
+    """Paginar una consulta por llave (keyset) en orden ascendente de `columnas`.
+
+    La última columna debe ser única (normalmente la llave primaria) para que el
+    orden sea total. Devuelve (items, next_cursor); next_cursor es None en la
+    última página.
+    """
+    if after:
+        valores = decode_cursor(after, columnas)
+        query = query.filter(tuple_(*columnas) > tuple_(*valores))
+
+    items = query.order_by(*columnas).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        ultimo = items[-1]
+        next_cursor = encode_cursor([getattr(ultimo, c.key) for c in columnas])
+    return items, next_cursor
+
+
+def paginar_vales(query):
+    """Página de vales según limit/after/fields: devuelve (filas serializadas, next_cursor).
+
+    Compartida por el blueprint y los recursos de flask-restx; lanza
+    CursorInvalido si el cursor o el límite no son válidos.
+    """
+    columnas = requested_columns(ValeAlmacen)
+    limit, after = get_page_args()
+    if columnas:
+        # La llave de paginación se selecciona siempre para poder armar el cursor
+        seleccion = list(dict.fromkeys(columnas + ORDEN_VALES))
+        filas, next_cursor = paginate_keyset(query.with_entities(*seleccion), ORDEN_VALES, limit, after)
+        return rows_to_dicts(filas, columnas), next_cursor
+    vales, next_cursor = paginate_keyset(eager(query, ValeAlmacen), ORDEN_VALES, limit, after)
+    return [vale.to_dict() for vale in vales], next_cursor
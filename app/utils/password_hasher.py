@@ -0,0 +1,124 @@
+# app/utils/password_hasher.py
+import threading
+import time
+from collections import deque
+from flask import jsonify
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Cantidad de mediciones recientes usadas para los percentiles de latencia
+MUESTRAS_LATENCIA = 512
+
+
+class PasswordHashingBusy(ServiceUnavailable):
+    """No hubo un hilo de hashing libre dentro del tiempo de espera"""
+    description = "Servicio ocupado, intente nuevamente en unos segundos"
+
+
+class PasswordHasher:
+    """Acota cuántos hashes de contraseñas corren a la vez.
+
+    El hash se calcula en el mismo hilo de la petición, pero como máximo
+    PASSWORD_HASH_MAX_WORKERS hashes corren a la vez; las demás
+    peticiones esperan turno hasta PASSWORD_HASH_QUEUE_TIMEOUT segundos y luego
+    reciben 503, de modo que una ráfaga de logins no acapara todos los workers.
+    """
+
+    def __init__(self, method='scrypt', max_workers=4, queue_timeout=2.0):
+        self.method = method
+        self.max_workers = max_workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._prefijo = None
+        self._latencias = deque(maxlen=MUESTRAS_LATENCIA)
+        self._reset_metricas()
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.max_workers = app.config.get('PASSWORD_HASH_MAX_WORKERS', self.max_workers)
+        self.queue_timeout = app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', self.queue_timeout)
+        self._slots = threading.BoundedSemaphore(self.max_workers)
+        self._prefijo = None
+        self._latencias.clear()
+        self._reset_metricas()
+        app.register_error_handler(PasswordHashingBusy, _busy_response)
+        app.extensions['password_hasher'] = self
+
+    def _reset_metricas(self):
+        self.en_cola = 0
+        self.max_en_cola = 0
+        self.en_proceso = 0
+        self.completados = 0
+        self.rechazados = 0
+
+    def _run(self, funcion, *args):
+        with self._lock:
+            self.en_cola += 1
+            self.max_en_cola = max(self.max_en_cola, self.en_cola)
+        admitido = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.en_cola -= 1
+            if not admitido:
+                self.rechazados += 1
+        if not admitido:
+            raise PasswordHashingBusy()
+
+        with self._lock:
+            self.en_proceso += 1
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(*args)
+        finally:
+            latencia = time.perf_counter() - inicio
+            with self._lock:
+                self.en_proceso -= 1
+                self.completados += 1
+                self._latencias.append(latencia)
+            self._slots.release()
+        return resultado
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """Indica si el hash fue generado con un método o costo distinto al configurado"""
+        if self._prefijo is None:
+            # Parámetros completos del método (p. ej. "scrypt:32768:8:1"), calculados una vez
+            self._prefijo = generate_password_hash('', self.method).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._prefijo
+
+    def stats(self):
+        with self._lock:
+            latencias = sorted(self._latencias)
+            return {
+                'method': self.method,
+                'max_workers': self.max_workers,
+                'queue_timeout': self.queue_timeout,
+                'queue_depth': self.en_cola,
+                'max_queue_depth': self.max_en_cola,
+                'in_progress': self.en_proceso,
+                'completed': self.completados,
+                'rejected': self.rechazados,
+                'latency_ms': {
+                    'p50': _percentil(latencias, 0.50),
+                    'p95': _percentil(latencias, 0.95),
+                    'max': round(latencias[-1] * 1000, 2) if latencias else None
+                }
+            }
+
+
+def _percentil(valores, q):
+    if not valores:
+        return None
+    return round(valores[min(len(valores) - 1, int(q * len(valores)))] * 1000, 2)
+
+
+def _busy_response(error):
+    respuesta = jsonify({"message": error.description})
+    respuesta.status_code = error.code
+    respuesta.headers['Retry-After'] = '1'
+    return respuesta
@@ -0,0 +1,174 @@
+# app/utils/revocation.py
+import heapq
+import os
+import sqlite3
+import threading
+import time
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+# Cada cuántos segundos, como máximo, se eliminan las revocaciones ya expiradas
+INTERVALO_PURGA = 300
+
+
+class MemoryRevocationStore:
+    """Revocaciones en un dict del proceso (solo sirve con un único worker)"""
+
+    def __init__(self):
+        self._revocados = {}
+        self._expiraciones = []  # heap de (exp, jti) para purgar sin recorrer todo el dict
+        self._lock = threading.Lock()
+
+    def revoke(self, jti, exp):
+        with self._lock:
+            self._revocados[jti] = exp
+            heapq.heappush(self._expiraciones, (exp, jti))
+
+    def is_revoked(self, jtis, ahora):
+        for jti in jtis:
+            exp = self._revocados.get(jti)
+            if exp is not None and exp > ahora:
+                return True
+        return False
+
+    def prune(self, ahora):
+        eliminados = 0
+        with self._lock:
+            while self._expiraciones and self._expiraciones[0][0] <= ahora:
+                exp, jti = heapq.heappop(self._expiraciones)
+                if self._revocados.get(jti) == exp:
+                    del self._revocados[jti]
+                    eliminados += 1
+        return eliminados
+
+    def __len__(self):
+        return len(self._revocados)
+
+
+class SQLiteRevocationStore:
+    """Revocaciones en un archivo SQLite local compartido por los workers del host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS token_revocado ("
+                "jti TEXT PRIMARY KEY, exp INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_token_revocado_exp ON token_revocado (exp)")
+
+    def _connect(self):
+        # Una conexión por hilo y por proceso (los workers se crean con fork)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def revoke(self, jti, exp):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO token_revocado (jti, exp) VALUES (?, ?)", (jti, exp)
+        )
+
+    def is_revoked(self, jtis, ahora):
+        marcadores = ', '.join('?' * len(jtis))
+        fila = self._connect().execute(
+            f"SELECT 1 FROM token_revocado WHERE jti IN ({marcadores}) AND exp > ? LIMIT 1", (*jtis, ahora)
+        ).fetchone()
+        return fila is not None
+
+    def prune(self, ahora):
+        return self._connect().execute("DELETE FROM token_revocado WHERE exp <= ?", (ahora,)).rowcount
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM token_revocado").fetchone()[0]
+
+
+class DatabaseRevocationStore:
+    """Revocaciones en la tabla token_revocado de la base de datos de la aplicación.
+
+    Usa conexiones propias del engine para no mezclarse con la transacción de
+    la petición en curso.
+    """
+
+    def __init__(self, db):
+        from app.models.token_revocado import TokenRevocado
+        self.db = db
+        self.tabla = TokenRevocado.__table__
+
+    def revoke(self, jti, exp):
+        try:
+            with self.db.engine.begin() as conn:
+                conn.execute(insert(self.tabla).values(jti=jti, exp=exp))
+        except IntegrityError:
+            pass  # ya estaba revocado
+
+    def is_revoked(self, jtis, ahora):
+        with self.db.engine.connect() as conn:
+            return conn.execute(
+                select(self.tabla.c.jti).where(self.tabla.c.jti.in_(jtis), self.tabla.c.exp > ahora).limit(1)
+            ).first() is not None
+
+    def prune(self, ahora):
+        with self.db.engine.begin() as conn:
+            return conn.execute(delete(self.tabla).where(self.tabla.c.exp <= ahora)).rowcount
+
+    def __len__(self):
+        with self.db.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(self.tabla)).scalar()
+
+
+class RevocationStore:
+    """Punto de acceso a las revocaciones de tokens, con backend configurable.
+
+    TOKEN_REVOCATION_BACKEND:
+      - 'database' (por defecto): tabla token_revocado, compartida entre hosts.
+      - 'sqlite': archivo TOKEN_REVOCATION_SQLITE_PATH, compartido entre workers del mismo host.
+      - 'memory': dict del proceso (desarrollo o un único worker).
+    Las revocaciones se guardan hasta el exp del token y luego se purgan solas.
+    """
+
+    def __init__(self):
+        self.backend = MemoryRevocationStore()
+        self._ultima_purga = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        from app.extensions import db
+        tipo = app.config.get('TOKEN_REVOCATION_BACKEND', 'database')
+        if tipo == 'sqlite':
+            self.backend = SQLiteRevocationStore(app.config['TOKEN_REVOCATION_SQLITE_PATH'])
+        elif tipo == 'database':
+            self.backend = DatabaseRevocationStore(db)
+        elif tipo == 'memory':
+            self.backend = MemoryRevocationStore()
+        else:
+            raise ValueError(f"TOKEN_REVOCATION_BACKEND desconocido: {tipo}")
+        app.extensions['revocation_store'] = self
+
+    def revoke(self, jti, exp):
+        self.backend.revoke(jti, int(exp))
+        self._maybe_prune()
+
+    def is_revoked(self, *jtis):
+        """Indica si alguno de los identificadores está revocado"""
+        return self.backend.is_revoked(jtis, int(time.time()))
+
+    def prune(self):
+        """Eliminar las revocaciones de tokens ya expirados; devuelve cuántas se borraron"""
+        return self.backend.prune(int(time.time()))
+
+    def _maybe_prune(self):
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora - self._ultima_purga < INTERVALO_PURGA:
+                return
+            self._ultima_purga = ahora
+        self.prune()
+
+    def __len__(self):
+        return len(self.backend)
@@ -0,0 +1,60 @@
+# app/utils/serializers.py
+from functools import wraps
+from flask import request
+from sqlalchemy.orm import joinedload, selectinload
+from app.utils.fieldsets import project_rows, requested_columns
+
+
+def to_dict_options(model):
+    """Opciones de carga para las relaciones que lee model.to_dict().
+
+    Cada modelo declara en TO_DICT_RELACIONES las relaciones que usa su to_dict.
+    Las relaciones muchos-a-uno se resuelven con joinedload (mismo SELECT) y las
+    colecciones con selectinload (un SELECT ... IN adicional), de modo que un
+    listado ejecuta un número fijo de consultas sin importar la cantidad de filas.
+    """
+    opciones = []
+    for nombre in getattr(model, 'TO_DICT_RELACIONES', ()):
+        atributo = getattr(model, nombre)
+        if atributo.property.uselist:
+            opciones.append(selectinload(atributo))
+        else:
+            opciones.append(joinedload(atributo))
+    return opciones
+
+
+def eager(query, model):
+    """Aplicar a la consulta las precargas que necesita model.to_dict()"""
+    return query.options(*to_dict_options(model))
+
+
+def serialize_all(query, model):
+    """Ejecutar la consulta con precargas y devolver la lista de to_dict()"""
+    return [obj.to_dict() for obj in eager(query, model).all()]
+
+
+def serialize_list(query, model):
+    """Como serialize_all, pero respetando ?fields= con una proyección de columnas"""
+    columnas = requested_columns(model)
+    if columnas:
+        return project_rows(query, columnas)
+    return serialize_all(query, model)
+
+
+def marshal_unless_fields(namespace, model, as_list=False):
+    """Como namespace.marshal_with / marshal_list_with, salvo cuando se pidió ?fields=.
+
+    El modelo de flask-restx rellenaría con null las columnas no pedidas, así que
+    con ?fields= la proyección se devuelve tal cual; la documentación Swagger
+    del recurso no cambia.
+    """
+    def decorator(func):
+        marshalled = namespace.marshal_with(model, as_list=as_list)(func)
+
+        @wraps(marshalled)
+        def wrapper(*args, **kwargs):
+            if request.args.get('fields'):
+                return func(*args, **kwargs)
+            return marshalled(*args, **kwargs)
+        return wrapper
+    return decorator
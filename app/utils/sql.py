@@ -0,0 +1,91 @@
+# app/utils/sql.py
+from itertools import islice
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+# Filas por sentencia en inserciones multi-VALUES; mantiene los parámetros por
+# debajo del límite de SQLite (32766) y de PostgreSQL (65535)
+FILAS_POR_SENTENCIA = 5000
+
+# Motores con INSERT ... ON CONFLICT DO UPDATE
+_INSERT_CON_UPSERT = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def upsert(tabla, engine, filas, index_elements, set_):
+    """Construir un INSERT ... ON CONFLICT (index_elements) DO UPDATE multi-fila.
+
+    `set_` recibe la tabla destino y el pseudo-registro `excluded` y devuelve
+    las columnas a actualizar, para poder referirse a ambos en las expresiones.
+    """
+    try:
+        insertar = _INSERT_CON_UPSERT[engine.dialect.name]
+    except KeyError:
+        raise NotImplementedError(f"Upsert no soportado para {engine.dialect.name}")
+    stmt = insertar(tabla).values(filas)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_=set_(tabla, stmt.excluded)
+    )
+
+
+def insert_ignore(tabla, engine, filas, index_elements):
+    """Construir un INSERT ... ON CONFLICT (index_elements) DO NOTHING multi-fila"""
+    try:
+        insertar = _INSERT_CON_UPSERT[engine.dialect.name]
+    except KeyError:
+        raise NotImplementedError(f"Upsert no soportado para {engine.dialect.name}")
+    return insertar(tabla).values(filas).on_conflict_do_nothing(index_elements=index_elements)
+
+
+def advisory_lock(conexion, clase, id_objeto, compartido=False):
+    """Tomar un candado de aplicación (clase, id_objeto) hasta el fin de la transacción.
+
+    En PostgreSQL usa pg_advisory_xact_lock(_shared), que no escribe en
+    ninguna fila; los compartidos solo esperan al exclusivo. En SQLite no
+    hace nada: la base ya serializa las transacciones que escriben.
+    `conexion` puede ser una Session o una Connection.
+    """
+    bind = conexion.get_bind() if hasattr(conexion, 'get_bind') else conexion
+    if bind.dialect.name != 'postgresql':
+        return
+    funcion = func.pg_advisory_xact_lock_shared if compartido else func.pg_advisory_xact_lock
+    conexion.execute(select(funcion(clase, id_objeto)))
+
+
+def id_transaccion(conexion):
+    """Id de la transacción en curso (txid_current() en PostgreSQL; 0 en los demás motores)"""
+    bind = conexion.get_bind() if hasattr(conexion, 'get_bind') else conexion
+    if bind.dialect.name != 'postgresql':
+        return 0
+    return conexion.execute(select(func.txid_current())).scalar()
+
+
+def transacciones_terminadas(conexion):
+    """Límite bajo el cual toda transacción ya confirmó o abortó (xmin de la foto actual).
+
+    Las filas marcadas con id_transaccion() menor a este valor ya son todas
+    visibles y no aparecerán otras. None fuera de PostgreSQL, donde las
+    transacciones que escriben se confirman en el orden de sus ids.
+    """
+    bind = conexion.get_bind() if hasattr(conexion, 'get_bind') else conexion
+    if bind.dialect.name != 'postgresql':
+        return None
+    return conexion.execute(select(func.txid_snapshot_xmin(func.txid_current_snapshot()))).scalar()
+
+
+def chunked(filas, tamano=FILAS_POR_SENTENCIA):
+    for inicio in range(0, len(filas), tamano):
+        yield filas[inicio:inicio + tamano]
+
+
+def lotes(filas, tamano=FILAS_POR_SENTENCIA):
+    """Como chunked() pero sobre cualquier iterable (p. ej. un archivo leído en streaming)"""
+    iterador = iter(filas)
+    while True:
+        lote = list(islice(iterador, tamano))
+        if not lote:
+            return
+        yield lote
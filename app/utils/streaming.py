@@ -0,0 +1,77 @@
+# app/utils/streaming.py
+import csv
+import io
+from flask import Response, json, request, stream_with_context
+from app.extensions import db
+from app.utils.serializers import eager
+from app.utils.xlsx import generar_xlsx
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+CSV_MIMETYPE = 'text/csv'
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+FORMATOS_EXPORTACION = ('csv', 'xlsx')
+TAMANO_LOTE = 1000
+
+
+def wants_ndjson():
+    """Indica si el cliente pidió NDJSON en el header Accept"""
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def stream_ndjson(query, model, batch_size=TAMANO_LOTE):
+    """Responder una consulta como NDJSON (un objeto to_dict() por línea).
+
+    Las filas se leen con un cursor del lado del servidor (yield_per), así que la
+    memoria por petición queda acotada al tamaño del lote y el primer byte sale
+    apenas se serializa la primera fila.
+    """
+    query = eager(query, model).yield_per(batch_size)
+
+    def generate():
+        for obj in query:
+            yield json.dumps(obj.to_dict()) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def _filas_csv(columnas, filas, batch_size):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM para que Excel abra el UTF-8 con tildes correctamente
+    buffer.write('\ufeff')
+    escritor.writerow(columnas)
+    for indice, valores in enumerate(filas, start=1):
+        escritor.writerow(valores)
+        if indice % batch_size == 0:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def stream_export(consulta, columnas, formato, nombre, batch_size=TAMANO_LOTE):
+    """Responder una consulta (select de columnas) como archivo CSV o XLSX descargable.
+
+    Las filas se leen con un cursor del lado del servidor (stream_results y
+    yield_per) y se escriben por bloques a medida que llegan, así que la
+    memoria por petición no depende de cuántas filas tenga el rango.
+    """
+    def filas():
+        resultado = db.session.execute(
+            consulta.execution_options(stream_results=True, yield_per=batch_size)
+        )
+        try:
+            for fila in resultado:
+                yield tuple(fila)
+        finally:
+            resultado.close()
+
+    if formato == 'xlsx':
+        contenido, mimetype = generar_xlsx(columnas, filas(), filas_por_bloque=batch_size), XLSX_MIMETYPE
+    else:
+        contenido, mimetype = _filas_csv(columnas, filas(), batch_size), CSV_MIMETYPE
+    return Response(
+        stream_with_context(contenido),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{nombre}.{formato}"'}
+    )
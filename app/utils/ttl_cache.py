@@ -0,0 +1,91 @@
+# app/utils/ttl_cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Caché LRU con expiración (TTL), local a cada proceso.
+
+    La invalidación explícita cubre los cambios hechos por este worker y el
+    TTL acota cuánto puede tardar en verse un cambio hecho por otro worker.
+    `config_prefix` indica de qué claves de configuración (<prefijo>_MAXSIZE,
+    <prefijo>_TTL) se leen los límites y con qué nombre se registra en
+    app.extensions.
+    """
+
+    def __init__(self, config_prefix, maxsize=1024, ttl=60):
+        self.config_prefix = config_prefix
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get(f'{self.config_prefix}_MAXSIZE', self.maxsize)
+        self.ttl = app.config.get(f'{self.config_prefix}_TTL', self.ttl)
+        self.clear()
+        app.extensions[self.config_prefix.lower()] = self
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key):
+        """Devolver el valor guardado para `key` o None si no existe o expiró"""
+        with self._lock:
+            entrada = self._datos.get(key)
+            if entrada is not None:
+                expira, valor = entrada
+                if expira > time.monotonic():
+                    self._datos.move_to_end(key)
+                    self.hits += 1
+                    return valor
+                del self._datos[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._datos[key] = (time.monotonic() + self.ttl, value)
+            self._datos.move_to_end(key)
+            while len(self._datos) > self.maxsize:
+                self._datos.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        """Quitar y devolver el valor de `key` (None si no existe o expiró)"""
+        with self._lock:
+            entrada = self._datos.pop(key, None)
+            if entrada is not None and entrada[0] > time.monotonic():
+                self.hits += 1
+                return entrada[1]
+            self.misses += 1
+            return None
+
+    def invalidate(self, key):
+        with self._lock:
+            self._datos.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._datos),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl
+            }
@@ -1,5 +1,6 @@
 # config.py
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -10,6 +11,34 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'clave-super-secreta-jwt'
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hora en segundos
     JWT_ALGORITHM = "HS256"
+    # Caché de usuarios autenticados (por proceso); 0 desactiva la caché
+    PRINCIPAL_CACHE_TTL = int(os.environ.get('PRINCIPAL_CACHE_TTL', 60))  # segundos
+    PRINCIPAL_CACHE_MAXSIZE = int(os.environ.get('PRINCIPAL_CACHE_MAXSIZE', 1024))
+    # Versión de token vigente por usuario. Los cambios de roles llegan a los demás workers por el
+    # almacén de revocaciones; con TOKEN_REVOCATION_BACKEND='memory' solo el TTL acota la demora
+    TOKEN_VERSION_CACHE_TTL = int(os.environ.get('TOKEN_VERSION_CACHE_TTL', 30))
+    TOKEN_VERSION_CACHE_MAXSIZE = int(os.environ.get('TOKEN_VERSION_CACHE_MAXSIZE', 4096))
+    # Valorización de inventario por almacén; se invalida al confirmar vales de ese almacén
+    # y el TTL acota cuánto tarda este worker en ver vales registrados por otro
+    VALORIZACION_CACHE_TTL = int(os.environ.get('VALORIZACION_CACHE_TTL', 300))
+    VALORIZACION_CACHE_MAXSIZE = int(os.environ.get('VALORIZACION_CACHE_MAXSIZE', 256))
+    # Capas de costo FIFO/FEFO en memoria por (almacén, artículo); se validan con la versión de la fila de stock
+    CAPAS_CACHE_TTL = int(os.environ.get('CAPAS_CACHE_TTL', 600))
+    CAPAS_CACHE_MAXSIZE = int(os.environ.get('CAPAS_CACHE_MAXSIZE', 4096))
+    # Tokens revocados en logout: 'database' (tabla token_revocado, compartida entre workers y hosts),
+    # 'sqlite' (workers del mismo host) o 'memory' (solo para un único worker: otro worker aceptaría el token)
+    TOKEN_REVOCATION_BACKEND = os.environ.get('TOKEN_REVOCATION_BACKEND', 'database')
+    TOKEN_REVOCATION_SQLITE_PATH = os.environ.get('TOKEN_REVOCATION_SQLITE_PATH') or \
+        os.path.join(tempfile.gettempdir(), 'token_revocado.db')
+    # Control de concurrencia al descontar stock: 'pesimista' (SELECT ... FOR UPDATE en orden de artículo)
+    # u 'optimista' (UPDATE condicionado a la versión de la fila, con reintentos)
+    STOCK_CONCURRENCIA = os.environ.get('STOCK_CONCURRENCIA', 'pesimista')
+    STOCK_REINTENTOS = int(os.environ.get('STOCK_REINTENTOS', 5))
+    # Hash de contraseñas: método/costo de werkzeug (los hashes antiguos se actualizan en el login),
+    # hilos simultáneos y segundos máximos de espera antes de responder 503
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_MAX_WORKERS = int(os.environ.get('PASSWORD_HASH_MAX_WORKERS', 4))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2))
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -0,0 +1,79 @@
+# tests/conftest.py
+import pytest
+from app import create_app
+from app.extensions import db
+from app.models.articulo import Articulo
+from app.models.usuario import Usuario
+from app.scripts.init_data import init_data
+from config import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # Archivo SQLite por prueba: las pruebas de concurrencia abren varias conexiones
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_ENGINE_OPTIONS', {'connect_args': {'timeout': 30}}, raising=False)
+    monkeypatch.setattr(TestingConfig, 'PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    monkeypatch.setattr(TestingConfig, 'TOKEN_REVOCATION_SQLITE_PATH', str(tmp_path / 'revocados.db'))
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        init_data()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth(app, client):
+    """Cabeceras de un usuario administrador con permisos de inventario"""
+    client.post('/auth/register', json={
+        'login_user': 'admin', 'nro_doc_ident': '1', 'nombre_user': 'Admin', 'password': 'secreto'
+    })
+    with app.app_context():
+        usuario = Usuario.query.filter_by(login_user='admin').first()
+        usuario.flag_administrador = '1'
+        usuario.flag_inventarios = '1'
+        db.session.commit()
+    token = client.post('/auth/login', json={'login_user': 'admin', 'password': 'secreto'}).get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def articulos(app):
+    """Crear artículos de prueba y devolver sus id"""
+    def crear(cantidad=1):
+        with app.app_context():
+            nuevos = [
+                Articulo(cod_articulo=f'T{indice:04d}', nombre_articulo=f'Prueba {indice}',
+                         precio_articulo=1, cod_unidad='UNI', id_categoria=1)
+                for indice in range(Articulo.query.count(), Articulo.query.count() + cantidad)
+            ]
+            db.session.add_all(nuevos)
+            db.session.commit()
+            return [articulo.id_articulo for articulo in nuevos]
+    return crear
+
+
+@pytest.fixture
+def vale(client, auth):
+    """Registrar un vale con /vales_almacen/completo y devolver la respuesta"""
+    contador = iter(range(1, 100000))
+
+    def registrar(id_almacen, tipo, detalles, fecha=None, cod=None):
+        cuerpo = {
+            'cod_vale_almacen': cod or f'V{next(contador):05d}',
+            'id_almacen': id_almacen,
+            'id_tipo_mov_almacen': tipo,
+            'detalles': detalles
+        }
+        if fecha:
+            cuerpo['fecha_vale'] = fecha
+        return client.post('/vales_almacen/completo', headers=auth, json=cuerpo)
+    return registrar
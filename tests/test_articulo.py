@@ -0,0 +1,36 @@
+# tests/test_articulo.py
+import io
+import pytest
+from app.models.articulo import Articulo
+from app.services.articulo_import_service import ImportacionInterrumpida, importar_articulos
+
+ENCABEZADO = b'cod_articulo,nombre_articulo,cod_unidad,id_categoria\n'
+
+
+def _csv(filas, cola=b''):
+    return ENCABEZADO + b''.join(b'I%05d,Importado %d,UNI,1\n' % (i, i) for i in range(filas)) + cola
+
+
+def test_importar_reporta_lo_guardado_si_el_archivo_se_corta(app):
+    # Más de un bloque de lectura antes del byte inválido, para que algunos lotes ya estén confirmados
+    datos = _csv(2000, b'\xff\xfe,roto,UNI,1\n')
+    with app.app_context():
+        with pytest.raises(ImportacionInterrumpida) as error:
+            importar_articulos(io.TextIOWrapper(io.BytesIO(datos), encoding='utf-8', newline=''), tamano_lote=100)
+        assert error.value.resumen['insertadas'] > 0
+        assert error.value.fila > error.value.resumen['insertadas']
+        assert Articulo.query.filter(Articulo.cod_articulo.like('I%')).count() == error.value.resumen['insertadas']
+
+
+def test_importar_sin_nada_guardado_responde_400(client, auth):
+    respuesta = client.post('/articulos/importar', headers=auth, data=_csv(3, b'\xff,roto,UNI,1\n'))
+    assert respuesta.status_code == 400
+    respuesta = client.post('/articulos/importar', headers=auth, data=b'\xff\xfe' + _csv(3))
+    assert respuesta.status_code == 400
+
+
+def test_importar_informa_codigos_existentes(app, client, auth):
+    assert client.post('/articulos/importar', headers=auth, data=_csv(3)).get_json()['insertadas'] == 3
+    resumen = client.post('/articulos/importar', headers=auth, data=_csv(5)).get_json()
+    assert resumen['insertadas'] == 2
+    assert [e['fila'] for e in resumen['errores']] == [2, 3, 4]
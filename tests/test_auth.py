@@ -0,0 +1,32 @@
+# tests/test_auth.py
+from app.extensions import token_versions
+from app.models.usuario import Usuario
+
+
+def _login(client, login_user, password='secreto'):
+    token = client.post('/auth/login', json={'login_user': login_user, 'password': password}).get_json()['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_cambio_de_roles_revoca_tokens_en_otros_workers(app, client, auth):
+    client.post('/auth/register', json={
+        'login_user': 'otro', 'nro_doc_ident': '2', 'nombre_user': 'Otro', 'password': 'secreto'
+    })
+    cabeceras = _login(client, 'otro')
+    assert client.get('/vales_almacen/', headers=cabeceras).status_code == 200
+
+    with app.app_context():
+        usuario = Usuario.query.filter_by(login_user='otro').first()
+        id_user, version = usuario.id_user, usuario.token_version
+    assert client.put(f'/usuarios/{id_user}', headers=auth, json={'flag_inventarios': '1'}).status_code == 200
+
+    # Otro worker aún tiene en su caché la versión anterior
+    token_versions.set(id_user, version)
+    assert client.get('/vales_almacen/', headers=cabeceras).status_code == 401
+
+    assert client.get('/vales_almacen/', headers=_login(client, 'otro')).status_code == 200
+
+
+def test_logout_revoca_el_token(client, auth):
+    assert client.post('/auth/logout', headers=auth).status_code == 200
+    assert client.get('/vales_almacen/', headers=auth).status_code == 401
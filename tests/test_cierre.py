@@ -0,0 +1,29 @@
+# tests/test_cierre.py
+import pytest
+
+I01, S02 = 2, 12
+
+
+def _saldo(client, auth, fecha, id_articulo):
+    stock = client.get(f'/stock/a_fecha/{fecha}?id_almacen=1&id_articulo={id_articulo}', headers=auth).get_json()['stock']
+    return (stock[0]['cantidad'], stock[0]['precio_promedio']) if stock else (0, 0)
+
+
+def test_saldo_a_fecha_ignora_vale_registrado_antes_con_fecha_posterior(client, auth, articulos, vale):
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 2}], fecha='2026-03-20').status_code == 201
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 4}], fecha='2026-03-05').status_code == 201
+
+    assert _saldo(client, auth, '2026-03-09', id_articulo) == (5, 4)
+    assert _saldo(client, auth, '2026-03-20', id_articulo) == (15, pytest.approx(8 / 3, abs=1e-4))
+
+
+def test_saldo_a_fecha_reaplica_en_orden_de_fecha(client, auth, articulos, vale):
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 2}], fecha='2026-03-08').status_code == 201
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 4}], fecha='2026-03-05').status_code == 201
+    assert vale(1, S02, [{'id_articulo': id_articulo, 'cantidad': 2, 'precio_soles': 0}], fecha='2026-03-06').status_code == 201
+
+    # 5 a 4 el día 5, salen 2 el día 6 y entran 10 a 2 el día 8
+    assert _saldo(client, auth, '2026-03-06', id_articulo) == (3, 4)
+    assert _saldo(client, auth, '2026-03-09', id_articulo) == (13, pytest.approx(32 / 13, abs=1e-4))
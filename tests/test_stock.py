@@ -0,0 +1,222 @@
+# tests/test_stock.py
+import pytest
+from app.utils.pagination import encode_cursor
+
+I01, S02 = 2, 12
+
+
+def test_feed_de_alertas_por_cursor(client, auth, articulos):
+    ids = articulos(2)
+    respuesta = client.put('/stock/minimo/1', headers=auth,
+                           json={'minimos': [{'id_articulo': i, 'stock_minimo': 5} for i in ids]})
+    assert respuesta.get_json()['alertas'] == 2
+
+    primera = client.get('/stock/alertas?limit=1', headers=auth).get_json()
+    assert [a['id_articulo'] for a in primera['alertas']] == ids[:1]
+    segunda = client.get(f"/stock/alertas?limit=1&after={primera['cursor']}", headers=auth).get_json()
+    assert [a['id_articulo'] for a in segunda['alertas']] == ids[1:]
+    vacia = client.get(f"/stock/alertas?limit=1&after={segunda['cursor']}", headers=auth).get_json()
+    assert vacia['alertas'] == [] and vacia['cursor'] == segunda['cursor']
+
+    # Cursores de solo id (formato anterior) ya no son válidos
+    assert client.get(f"/stock/alertas?after={encode_cursor([1])}", headers=auth).status_code == 400
+
+
+def test_valorizacion_se_invalida_al_cambiar_categoria_o_almacen(app, client, auth, articulos, vale):
+    from app.extensions import db
+    from app.models.almacen import Almacen
+    from app.models.articulo import Articulo
+
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 2, 'precio_soles': 3}]).status_code == 201
+
+    def reporte():
+        return client.get('/reportes/reportes/valorizacion?id_almacen=1', headers=auth).get_json()['almacenes'][0]
+
+    assert [c['id_categoria'] for c in reporte()['categorias']] == [1]
+
+    with app.app_context():
+        db.session.get(Articulo, id_articulo).id_categoria = 2
+        db.session.commit()
+    assert [c['id_categoria'] for c in reporte()['categorias']] == [2]
+
+    with app.app_context():
+        db.session.get(Almacen, 1).nombre_almacen = 'RENOMBRADO'
+        db.session.commit()
+    assert reporte()['nombre_almacen'] == 'RENOMBRADO'
+
+
+def test_stock_articulo_por_deltas(app, articulos, vale):
+    from app.extensions import db
+    from app.models.articulo import Articulo
+    from app.services.stock_service import (
+        consolidar_stock_articulo, corregir_stock_articulo, diferencias_stock_articulo
+    )
+
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 1}]).status_code == 201
+    assert vale(2, I01, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 1}]).status_code == 201
+    assert vale(1, S02, [{'id_articulo': id_articulo, 'cantidad': 3, 'precio_soles': 0}]).status_code == 201
+
+    with app.app_context():
+        # Los vales no tocan la fila del artículo; los deltas pendientes cuadran con el stock
+        assert db.session.get(Articulo, id_articulo).stock_articulo == 0
+        assert diferencias_stock_articulo() == []
+        assert consolidar_stock_articulo() == 1
+        db.session.commit()
+        assert db.session.get(Articulo, id_articulo).stock_articulo == 12
+
+    assert vale(1, S02, [{'id_articulo': id_articulo, 'cantidad': 2, 'precio_soles': 0}]).status_code == 201
+    with app.app_context():
+        db.session.get(Articulo, id_articulo).stock_articulo = 99
+        db.session.commit()
+        assert [fila.id_articulo for fila in diferencias_stock_articulo()] == [id_articulo]
+        assert corregir_stock_articulo() == 1
+        consolidar_stock_articulo()
+        db.session.commit()
+        assert db.session.get(Articulo, id_articulo).stock_articulo == 10
+        assert diferencias_stock_articulo() == []
+
+
+def _usar_fifo(app, id_almacen=1):
+    from app.extensions import db
+    from app.models.almacen import Almacen
+    with app.app_context():
+        db.session.get(Almacen, id_almacen).metodo_costeo = 'FIFO'
+        db.session.commit()
+
+
+def _costo_salidas(app, id_articulo):
+    from app.extensions import db
+    from app.models.kardex import Kardex
+    with app.app_context():
+        return [float(fila.precio_soles) for fila in
+                Kardex.query.filter(Kardex.id_articulo == id_articulo, Kardex.cantidad < 0).order_by(Kardex.id_kardex)]
+
+
+def test_fifo_consume_en_orden_de_registro_con_o_sin_cache(app, articulos, vale):
+    from app.extensions import capas_cache
+
+    _usar_fifo(app)
+    a, b = articulos(2)
+    for id_articulo in (a, b):
+        # El segundo ingreso tiene fecha anterior, pero se registró después
+        assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 1}], fecha='2026-09-10').status_code == 201
+        assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 3}], fecha='2026-09-01').status_code == 201
+
+    assert vale(1, S02, [{'id_articulo': a, 'cantidad': 6, 'precio_soles': 0}]).status_code == 201
+    capas_cache.clear()
+    assert vale(1, S02, [{'id_articulo': b, 'cantidad': 6, 'precio_soles': 0}]).status_code == 201
+
+    # 5 a 1 y 1 a 3: el mismo costo desde la caché y desde la base
+    assert _costo_salidas(app, a) == _costo_salidas(app, b) == [pytest.approx(8 / 6, abs=1e-4)]
+
+
+def test_valorizacion_ignora_capas_de_almacen_promedio(app, client, auth, articulos, vale):
+    from app.extensions import db
+    from app.models.almacen import Almacen
+
+    _usar_fifo(app)
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 1}]).status_code == 201
+    with app.app_context():
+        db.session.get(Almacen, 1).metodo_costeo = 'PROM'
+        db.session.commit()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 3}]).status_code == 201
+
+    reporte = client.get('/reportes/reportes/valorizacion?id_almacen=1', headers=auth).get_json()
+    assert reporte['valorizado_total'] == 20
+
+
+def _cantidad(app, id_articulo, id_almacen=1):
+    from app.extensions import db
+    from app.models.stock import Stock
+    with app.app_context():
+        return db.session.get(Stock, (id_almacen, id_articulo)).cantidad
+
+
+def test_salida_mayor_al_saldo_se_rechaza(app, articulos, vale):
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 3, 'precio_soles': 1}]).status_code == 201
+
+    respuesta = vale(1, S02, [{'id_articulo': id_articulo, 'cantidad': 4, 'precio_soles': 0}])
+    assert respuesta.status_code == 409
+    assert respuesta.get_json()['errores'][0]['disponible'] == 3
+    assert _cantidad(app, id_articulo) == 3
+
+
+@pytest.mark.parametrize('modo', ['pesimista', 'optimista'])
+def test_salidas_concurrentes_no_dejan_saldo_negativo(app, auth, articulos, modo):
+    import threading
+
+    app.config['STOCK_CONCURRENCIA'] = modo
+    id_articulo, = articulos()
+    cliente = app.test_client()
+    assert cliente.post('/vales_almacen/completo', headers=auth, json={
+        'cod_vale_almacen': 'INI', 'id_almacen': 1, 'id_tipo_mov_almacen': I01,
+        'detalles': [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 1}]
+    }).status_code == 201
+
+    estados = []
+    inicio = threading.Barrier(8)
+
+    def salir(indice):
+        cliente = app.test_client()
+        inicio.wait()
+        for vuelta in range(3):
+            respuesta = cliente.post('/vales_almacen/completo', headers=auth, json={
+                'cod_vale_almacen': f'S{indice}-{vuelta}', 'id_almacen': 1, 'id_tipo_mov_almacen': S02,
+                'detalles': [{'id_articulo': id_articulo, 'cantidad': 1, 'precio_soles': 0}]
+            })
+            estados.append(respuesta.status_code)
+
+    hilos = [threading.Thread(target=salir, args=(indice,)) for indice in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    # 24 salidas de 1 contra un saldo de 10: exactamente 10 pasan
+    assert estados.count(201) == 10
+    assert set(estados) <= {201, 409}
+    assert _cantidad(app, id_articulo) == 0
+
+
+def test_anular_ingreso_recostea_salidas_posteriores(app, client, auth, articulos, vale):
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 2}]).status_code == 201
+    ingreso = vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 4}]).get_json()
+    assert vale(1, S02, [{'id_articulo': id_articulo, 'cantidad': 5, 'precio_soles': 0}]).status_code == 201
+    assert _costo_salidas(app, id_articulo) == [3]
+
+    id_vale = ingreso['vale_almacen']['id_vale_almacen']
+    assert client.delete(f'/vales_almacen/{id_vale}', headers=auth).status_code == 200
+
+    from app.extensions import db
+    from app.models.stock import Stock
+    with app.app_context():
+        stock = db.session.get(Stock, (1, id_articulo))
+        assert (stock.cantidad, stock.precio_promedio) == (5, 2)
+    # La salida se recostea al promedio sin el ingreso anulado; la compensación no es una salida
+    assert _costo_salidas(app, id_articulo)[0] == 2
+
+
+def test_cierre_guarda_saldos_y_bloquea_el_periodo(app, client, auth, articulos, vale):
+    from app.extensions import db
+    from app.models.stock_cierre import StockCierre
+    from app.services.cierre_service import cerrar_periodo
+
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 4, 'precio_soles': 5}], fecha='2026-08-10').status_code == 201
+    with app.app_context():
+        assert cerrar_periodo('2026-08') == 1
+        db.session.commit()
+        cierre = db.session.get(StockCierre, ('202608', 1, id_articulo))
+        assert (cierre.cantidad, cierre.precio_promedio) == (4, 5)
+
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 1, 'precio_soles': 1}], fecha='2026-08-20').status_code == 409
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 2, 'precio_soles': 2}], fecha='2026-09-02').status_code == 201
+
+    stock = client.get(f'/stock/a_fecha/2026-09-05?id_almacen=1&id_articulo={id_articulo}', headers=auth).get_json()
+    assert stock['cierre_base'] == '202608'
+    assert stock['stock'][0]['cantidad'] == 6
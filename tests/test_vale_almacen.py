@@ -0,0 +1,84 @@
+# tests/test_vale_almacen.py
+I01, S02 = 2, 12
+
+
+def test_paginacion_por_cursor_y_fields(client, auth, articulos, vale):
+    id_articulo, = articulos()
+    for dia in (3, 1, 2):
+        assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 1, 'precio_soles': 1}],
+                    fecha=f'2026-09-0{dia}').status_code == 201
+
+    primera = client.get('/vales_almacen/?limit=2&fields=id_vale_almacen,fecha_vale', headers=auth).get_json()
+    assert [v['fecha_vale'][:10] for v in primera['vales_almacen']] == ['2026-09-01', '2026-09-02']
+    assert set(primera['vales_almacen'][0]) == {'id_vale_almacen', 'fecha_vale'}
+
+    segunda = client.get(f"/vales_almacen/?limit=2&after={primera['next_cursor']}", headers=auth).get_json()
+    assert [v['fecha_vale'][:10] for v in segunda['vales_almacen']] == ['2026-09-03']
+    assert segunda['next_cursor'] is None
+
+    assert client.get('/vales_almacen/?after=xyz', headers=auth).status_code == 400
+
+
+def test_completo_rechaza_ids_invalidos(client, auth, articulos):
+    id_articulo, = articulos()
+    base = {'cod_vale_almacen': 'V1', 'id_almacen': 1, 'id_tipo_mov_almacen': I01}
+    detalle = {'id_articulo': id_articulo, 'cantidad': 1, 'precio_soles': 1}
+
+    respuesta = client.post('/vales_almacen/completo', headers=auth,
+                            json={**base, 'detalles': [{**detalle, 'id_articulo': 'abc'}]})
+    assert respuesta.status_code == 400
+    respuesta = client.post('/vales_almacen/completo', headers=auth,
+                            json={**base, 'detalles': [{**detalle, 'id_articulo': None}]})
+    assert respuesta.status_code == 400
+    respuesta = client.post('/vales_almacen/completo', headers=auth,
+                            json={**base, 'id_almacen': 'uno', 'detalles': [detalle]})
+    assert respuesta.status_code == 400
+    respuesta = client.post('/vales_almacen/completo', headers=auth,
+                            json={**base, 'id_entidad': 999999, 'detalles': [detalle]})
+    assert respuesta.status_code == 400
+
+    assert client.post('/vales_almacen/completo', headers=auth, json={**base, 'detalles': [detalle]}).status_code == 201
+
+
+def test_detalles_acepta_lista_vacia(client, auth, articulos, vale):
+    id_articulo, = articulos()
+    id_vale = vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 1, 'precio_soles': 1}]).get_json()['vale_almacen']['id_vale_almacen']
+    assert client.post(f'/vales_almacen/{id_vale}/detalles', headers=auth, json={'detalles': []}).status_code == 201
+    assert client.post(f'/vales_almacen/{id_vale}/detalles', headers=auth, json={'detalles': 'x'}).status_code == 400
+
+
+def test_anular_ingreso_rechaza_saldo_intermedio_negativo(app, client, auth, articulos, vale):
+    from app.extensions import db
+    from app.models.stock import Stock
+
+    id_articulo, = articulos()
+    ingreso = vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 2}]).get_json()
+    assert vale(1, S02, [{'id_articulo': id_articulo, 'cantidad': 8, 'precio_soles': 0}]).status_code == 201
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 2}]).status_code == 201
+
+    # El saldo final quedaría en 2, pero la salida de 8 se habría registrado sin stock
+    id_vale = ingreso['vale_almacen']['id_vale_almacen']
+    respuesta = client.delete(f'/vales_almacen/{id_vale}', headers=auth)
+    assert respuesta.status_code == 409
+    with app.app_context():
+        assert db.session.get(Stock, (1, id_articulo)).cantidad == 12
+
+
+def test_anular_con_cabecera_desactualizada_no_revierte_dos_veces(app, client, auth, articulos, vale):
+    from app.extensions import db
+    from app.models.stock import Stock
+    from app.models.vale_almacen import ValeAlmacen
+    from app.services.vale_almacen_service import inactivar_vale
+
+    id_articulo, = articulos()
+    assert vale(1, I01, [{'id_articulo': id_articulo, 'cantidad': 10, 'precio_soles': 2}]).status_code == 201
+    id_vale = vale(1, S02, [{'id_articulo': id_articulo, 'cantidad': 4, 'precio_soles': 0}]).get_json()['vale_almacen']['id_vale_almacen']
+
+    with app.app_context():
+        # Esta petición leyó el vale activo; otra lo inactiva antes de que revierta
+        cargado = db.session.get(ValeAlmacen, id_vale)
+        assert cargado.flag_estado == '1'
+        assert client.delete(f'/vales_almacen/{id_vale}', headers=auth).status_code == 200
+        inactivar_vale(cargado)
+        db.session.commit()
+        assert db.session.get(Stock, (1, id_articulo)).cantidad == 10